@@ -2,17 +2,19 @@ from typing import TypedDict
 import os
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph
+from llm_cache import enable_llm_cache
+from model_registry import registry
 
 load_dotenv()
+enable_llm_cache()  # repeated questions are answered from llm_cache.sqlite (temperature 0 only)
 
 class State(TypedDict):
     messages: list[HumanMessage]
     response: str
 
 
-llm = ChatOpenAI(model="gpt-3.5-turbo")
+llm = registry.chat("gpt-3.5-turbo", temperature=0)  # deterministic, so cached answers can be replayed
 
 def llm_node(state: State) -> State:
     """Simple llm node to communicate with the llm model and return the response"""
@@ -29,6 +31,7 @@ graph.set_finish_point("llm_node")
 app = graph.compile(debug=False)
 
 
+registry.warm_up(background=True)  # opens API connections while the user types
 userMessage = input("You: ")
 while userMessage != "exit":    
     result = app.invoke({"messages": [HumanMessage(content=userMessage)]})
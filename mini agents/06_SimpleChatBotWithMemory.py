@@ -1,36 +1,58 @@
-from typing import TypedDict, Union
+from typing import Annotated, Union
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph
+from langgraph.graph.message import add_messages
+from context_window import ContextState, ContextWindow
+from llm_cache import enable_llm_cache
+from model_registry import registry
+from session_cache import SessionCache
 
 load_dotenv()
+enable_llm_cache()  # repeated prompts are answered from llm_cache.sqlite (temperature 0 only)
 
-class State(TypedDict):
-    messages: list[Union[HumanMessage, AIMessage]]
+class State(ContextState):
+    messages: Annotated[list[Union[HumanMessage, AIMessage]], add_messages]
 
 
-llm = ChatOpenAI(model="gpt-4o")
+llm = registry.chat("gpt-4o", temperature=0)  # deterministic, so cached answers can be replayed
+
+# Only recent turns that fit in the budget are sent; older ones are folded into a running summary.
+context_window = ContextWindow(llm, max_tokens=3000)
 
 def llm_node(state: State) -> State:
     """llm node to communicate with the llm model and return the response"""
-    response = llm.invoke(state["messages"])
-    state["messages"].append(AIMessage(content=response.content))
+    response = llm.invoke(context_window.prompt(state))
     print(f"\nAI: {response.content}")
-    return state
+    return {"messages": [AIMessage(content=response.content)]}
 
 
 graph = StateGraph(State)
+graph.add_node("context", context_window.node)
 graph.add_node("llm_node", llm_node)
-graph.set_entry_point("llm_node")
+graph.set_entry_point("context")
+graph.add_edge("context", "llm_node")
 graph.set_finish_point("llm_node")
 app = graph.compile()
 
-history = []
+# Each user's conversation (and running summary) is kept as compact records in a
+# memory-capped LRU; the least recently active ones spill to sessions.sqlite and
+# are loaded again on their next message. Type "/user NAME" to switch users.
+sessions = SessionCache("sessions.sqlite", max_bytes=64 * 2**20)
+user = "default"
 
+registry.warm_up(background=True)  # opens API connections while the user types
 userMessage = input("You: ")
 while userMessage.lower() not in ["exit", "quit"]:
-    history.append(HumanMessage(content=userMessage))
-    result = app.invoke({"messages": history})
-    history = result["messages"]
-    userMessage = input("You: ")
\ No newline at end of file
+    if userMessage.startswith("/user "):
+        user = userMessage[len("/user "):].strip() or "default"
+        print(f"Now chatting as {user}.")
+        userMessage = input("You: ")
+        continue
+    history = sessions.messages(user) + [HumanMessage(content=userMessage)]
+    state = app.invoke({**sessions.get_state(user), "messages": history})
+    sessions.append(user, *state["messages"][len(history) - 1:])  # this turn's question and reply
+    sessions.set_state(user, **{key: state[key] for key in ContextState.__annotations__ if key in state})
+    userMessage = input("You: ")
+
+sessions.close()
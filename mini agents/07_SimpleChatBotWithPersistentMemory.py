@@ -1,36 +1,49 @@
 import json
-from typing import TypedDict, Union
+import os
+from typing import Annotated, Union
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph
+from langgraph.graph.message import add_messages
+from chat_store import ChatStore
+from context_window import ContextState, ContextWindow
+from llm_cache import enable_llm_cache
+from model_registry import registry
 
 load_dotenv()
+enable_llm_cache()  # repeated prompts are answered from llm_cache.sqlite (temperature 0 only)
 
-class State(TypedDict):
-    messages: list[Union[HumanMessage, AIMessage]]
+class State(ContextState):
+    messages: Annotated[list[Union[HumanMessage, AIMessage]], add_messages]
 
-llm = ChatOpenAI(model="gpt-4o")
+llm = registry.chat("gpt-4o", temperature=0)  # deterministic, so cached answers can be replayed
+
+# Only recent turns that fit in the budget are sent; older ones are folded into a running
+# summary, which is saved with the conversation.
+context_window = ContextWindow(llm, max_tokens=3000)
 
 def llm_node(state: State) -> State:
     """llm node to communicate with the llm model and return the response"""
-    response = llm.invoke(state["messages"])
-    state["messages"].append(AIMessage(content=response.content))
+    response = llm.invoke(context_window.prompt(state))
     print(f"\nAI: {response.content}")
-    return state
+    return {"messages": [AIMessage(content=response.content)]}
+
+# The conversation is kept in an append-only log: each turn writes only its new messages.
+# Startup only loads the last 100 messages; older ones stay on disk (see ChatStore.history).
+checkpointer = ChatStore("chat_history.jsonl", tail_messages=100)
 
 graph = StateGraph(State)
+graph.add_node("context", context_window.node)
 graph.add_node("llm_node", llm_node)
-graph.set_entry_point("llm_node")
+graph.set_entry_point("context")
+graph.add_edge("context", "llm_node")
 graph.set_finish_point("llm_node")
-app = graph.compile()
-
+app = graph.compile(checkpointer=checkpointer)
+config = {"configurable": {"thread_id": "default"}}
 
-def save_history(history, filename="chat_history.json"):
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump([{"type": m.type, "content": m.content} for m in history], f, ensure_ascii=False, indent=2)
 
-def load_history(filename="chat_history.json"):
+def load_legacy_history(filename="chat_history.json"):
+    """Messages saved by earlier versions of this script, which rewrote a JSON file every turn."""
     try:
         with open(filename, "r", encoding="utf-8") as f:
             data = json.load(f)
@@ -40,14 +53,14 @@ def load_history(filename="chat_history.json"):
         return []
 
 
-history = load_history()
+if not app.get_state(config).values and os.path.exists("chat_history.json"):
+    app.update_state(config, {"messages": load_legacy_history()}, as_node="llm_node")
 
+registry.warm_up(background=True)  # opens API connections while the user types
 userMessage = input("You: ")
 while userMessage.lower() not in ["exit", "quit"]:
-    history.append(HumanMessage(content=userMessage))
-    result = app.invoke({"messages": history})
-    history = result["messages"]
-    save_history(history) 
+    app.invoke({"messages": [HumanMessage(content=userMessage)]}, config)
     userMessage = input("You: ")
 
+checkpointer.close()
 print("Goodbye! Conversation saved.")
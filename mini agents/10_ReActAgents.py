@@ -3,13 +3,16 @@ from dotenv import load_dotenv
 from langchain_core.messages import BaseMessage
 from langchain_core.messages import ToolMessage
 from langchain_core.messages import SystemMessage 
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableLambda
 from langchain_core.tools import tool
 import requests
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, END
-import sys
 from langgraph.prebuilt import ToolNode
+from safe_math import evaluate, evaluate_many
+from stream_renderer import StreamRenderer
+from wiki_client import WikipediaClient
+from model_registry import registry
 
 
 load_dotenv()
@@ -28,18 +31,52 @@ def eval_expression(expression: str) -> str:
     - Complex mathematical expressions with parentheses
     - Any numeric computation
     
+    Supports numbers, + - * / // % **, parentheses, pi, e and the functions
+    abs, round, min, max, pow, sqrt, exp, log, log10, log2, sin, cos, tan, floor, ceil.
+    
     Args:
-        expression: A valid Python mathematical expression as a string (e.g., "(12 + 3) * 5")
+        expression: A mathematical expression as a string (e.g., "(12 + 3) * 5")
     
     Returns:
         A string with the computed result
     """
     try:
-        result = eval(expression)
+        result = evaluate(expression)
         return f"The result is: {result}"
     except Exception as e:
         return f"Error: {str(e)}"
 
+
+@tool
+def eval_expressions(expressions: list[str]) -> str:
+    """
+    Evaluate several mathematical expressions in one call, in order.
+    
+    Use this tool instead of repeated eval_expression calls for:
+    - Multi-step calculations, naming intermediate results (e.g. ["a = 12 + 3", "a * 3"])
+    - Several independent calculations at once (e.g. ["15 * 0.2", "80 * 0.2"])
+    
+    Args:
+        expressions: Arithmetic expressions or assignments "name = expression";
+            later items may use names assigned by earlier ones
+    
+    Returns:
+        One line per expression with its result or error
+    """
+    lines = []
+    for expression, result in zip(expressions, evaluate_many(expressions)):
+        if isinstance(result, Exception):
+            lines.append(f"{expression} -> Error: {result}")
+            continue
+        try:
+            lines.append(f"{expression} -> {result}")
+        except ValueError as e:  # e.g. str() of an int with more than 4300 digits
+            lines.append(f"{expression} -> Error: {e}")
+    return "\n".join(lines)
+
+
+wiki_client = WikipediaClient(cache_path="./wiki_cache.sqlite")
+
 @tool
 def get_fact(query: str) -> str:
     """
@@ -62,56 +99,15 @@ def get_fact(query: str) -> str:
         A text summary from the relevant Wikipedia article
     """
     try:
-        # Wikipedia requires a proper User-Agent header
-        headers = {
-            "User-Agent": "LangGraphEducationalBot/1.0 (Educational purposes; Python/requests)"
-        }
-        
-        # Step 1: Search for pages
-        search_url = "https://en.wikipedia.org/w/api.php"
-        search_params = {
-            "action": "query",
-            "format": "json",
-            "list": "search",
-            "srsearch": query,
-            "srlimit": 1
-        }
-        
-        search_resp = requests.get(search_url, params=search_params, headers=headers, timeout=10)
-        search_resp.raise_for_status()
-        search_data = search_resp.json()
-        
-        if not search_data.get("query", {}).get("search"):
+        # One round trip (search + extract) over a pooled connection, cached on disk
+        page = wiki_client.lookup(query)
+        if page is None:
             return f"No Wikipedia results found for '{query}'."
-        
-        # Get the page title
-        page_title = search_data["query"]["search"][0]["title"]
-        
-        # Step 2: Get page extract
-        extract_params = {
-            "action": "query",
-            "format": "json",
-            "prop": "extracts",
-            "exintro": True,
-            "explaintext": True,
-            "titles": page_title
-        }
-        
-        extract_resp = requests.get(search_url, params=extract_params, headers=headers, timeout=10)
-        extract_resp.raise_for_status()
-        extract_data = extract_resp.json()
-        
-        pages = extract_data.get("query", {}).get("pages", {})
-        if not pages:
-            return f"Could not retrieve summary for '{page_title}'."
-        
-        # Get first page
-        page = list(pages.values())[0]
-        extract = page.get("extract", "")
-        
+
+        extract = page["extract"]
         if not extract:
-            return f"No summary available for '{page_title}'."
-        
+            return f"No summary available for '{page['title']}'."
+
         # Return first 500 chars for brevity
         return extract[:500] + ("..." if len(extract) > 500 else "")
         
@@ -123,33 +119,25 @@ def get_fact(query: str) -> str:
         return f"Unexpected error: {str(e)}"
 
 
-tools = [eval_expression, get_fact]
-
-# Bind tools to the model so the model can emit tool calls
-model = ChatOpenAI(model="gpt-4o").bind_tools(tools)
-
+tools = [eval_expression, eval_expressions, get_fact]
 
-def call_model(state: State) -> State:
-    """Send current messages to the LLM and wrap the reply into state."""
-    system_prompt = SystemMessage(content="""You are a helpful AI assistant with access to tools.
+SYSTEM_PROMPT = SystemMessage(content="""You are a helpful AI assistant with access to tools.
 
 TOOL USAGE GUIDELINES:
 - Use 'get_fact' to look up factual information from Wikipedia (population, geography, historical facts, etc.)
 - Use 'eval_expression' to perform mathematical calculations and arithmetic operations
+- Use 'eval_expressions' for multi-step or multiple calculations in a single call (name intermediate results, e.g. "a = 12 + 3", "a * 3")
 - For creative tasks (poems, stories, opinions), answer directly WITHOUT using tools
 
 DECISION PROCESS:
 1. Analyze the user's query carefully
 2. If it requires factual data you don't have, use 'get_fact'
-3. If it requires numerical computation, use 'eval_expression'  
+3. If it requires numerical computation, use 'eval_expression' (or 'eval_expressions' for several steps)  
 4. If it's creative/subjective, respond directly with your own knowledge
 5. You can use multiple tools in parallel if needed
 
 Always provide clear, helpful responses based on the tool results or your own knowledge."""
-    )
-    # ensure we pass a list of messages to the model
-    response = model.invoke([system_prompt] + list(state["messages"]))
-    return {"messages": [response]}
+)
 
 
 def decide_route(state: State):
@@ -162,73 +150,51 @@ def decide_route(state: State):
     return "end"
     
 
-graph = StateGraph(State)
-graph.add_node("the_agent", call_model)
+def build_app(chat_model=None):
+    """Compile the ReAct graph around `chat_model` (gpt-4o by default).
 
+    The agent node has a sync and an async version, so the compiled graph works
+    with both `stream`/`invoke` and `astream`/`ainvoke` (see react_server.py).
+    """
+    if chat_model is None:
+        chat_model = registry.chat("gpt-4o")
+    # Bind tools to the model so the model can emit tool calls
+    model = registry.with_tools(chat_model, tools)
 
-tool_node = ToolNode(tools=tools)
-graph.add_node("tools", tool_node)
+    def call_model(state: State) -> State:
+        """Send current messages to the LLM and wrap the reply into state."""
+        # ensure we pass a list of messages to the model
+        response = model.invoke([SYSTEM_PROMPT] + list(state["messages"]))
+        return {"messages": [response]}
 
-graph.set_entry_point("the_agent")
+    async def acall_model(state: State) -> State:
+        response = await model.ainvoke([SYSTEM_PROMPT] + list(state["messages"]))
+        return {"messages": [response]}
 
-graph.add_conditional_edges(
-    "the_agent",
-    decide_route,
-    {
-        "continue": "tools",
-        "end": END,
-    },
-)
+    graph = StateGraph(State)
+    graph.add_node("the_agent", RunnableLambda(call_model, afunc=acall_model))
 
-graph.add_edge("tools", "the_agent")
 
-app = graph.compile()
+    tool_node = ToolNode(tools=tools)
+    graph.add_node("tools", tool_node)
 
-def print_stream(stream):
-    def safe_print(text: str):
-        try:
-            print(text)
-        except UnicodeEncodeError:
-            enc = getattr(sys.stdout, "encoding", "utf-8") or "utf-8"
-            print(text.encode(enc, errors="replace").decode(enc))
-
-    step = 0
-    for s in stream:
-        step += 1
-        safe_print(f"\n--- Stream update #{step} ---")
-        
-        # Print ALL messages in this update to see tool results
-        messages = s.get("messages", [])
-        for msg in messages[-3:]:  # Show last 3 messages for context
-            try:
-                if isinstance(msg, tuple):
-                    role, content = msg
-                    safe_print(f"{role.upper()}: {content}")
-                    continue
-
-                # Prefer pretty_repr when available to get a string representation
-                pretty = None
-                if hasattr(msg, "pretty_repr"):
-                    try:
-                        pretty = msg.pretty_repr(html=False)
-                    except Exception:
-                        pretty = None
-
-                if pretty:
-                    safe_print(pretty)
-                else:
-                    role = getattr(msg, "role", getattr(msg, "type", "assistant"))
-                    content = getattr(msg, "content", str(msg))
-                    safe_print(f"{role}: {content}")
-
-                tool_calls = getattr(msg, "tool_calls", None)
-                if tool_calls:
-                    safe_print("Tool calls:")
-                    for tc in tool_calls:
-                        safe_print(f" - {tc}")
-
-            except Exception as e:
-                safe_print(f"<print error: {e}>")
-
-inputs = {"messages": [("user", "Tell the population of France. Next, add 12 + 3 and then multiply the result by 3. Also, tell me a poem about sea please.")]}
-print_stream(app.stream(inputs, stream_mode="values"))
\ No newline at end of file
+    graph.set_entry_point("the_agent")
+
+    graph.add_conditional_edges(
+        "the_agent",
+        decide_route,
+        {
+            "continue": "tools",
+            "end": END,
+        },
+    )
+
+    graph.add_edge("tools", "the_agent")
+
+    return graph.compile()
+
+
+if __name__ == "__main__":
+    app = build_app()
+    inputs = {"messages": [("user", "Tell the population of France. Next, add 12 + 3 and then multiply the result by 3. Also, tell me a poem about sea please.")]}
+    StreamRenderer().render(app, inputs)
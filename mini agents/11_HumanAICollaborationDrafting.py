@@ -1,22 +1,163 @@
+import argparse
 import json
+import threading
+import time
+import uuid
 from datetime import datetime
 from typing import Annotated, Sequence, TypedDict
 from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage, SystemMessage
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import ensure_config
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, END
+from langgraph.types import interrupt
+from tool_executor import ToolCallExecutor, default_on_error
+from chat_store import ChatStore
+from context_packing import count_tokens
+from draft_sections import refine_sections
+from draft_store import DraftStore
+from drafting_sessions import DraftingSessions
+from model_registry import registry
+from speculative_refine import SpeculativeRefiner
 
 load_dotenv()
 
+# Every draft version and piece of feedback is written here as soon as it exists.
+draft_store = DraftStore("draft_versions.sqlite")
+
 
 class State(TypedDict):
     """State to track messages and drafting process"""
     messages: Annotated[Sequence[BaseMessage], add_messages]
     current_draft: str
     draft_version: int
+    document_id: str  # key of the draft's versions and feedback log in draft_store
     feedback_history: list[dict]
+    generation_stats: list[dict]  # time to first token and tokens/sec, one entry per version
+
+
+print_lock = threading.Lock()
+
+# Opt-in (`--speculate`): likely refinements of each shown draft are generated
+# in the background while the user reads it. See speculative_refine.py.
+speculator = None
+
+REFINE_SYSTEM_PROMPT = """You are a professional writing assistant.
+Refine an existing draft based on specific feedback.
+
+GUIDELINES:
+- Keep the parts that work well
+- Apply the feedback precisely
+- Maintain coherent structure
+- Preserve the original intent unless feedback changes it
+
+Respond with ONLY the updated draft, no explanations."""
+
+
+def refine_messages(draft: str, feedback: str) -> list:
+    """Prompt for regenerating the whole draft with the feedback applied"""
+    return [
+        SystemMessage(content=REFINE_SYSTEM_PROMPT),
+        HumanMessage(content=f"""Here is the current draft:
+---
+{draft}
+---
+
+User feedback: {feedback}
+
+Please update the draft based on this feedback.""")
+    ]
+
+
+async def stream_refinement(draft: str, feedback: str):
+    """Whole-draft refinement as streamed text, for speculative refinements"""
+    llm = registry.chat("gpt-4o", streaming=True)
+    async for chunk in llm.astream(refine_messages(draft, feedback)):
+        yield chunk.content
+
+
+def show_draft(version: int, draft: str):
+    """Print a draft; the lock keeps drafts from concurrent tool calls from interleaving"""
+    with print_lock:
+        print("\n" + "="*60)
+        print(f"📄 DRAFT VERSION {version}")
+        print("="*60)
+        print(draft)
+        print("="*60)
+
+
+class DraftStream(BaseCallbackHandler):
+    """Print a draft's tokens as the model produces them and time the generation.
+
+    Only one draft streams to the console at a time; a draft generated
+    concurrently by another tool call is printed whole once it is done.
+    """
+
+    def __init__(self, version: int):
+        self.version = version
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.live = False
+        self.printed = False
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        if not token:
+            return
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            self.live = self.printed = print_lock.acquire(blocking=False)
+            if self.live:
+                print("\n" + "="*60)
+                print(f"📄 DRAFT VERSION {self.version}")
+                print("="*60)
+        if self.live:
+            print(token, end="", flush=True)
+
+    def close(self):
+        if self.live:
+            print("\n" + "="*60)
+            self.live = False
+            print_lock.release()
+
+
+def generation_stats(version: int, draft: str, seconds: float, ttft: float = None, **extra) -> dict:
+    """Per-version timings for the session summary"""
+    tokens = count_tokens(draft)
+    streaming = seconds - ttft if ttft is not None else seconds
+    return {
+        "version": version,
+        "ttft": round(ttft, 3) if ttft is not None else None,
+        "seconds": round(seconds, 3),
+        "tokens": tokens,
+        "tokens_per_second": round(tokens / streaming, 1) if streaming > 0 else None,
+        **extra
+    }
+
+
+def generate_draft(llm, messages: list, version: int) -> tuple[str, dict]:
+    """Generate a whole draft, streaming it to the console and to graph stream consumers.
+
+    The caller gets the complete text only, so `current_draft` is updated in one step.
+    """
+    stream = DraftStream(version)
+    # Add the printer to the graph's callbacks (inherited from the running node), not replace them.
+    callbacks = ensure_config().get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.add_handler(stream)
+    else:
+        callbacks = [*(callbacks or []), stream]
+    try:
+        draft = llm.invoke(messages, config={"callbacks": callbacks}).content
+    finally:
+        stream.close()
+    seconds = time.perf_counter() - stream.started
+    if not stream.printed:  # answered from the cache, or another draft was streaming
+        show_draft(version, draft)
+    first_token = stream.first_token or time.perf_counter()
+    return draft, generation_stats(version, draft, seconds, ttft=first_token - stream.started)
 
 
 def create_draft_implementation(topic: str, state: State) -> dict:
@@ -32,24 +173,24 @@ GUIDELINES:
 
 Generate ONLY the draft content, no explanations or meta-commentary."""
     
-    llm = ChatOpenAI(model="gpt-4o")
-    response = llm.invoke([
+    llm = registry.chat("gpt-4o", streaming=True)
+    draft, stats = generate_draft(llm, [
         SystemMessage(content=system_prompt),
         HumanMessage(content=f"Create a draft for: {topic}")
-    ])
+    ], version=1)
     
-    draft = response.content
+    if speculator:
+        speculator.speculate(draft)
     
-    print("\n" + "="*60)
-    print("📄 DRAFT VERSION 1")
-    print("="*60)
-    print(draft)
-    print("="*60)
+    document_id = f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}"
+    version, _ = draft_store.put_version(document_id, draft)
     
     return {
         "current_draft": draft,
-        "draft_version": 1,
-        "feedback_history": []
+        "draft_version": version,
+        "document_id": document_id,
+        "feedback_history": [],
+        "generation_stats": [stats]
     }
 
 
@@ -65,45 +206,46 @@ def refine_draft_implementation(feedback: str, state: State) -> dict:
         "timestamp": datetime.now().isoformat()
     }
     
-    system_prompt = """You are a professional writing assistant.
-Refine an existing draft based on specific feedback.
-
-GUIDELINES:
-- Keep the parts that work well
-- Apply the feedback precisely
-- Maintain coherent structure
-- Preserve the original intent unless feedback changes it
-
-Respond with ONLY the updated draft, no explanations."""
-    
-    llm = ChatOpenAI(model="gpt-4o")
-    response = llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"""Here is the current draft:
----
-{state['current_draft']}
----
-
-User feedback: {feedback}
-
-Please update the draft based on this feedback.""")
-    ])
-    
-    draft = response.content
-    new_version = state["draft_version"] + 1
-    
-    print("\n" + "="*60)
-    print(f"📄 DRAFT VERSION {new_version}")
-    print("="*60)
-    print(draft)
-    print("="*60)
-    
+    llm = registry.chat("gpt-4o", streaming=True)
+    new_version = state["draft_version"] + 1  # shown while generating; the store assigns the final number
+    stats = None
+
+    def rewrite_all(draft: str, feedback: str) -> str:
+        nonlocal stats
+        draft, stats = generate_draft(llm, refine_messages(draft, feedback), new_version)
+        return draft
+
+    # A refinement generated while the user was reading is served right away.
+    started = time.perf_counter()
+    draft = speculator.take(state["current_draft"], feedback) if speculator else None
+    if draft is not None:
+        new_feedback["sections"], new_feedback["speculative"] = "all", True
+        show_draft(new_version, draft)
+        stats = generation_stats(new_version, draft, time.perf_counter() - started, speculative=True)
+    else:
+        # Feedback about one part of the draft only regenerates the sections it affects.
+        draft, sections = refine_sections(
+            llm, REFINE_SYSTEM_PROMPT, state["current_draft"], feedback, rewrite_all
+        )
+        new_feedback["sections"] = sections
+        if stats is None:  # section edits are spliced in, so they are shown once complete
+            show_draft(new_version, draft)
+            stats = generation_stats(new_version, draft, time.perf_counter() - started, sections=sections)
+    
+    if speculator:
+        speculator.speculate(draft)
+    
+    document_id = state["document_id"]
+    new_version, _ = draft_store.put_version(document_id, draft)
+    stats["version"] = new_version
+    draft_store.append_log(document_id, new_feedback)
     updated_history = state.get("feedback_history", []) + [new_feedback]
     
     return {
         "current_draft": draft,
         "draft_version": new_version,
-        "feedback_history": updated_history
+        "feedback_history": updated_history,
+        "generation_stats": state.get("generation_stats", []) + [stats]
     }
 
 
@@ -119,10 +261,15 @@ def save_draft_implementation(filename: str, state: State) -> str:
     if filename == ".json":
         filename = f"draft_{timestamp}.json"
     
+    # The versions themselves stay in the version store; the file only lists their hashes.
+    document_id = state["document_id"]
     output = {
         "final_draft": state["current_draft"],
         "final_version": state["draft_version"],
+        "document_id": document_id,
+        "versions": draft_store.versions(document_id),
         "feedback_history": state.get("feedback_history", []),
+        "generation_stats": state.get("generation_stats", []),
         "created_at": datetime.now().isoformat(),
         "status": "approved"
     }
@@ -131,10 +278,25 @@ def save_draft_implementation(filename: str, state: State) -> str:
         with open(filename, "w", encoding="utf-8") as f:
             json.dump(output, f, ensure_ascii=False, indent=2)
         
+        draft_store.append_log(document_id, {
+            "event": "approved",
+            "version": state["draft_version"],
+            "file": filename,
+            "timestamp": datetime.now().isoformat()
+        })
+        
         print(f"\n💾 Draft saved to: {filename}")
         print(f"📊 Total versions created: {state['draft_version']}")
         print(f"🔄 Feedback rounds: {len(state.get('feedback_history', []))}")
+        for stats in state.get("generation_stats", []):
+            ttft = f"{stats['ttft']:.2f}s" if stats["ttft"] is not None else "-"
+            rate = f"{stats['tokens_per_second']:.0f}" if stats["tokens_per_second"] else "-"
+            note = " (speculative)" if stats.get("speculative") else ""
+            print(f"⏱️  Version {stats['version']}: first token {ttft}, {rate} tokens/s, "
+                  f"{stats['tokens']} tokens in {stats['seconds']:.2f}s{note}")
         print("\n✨ Session complete! Your draft is ready to use.\n")
+        if speculator:
+            speculator.discard(state["current_draft"])
         
         return f"Draft has been saved successfully to '{filename}'."
     
@@ -191,10 +353,9 @@ def save_draft(filename: str) -> str:
 
 
 tools = [create_draft, refine_draft, save_draft]
-model = ChatOpenAI(model="gpt-4o").bind_tools(tools)
 
 
-def drafting_agent(state: State) -> State:
+def drafting_agent(state: State, model) -> State:
     """The main agent that helps users create and refine drafts"""
     draft_version = state.get("draft_version", 0)
     current_draft = state.get("current_draft", "")
@@ -216,8 +377,10 @@ Be conversational and guide the user through the drafting process.""")
         user_input = "Hello! I'm ready to help you create a draft. What would you like to draft today?"
         user_message = HumanMessage(content=user_input)
     else:
-        user_input = input("\n👤 You: ")
-        print("")
+        # Pause here until the user answers. The run is checkpointed and holds no
+        # thread while it waits; `Command(resume=text)` continues it (see drafting_sessions.py).
+        last_reply = state["messages"][-1].content if state["messages"] else ""
+        user_input = interrupt({"reply": last_reply, "draft_version": draft_version})
         user_message = HumanMessage(content=user_input)
     
     all_messages = [system_prompt] + list(state.get("messages", [])) + [user_message]
@@ -231,6 +394,52 @@ Be conversational and guide the user through the drafting process.""")
     return {"messages": [user_message, response]}
 
 
+# Tool calls from one turn run concurrently. Every call sees the same state
+# snapshot and the updates are merged in call order, as before.
+tool_executor = ToolCallExecutor(
+    max_workers=4,
+    per_tool_limits={"create_draft": 2, "refine_draft": 2, "save_draft": 1},
+    timeout=120
+)
+
+
+def run_tool_call(tool_call: dict, state: State) -> tuple[dict, ToolMessage]:
+    """Run one tool call and return its state updates and the ToolMessage for the model"""
+    tool_name = tool_call["name"]
+    tool_args = tool_call["args"]
+    
+    if tool_name == "create_draft":
+        result = create_draft_implementation(tool_args["topic"], state)
+        return result, ToolMessage(
+            content="Draft created successfully!",
+            tool_call_id=tool_call["id"]
+        )
+    
+    elif tool_name == "refine_draft":
+        result = refine_draft_implementation(tool_args["feedback"], state)
+        if result:
+            return result, ToolMessage(
+                content=f"Draft refined to version {result['draft_version']}!",
+                tool_call_id=tool_call["id"]
+            )
+        return {}, ToolMessage(
+            content="Error: No draft exists yet.",
+            tool_call_id=tool_call["id"]
+        )
+    
+    elif tool_name == "save_draft":
+        result = save_draft_implementation(tool_args["filename"], state)
+        return {}, ToolMessage(
+            content=result,
+            tool_call_id=tool_call["id"]
+        )
+    
+    return {}, ToolMessage(
+        content=f"Error: Unknown tool '{tool_name}'.",
+        tool_call_id=tool_call["id"]
+    )
+
+
 def execute_tools(state: State) -> dict:
     """Custom tool execution node that has access to state"""
     messages = state.get("messages", [])
@@ -242,49 +451,20 @@ def execute_tools(state: State) -> dict:
     if not hasattr(last_message, "tool_calls") or not last_message.tool_calls:
         return {}
     
+    outcomes = tool_executor.run(
+        last_message.tool_calls,
+        lambda tool_call: run_tool_call(tool_call, state),
+        on_error=lambda tool_call, e: (
+            {},
+            ToolMessage(content=default_on_error(tool_call, e), tool_call_id=tool_call["id"])
+        )
+    )
+    
     tool_messages = []
     state_updates = {}
-    
-    for tool_call in last_message.tool_calls:
-        tool_name = tool_call["name"]
-        tool_args = tool_call["args"]
-        
-        if tool_name == "create_draft":
-            result = create_draft_implementation(tool_args["topic"], state)
-            state_updates.update(result)
-            tool_messages.append(
-                ToolMessage(
-                    content="Draft created successfully!",
-                    tool_call_id=tool_call["id"]
-                )
-            )
-        
-        elif tool_name == "refine_draft":
-            result = refine_draft_implementation(tool_args["feedback"], state)
-            if result:
-                state_updates.update(result)
-                tool_messages.append(
-                    ToolMessage(
-                        content=f"Draft refined to version {result['draft_version']}!",
-                        tool_call_id=tool_call["id"]
-                    )
-                )
-            else:
-                tool_messages.append(
-                    ToolMessage(
-                        content="Error: No draft exists yet.",
-                        tool_call_id=tool_call["id"]
-                    )
-                )
-        
-        elif tool_name == "save_draft":
-            result = save_draft_implementation(tool_args["filename"], state)
-            tool_messages.append(
-                ToolMessage(
-                    content=result,
-                    tool_call_id=tool_call["id"]
-                )
-            )
+    for updates, tool_message in outcomes:
+        state_updates.update(updates)
+        tool_messages.append(tool_message)
     
     state_updates["messages"] = tool_messages
     return state_updates
@@ -319,37 +499,50 @@ def route_after_agent(state: State) -> str:
     return "continue"
 
 
-# Build the graph
-graph = StateGraph(State)
+def build_app(chat_model=None, checkpointer=None):
+    """Compile the drafting graph around `chat_model` (gpt-4o by default).
 
-graph.add_node("agent", drafting_agent)
-graph.add_node("tools", execute_tools)
+    Waiting for the user is an interrupt, so the graph needs a checkpointer to
+    keep sessions between turns.
+    """
+    if chat_model is None:
+        chat_model = registry.chat("gpt-4o")
+    model = registry.with_tools(chat_model, tools)
 
-graph.set_entry_point("agent")
+    graph = StateGraph(State)
 
-graph.add_conditional_edges(
-    "agent",
-    route_after_agent,
-    {
-        "tools": "tools",
-        "continue": "agent"
-    }
-)
+    graph.add_node("agent", lambda state: drafting_agent(state, model))
+    graph.add_node("tools", execute_tools)
 
-graph.add_conditional_edges(
-    "tools",
-    should_continue,
-    {
-        "continue": "agent",
-        "end": END,
-    },
-)
+    graph.set_entry_point("agent")
 
-app = graph.compile()
+    graph.add_conditional_edges(
+        "agent",
+        route_after_agent,
+        {
+            "tools": "tools",
+            "continue": "agent"
+        }
+    )
 
+    graph.add_conditional_edges(
+        "tools",
+        should_continue,
+        {
+            "continue": "agent",
+            "end": END,
+        },
+    )
 
-def run_drafting_agent():
+    return graph.compile(checkpointer=checkpointer)
+
+
+def run_drafting_agent(speculate: bool = False):
     """Run the interactive drafting session"""
+    global speculator
+    if speculate:
+        speculator = SpeculativeRefiner(stream_refinement, max_speculations=2)
+    registry.warm_up(background=True)  # opens API connections while the banner is read
     print("\n" + "="*60)
     print("📝 HUMAN-AI COLLABORATION DRAFTING AGENT")
     print("="*60)
@@ -364,16 +557,44 @@ def run_drafting_agent():
         "messages": [],
         "current_draft": "",
         "draft_version": 0,
-        "feedback_history": []
+        "document_id": "",
+        "feedback_history": [],
+        "generation_stats": []
     }
     
-    for step in app.stream(initial_state, stream_mode="values"):
-        pass  # State is being updated automatically
+    # Sessions are checkpointed to disk, so an unfinished draft survives a restart.
+    sessions = DraftingSessions(build_app(checkpointer=ChatStore("drafting_sessions.jsonl")))
+    session_id = "cli"
+    status = sessions.status(session_id)
+    if status == "done":
+        sessions.close(session_id)
+    if status == "waiting":
+        outcome = sessions.pending(session_id)
+        print(f"\nResuming your unfinished session (draft version {outcome['draft_version']}).")
+        if outcome["current_draft"]:
+            show_draft(outcome["draft_version"], outcome["current_draft"])
+    else:
+        outcome = sessions.start(session_id, initial_state)
+    
+    while outcome["waiting"]:
+        user_input = input("\n👤 You: ")
+        print("")
+        outcome = sessions.resume(session_id, user_input)
+    sessions.app.checkpointer.close()
     
     print("\n" + "="*60)
     print("✨ DRAFTING SESSION COMPLETE")
     print("="*60)
+    if speculator:
+        speculator.close()
+        stats = speculator.stats()
+        print(f"⚡ Speculative refinements: {stats['hits']}/{stats['hits'] + stats['misses']} served "
+              f"(hit rate {stats['hit_rate']:.0%}), {stats['saved_seconds']:.1f}s saved, "
+              f"{stats['wasted_output_tokens']} output tokens wasted")
 
 
 if __name__ == "__main__":
-    run_drafting_agent()
+    parser = argparse.ArgumentParser(description="Create and refine drafts with an AI assistant.")
+    parser.add_argument("--speculate", action="store_true",
+                        help="prepare likely refinements (shorter, more formal, tone) while you read each draft")
+    run_drafting_agent(speculate=parser.parse_args().speculate)
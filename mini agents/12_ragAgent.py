@@ -13,103 +13,211 @@ from langchain_core.messages import (
 
 from langgraph.graph import StateGraph, END
 
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 
+from langchain_core.documents import Document
 from langchain_core.tools import tool
 
+from bm25_index import BM25Index, HybridRetriever
+from context_packing import pack_documents
+from embedding_cache import CachedEmbeddings
+from llm_cache import enable_llm_cache
+from model_registry import registry
+from numpy_store import NumpyVectorStore
+from query_cache import CachedRetriever, QueryResultCache
+from tool_executor import ToolCallExecutor
+from rag_index import (
+    IngestionManifest,
+    IngestProgress,
+    find_pdfs,
+    iter_pdf_chunks,
+    lexical_index_in_sync,
+    store_version,
+    sync_sources,
+    sync_sources_parallel
+)
+
 # ===============================
 # Setup
 # ===============================
 
 load_dotenv()
 
-llm = ChatOpenAI(
-    model="gpt-4o",
+llm = registry.chat(
+    "gpt-4o",
     temperature=0   # minimal hallucination
 )
 
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small"
+# Every document and query embedding goes through a disk cache, so chunks and
+# repeated questions are only ever sent to the API once.
+embedding_model = "text-embedding-3-small"
+embeddings = CachedEmbeddings(
+    registry.embeddings(embedding_model),
+    model=embedding_model,
+    path="./embedding_cache.sqlite"
 )
 
-pdf_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "RagFiles", "A Comprehensive History of Artificial Intelligence.pdf"))
+# Model responses are cached too: repeated prompts are answered from disk, and a
+# near-duplicate single question matches by embedding similarity, but only when
+# it names the same years, numbers and names (see embedding_cache.key_terms).
+enable_llm_cache("./llm_cache.sqlite", embeddings=embeddings)
 
-if not os.path.exists(pdf_path):
-    raise FileNotFoundError(f"PDF not found: {pdf_path}")
+# Every PDF in this folder is indexed. A glob pattern such as
+# os.path.join(rag_dir, "*History*.pdf") works as well.
+rag_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "RagFiles"))
+rag_source = rag_dir
 
-# ===============================
-# Load PDF
-# ===============================
+pdf_paths = find_pdfs(rag_source)
 
-try:
-    loader = PyPDFLoader(pdf_path)
-    documents = loader.load()
-    print(f"PDF loaded successfully ({len(documents)} pages)")
-except Exception as e:
-    raise RuntimeError(f"Error loading PDF: {e}")
+if not pdf_paths:
+    raise FileNotFoundError(f"No PDFs found in: {rag_source}")
 
 # ===============================
 # Chunking
 # ===============================
 
+chunk_size = 900
+chunk_overlap = 200
+
 splitter = RecursiveCharacterTextSplitter(
-    chunk_size=900,
-    chunk_overlap=200
+    chunk_size=chunk_size,
+    chunk_overlap=chunk_overlap,
+    add_start_index=True   # lets search results merge overlapping neighbours
 )
 
-chunks = splitter.split_documents(documents)
+# Pages are read and split lazily and upserted in batches of this many chunks,
+# so memory use depends on the batch size, not on the size of the PDF.
+ingest_batch_size = 64
+
+# With several PDFs, documents are parsed and chunked in this many worker
+# processes (one document per worker) and written by a single writer.
+ingest_workers = os.cpu_count() or 1
+
+progress = IngestProgress()
+
+def load_chunks(path: str):
+    """Stream chunks of one PDF (only called for new or changed files)."""
+    print(f"Ingesting PDF: {os.path.basename(path)}")
+    return iter_pdf_chunks(path, splitter, progress)
 
 # ===============================
-# Vector Store (ChromaDB)
+# Vector Store (ChromaDB or NumPy)
 # ===============================
 
-persist_dir = "./ai_history_rag_db"
+# "chroma" (default) or "numpy": a memory-mapped matrix that starts faster and
+# is shared between processes through the OS page cache (see numpy_store.py).
+vector_backend = "chroma"
+
+persist_dir = "./ai_history_rag_db" if vector_backend == "chroma" else "./ai_history_rag_npy"
 collection_name = "ai_history"
 
-if not os.path.exists(persist_dir):
-    os.makedirs(persist_dir)
+# BM25 keyword index over the same chunks, kept next to the vector store files.
+lexical_index_path = os.path.join(persist_dir, "bm25_index.json")
 
-try:
-    vectorstore = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=persist_dir,
-        collection_name=collection_name
-    )
-    print("Vectorstore created.")
-except Exception as e:
-    raise RuntimeError(f"ChromaDB setup error: {e}")
+def build_vectorstore():
+    """Open the persisted collection and keyword index and sync them with the PDFs in `rag_source`."""
+    if not os.path.exists(persist_dir):
+        os.makedirs(persist_dir)
 
-retriever = vectorstore.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 5}
-)
+    try:
+        # Reuse the persisted collection and only embed chunks that are new or changed.
+        if vector_backend == "numpy":
+            vectorstore = NumpyVectorStore(persist_dir, embedding=embeddings)
+        else:
+            vectorstore = Chroma(
+                collection_name=collection_name,
+                embedding_function=embeddings,
+                persist_directory=persist_dir
+            )
+        manifest = IngestionManifest.for_store(persist_dir)
+
+        lexical_index = BM25Index(lexical_index_path)
+        if not lexical_index_in_sync(manifest, lexical_index):
+            # First run with the keyword index, or an interrupted sync: rebuild it from the stored chunks.
+            print("Rebuilding keyword index from the vector store...")
+            stored = vectorstore.get(include=["documents", "metadatas"])
+            lexical_index.delete(list(lexical_index.docs))
+            lexical_index.add_documents(
+                [Document(page_content=text, metadata=meta or {}) for text, meta in zip(stored["documents"], stored["metadatas"])],
+                ids=stored["ids"]
+            )
+
+        if len(pdf_paths) > 1 and ingest_workers > 1:
+            stats = sync_sources_parallel(
+                vectorstore,
+                pdf_paths,
+                manifest,
+                root=rag_dir,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                workers=ingest_workers,
+                batch_size=ingest_batch_size,
+                progress=progress,
+                lexical_index=lexical_index
+            )
+        else:
+            stats = sync_sources(
+                vectorstore,
+                pdf_paths,
+                manifest,
+                load_chunks,
+                root=rag_dir,
+                batch_size=ingest_batch_size,
+                progress=progress,
+                lexical_index=lexical_index
+            )
+        if progress.pages:
+            progress.report(force=True)
+        print(
+            f"Vectorstore ready ({len(pdf_paths)} PDFs): {stats['chunks_added']} chunks embedded, "
+            f"{stats['chunks_reused']} reused, {stats['chunks_deleted']} deleted."
+        )
+    except Exception as e:
+        raise RuntimeError(f"Ingestion / vector store setup error: {e}")
+
+    return vectorstore, lexical_index
 
 # ===============================
 # Tool: Retriever
 # ===============================
 
+retriever = None  # created in __main__ once the vector store is ready
+
+# Tool results stay in the conversation, so they are packed: overlapping chunks
+# of a page are merged, near-duplicates dropped, and the text capped at this
+# many tokens. Set mmr_lambda (e.g. 0.7) to also diversify the results.
+context_token_budget = 1200
+mmr_lambda = None
+
 @tool
 def search_history(query: str) -> str:
-    """Searches the AI History PDF and returns relevant extracted text."""
+    """Searches the AI History PDFs and returns relevant extracted text with its source and page."""
     docs = retriever.invoke(query)
 
     if not docs:
         return "No relevant information found."
 
+    passages = pack_documents(
+        query,
+        docs,
+        token_budget=context_token_budget,
+        embeddings=embeddings,
+        mmr_lambda=mmr_lambda
+    )
+
     out = []
-    for idx, d in enumerate(docs):
-        out.append(f"Result {idx+1}:\n{d.page_content}")
+    for idx, p in enumerate(passages):
+        source = p.source or "unknown"
+        where = f"{source}, page {p.page + 1}" if isinstance(p.page, int) else source
+        out.append(f"Result {idx+1} ({where}):\n{p.text}")
 
     return "\n\n".join(out)
 
 tools = [search_history]
 tools_dict = {t.name: t for t in tools}
 
-llm = llm.bind_tools(tools)
+llm = registry.with_tools(llm, tools)
 
 # ===============================
 # LangGraph State
@@ -124,10 +232,10 @@ def should_continue(state: AgentState):
 
 system_prompt = """
 You are an AI assistant specialized in answering questions.
-Your knowledge comes ONLY from the PDF that was loaded into the system.
+Your knowledge comes ONLY from the PDFs that were loaded into the system.
 
 Use the tool `search_history` whenever you need to fetch factual info.
-Cite the information you retrieve.
+Cite the information you retrieve (document name and page).
 """
 
 # ===============================
@@ -143,28 +251,36 @@ def call_llm(state: AgentState) -> AgentState:
 # Tool Execution
 # ===============================
 
-def run_tool(state: AgentState) -> AgentState:
-    tool_calls = state["messages"][-1].tool_calls
-    results = []
+# Several search_history calls in one turn run concurrently; results keep the
+# order of the tool calls.
+tool_executor = ToolCallExecutor(
+    max_workers=8,
+    per_tool_limits={"search_history": 4},
+    timeout=30
+)
 
-    for call in tool_calls:
-        tool_name = call["name"]
-        args = call["args"].get("query", "")
+def call_tool(call: dict):
+    tool_name = call["name"]
+    args = call["args"].get("query", "")
 
-        print(f"Using tool: {tool_name} | Query: {args}")
+    print(f"Using tool: {tool_name} | Query: {args}")
 
-        if tool_name not in tools_dict:
-            tool_output = "Invalid tool name."
-        else:
-            tool_output = tools_dict[tool_name].invoke(args)
+    if tool_name not in tools_dict:
+        return "Invalid tool name."
+    return tools_dict[tool_name].invoke(args)
 
-        results.append(
-            ToolMessage(
-                tool_call_id=call["id"],
-                name=tool_name,
-                content=str(tool_output)
-            )
+def run_tool(state: AgentState) -> AgentState:
+    tool_calls = state["messages"][-1].tool_calls
+    outputs = tool_executor.run(tool_calls, call_tool)
+
+    results = [
+        ToolMessage(
+            tool_call_id=call["id"],
+            name=call["name"],
+            content=str(tool_output)
         )
+        for call, tool_output in zip(tool_calls, outputs)
+    ]
 
     return {"messages": results}
 
@@ -195,6 +311,7 @@ rag_agent = graph.compile()
 
 def run():
     print("\n=== AI HISTORY RAG AGENT ===")
+    registry.warm_up(background=True)  # opens API connections while the user types
 
     while True:
         user_input = input("\nYour question: ")
@@ -206,4 +323,41 @@ def run():
         print("\n=== ANSWER ===")
         print(result["messages"][-1].content)
 
-run()
+    cache_stats = embeddings.stats()
+    print(
+        f"\nEmbedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+        f"({cache_stats['entries']} entries, {cache_stats['bytes'] / 1e6:.1f} MB on disk)"
+    )
+    if isinstance(retriever, CachedRetriever):
+        result_stats = retriever.cache.stats()
+        print(
+            f"Search result cache: {result_stats['hit_rate']:.0%} hit rate "
+            f"({result_stats['exact_hits']} exact, {result_stats['similar_hits']} similar, "
+            f"{result_stats['misses']} misses), {result_stats['saved_seconds']:.2f}s saved"
+        )
+
+# The guard matters: parallel ingestion starts worker processes that re-import this file.
+if __name__ == "__main__":
+    vectorstore, lexical_index = build_vectorstore()
+    # Vector and BM25 candidates are merged with reciprocal rank fusion, so exact
+    # names, years and acronyms are found on the first search.
+    retriever = HybridRetriever(
+        vector_retriever=vectorstore.as_retriever(
+            search_type="similarity",
+            search_kwargs={"k": 20}
+        ),
+        lexical_index=lexical_index,
+        k=8,   # packing trims this to the token budget
+        fetch_k=20
+    )
+    # Repeated and near-identical questions (same years and names) are answered
+    # from memory. The cache empties itself whenever the ingestion manifest changes.
+    query_cache = QueryResultCache(
+        max_entries=512,
+        ttl_seconds=3600,
+        embeddings=embeddings,
+        similarity_threshold=0.95,
+        version=lambda: store_version(persist_dir)
+    )
+    retriever = CachedRetriever(retriever=retriever, cache=query_cache)
+    run()
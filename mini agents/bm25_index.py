@@ -0,0 +1,156 @@
+"""Local BM25 keyword index and hybrid (keyword + vector) retrieval.
+
+Vector search is good at paraphrases but often misses exact terms such as
+names, years and acronyms. `BM25Index` is a small in-process inverted index
+that is updated together with the vector store during ingestion and saved as
+JSON next to it. `HybridRetriever` runs both searches and merges the two
+rankings with reciprocal rank fusion (RRF).
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Any
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from rag_index import chunk_id
+
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens; numbers and acronyms are kept as they are."""
+    return TOKEN_RE.findall(text.lower())
+
+
+def document_key(doc: Document) -> str:
+    """The id a chunk is stored under, recomputed from its content when the store did not return it."""
+    if getattr(doc, "id", None):
+        return doc.id
+    return chunk_id(doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content)
+
+
+class BM25Index:
+    """Okapi BM25 over chunks, with incremental add/delete and JSON persistence."""
+
+    def __init__(self, path: str = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.docs = {}  # id -> {"text", "metadata", "tf"}
+        self.postings = defaultdict(dict)  # term -> {id: term frequency}
+        self.lengths = {}
+        self.total_length = 0
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for doc_id, doc in json.load(f)["docs"].items():
+                    self._index(doc_id, doc)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def ids(self):
+        """The ids of the indexed chunks (a live set-like view)."""
+        return self.docs.keys()
+
+    def _index(self, doc_id: str, doc: dict):
+        self.docs[doc_id] = doc
+        for term, count in doc["tf"].items():
+            self.postings[term][doc_id] = count
+        length = sum(doc["tf"].values())
+        self.lengths[doc_id] = length
+        self.total_length += length
+
+    def _unindex(self, doc_id: str):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for term in doc["tf"]:
+            postings = self.postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id)
+
+    def add_documents(self, documents: list[Document], ids: list[str]):
+        for doc_id, doc in zip(ids, documents):
+            self._unindex(doc_id)
+            self._index(doc_id, {
+                "text": doc.page_content,
+                "metadata": doc.metadata,
+                "tf": dict(Counter(tokenize(doc.page_content))),
+            })
+
+    def delete(self, ids: list[str]):
+        for doc_id in ids:
+            self._unindex(doc_id)
+
+    def save(self):
+        """Write the index atomically (same pattern as the ingestion manifest)."""
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"docs": self.docs}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def search(self, query: str, k: int = 5) -> list[tuple[str, float]]:
+        """Top `k` (id, score) pairs for `query`."""
+        if not self.docs:
+            return []
+        n = len(self.docs)
+        avg_length = self.total_length / n or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def get_document(self, doc_id: str) -> Document:
+        doc = self.docs[doc_id]
+        return Document(id=doc_id, page_content=doc["text"], metadata=doc["metadata"])
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], rrf_k: int = 60) -> list[str]:
+    """Merge several ranked id lists; ids ranked high in any list float to the top."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Runs vector and BM25 search and fuses the results with RRF."""
+
+    vector_retriever: BaseRetriever
+    lexical_index: Any
+    k: int = 5
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        by_id = {}
+        vector_ranking = []
+        for doc in self.vector_retriever.invoke(query)[: self.fetch_k]:
+            doc_id = document_key(doc)
+            by_id.setdefault(doc_id, doc)
+            vector_ranking.append(doc_id)
+
+        lexical_ranking = [doc_id for doc_id, _ in self.lexical_index.search(query, self.fetch_k)]
+
+        fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking], self.rrf_k)[: self.k]
+        return [by_id.get(doc_id) or self.lexical_index.get_document(doc_id) for doc_id in fused]
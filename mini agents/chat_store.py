@@ -0,0 +1,737 @@
+"""Append-only conversation store that plugs into LangGraph as a checkpointer.
+
+Rewriting the whole history file after every turn costs I/O proportional to
+the conversation length each turn (quadratic over a session), and a crash in
+the middle of the rewrite leaves a corrupt file. `ChatStore` instead appends
+JSON lines to a log:
+
+- message lists are written as deltas: only messages that were not in the
+  previous version of the channel, so a turn writes just the new messages
+- other channel values, checkpoint metadata and pending writes are stored with
+  LangGraph's serializer, so interrupts and resumes work like with `InMemorySaver`
+- `fsync` policy: "always" (each append), "periodic" (at most every
+  `fsync_interval` seconds) or "never" (leave it to the OS)
+- compaction rewrites the log with only the latest checkpoint per thread; it and
+  `snapshot()` write a temporary file and rename it, so a crash never leaves a
+  half-written log. A torn last line from a crash during an append is dropped.
+
+Startup does not read the log itself. A sidecar offset index (`<log>.idx`, one
+small line per record, rebuilt from the log if it is missing or stale) says
+where every message segment and checkpoint lives, and records are read with a
+seek when needed. With `tail_messages` or `tail_tokens` set, a restored thread
+only materializes its most recent messages; older ones stay on disk and can be
+paged in with `history()`.
+
+Use it like any checkpointer, keyed by `thread_id`:
+
+    app = graph.compile(checkpointer=ChatStore("chat_history.jsonl"))
+    app.invoke({"messages": [HumanMessage("hi")]}, {"configurable": {"thread_id": "default"}})
+
+Run `python chat_store.py` for a startup benchmark at 10k and 100k messages.
+"""
+
+import base64
+import bisect
+import json
+import operator
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+
+FSYNC_POLICIES = ("always", "periodic", "never")
+SEGMENT_MESSAGES = 256  # messages per record when compacting
+# Fields copied from a log record into its index entry (everything except the payload).
+INDEX_FIELDS = ("op", "thread", "ns", "channel", "gen", "from_gen", "start", "count",
+                "id", "parent", "checkpoint_id", "task_id", "idx")
+
+
+def _is_message_list(value) -> bool:
+    return isinstance(value, list) and all(isinstance(m, BaseMessage) for m in value)
+
+
+def _same_message(a, b) -> bool:
+    return a is b or (a.id is not None and a.id == b.id) or (a.type == b.type and a.content == b.content)
+
+
+def _dumps(record: dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class _Segments:
+    """Where the messages of one channel generation are in the log: sorted (start, count, offset, length)."""
+
+    __slots__ = ("starts", "entries")
+
+    def __init__(self, starts=None, entries=None):
+        self.starts = starts or []
+        self.entries = entries or []
+
+    def __len__(self):
+        if not self.entries:
+            return 0
+        start, count, _, _ = self.entries[-1]
+        return start + count
+
+    def truncated(self, length: int) -> "_Segments":
+        cut = bisect.bisect_left(self.starts, length)
+        entries = self.entries[:cut]
+        if entries:
+            start, count, offset, size = entries[-1]
+            entries[-1] = (start, min(count, length - start), offset, size)
+        return _Segments(self.starts[:cut], entries)
+
+    def add(self, start: int, count: int, offset: int, length: int):
+        if start < len(self):
+            kept = self.truncated(start)
+            self.starts, self.entries = kept.starts, kept.entries
+        if count:
+            self.starts.append(start)
+            self.entries.append((start, count, offset, length))
+
+    def covering(self, lo: int, hi: int):
+        first = max(0, bisect.bisect_right(self.starts, lo) - 1)
+        for entry in self.entries[first:]:
+            if entry[0] >= hi:
+                break
+            yield entry
+
+
+class ChatStore(BaseCheckpointSaver):
+    """LangGraph checkpointer backed by an append-only JSONL log and an offset index."""
+
+    def __init__(
+        self,
+        path: str = "chat_history.jsonl",
+        fsync: str = "periodic",
+        fsync_interval: float = 1.0,
+        compact_every: int = 2000,
+        tail_messages: int = None,
+        tail_tokens: int = None,
+        *,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every  # appended records before an automatic compaction
+        self.tail_messages = tail_messages  # None: restore the full message history
+        self.tail_tokens = tail_tokens
+        self._lock = threading.RLock()
+        self._last_fsync = 0.0
+        self._open()
+
+    # ---- index and in-memory state ---------------------------------------
+
+    def _reset_state(self):
+        # (thread, ns) -> {checkpoint id: (offset, length, parent id)}
+        self._checkpoints = {}
+        # (thread, ns, checkpoint id) -> [(offset, length, task id, idx list)]
+        self._writes = {}
+        # (thread, ns, channel, gen) -> _Segments; a new generation starts when history is rewritten
+        self._segments = {}
+        self._current_gen = {}  # (thread, ns, channel) -> latest gen
+        # (thread, ns, channel) -> (checkpoint id, gen, absolute start, messages) of the value
+        # the graph last saw; only a valid diff base for puts whose parent is that checkpoint
+        self._heads = {}
+        self._cache = OrderedDict()  # offset -> decoded record payload, small LRU
+        self._records = 0
+
+    def _index(self, entry: dict):
+        op = entry["op"]
+        thread, ns = entry.get("thread"), entry.get("ns", "")
+        if op == "messages":
+            key = (thread, ns, entry["channel"])
+            segments = self._segments.get(key + (entry["gen"],))
+            if segments is None:
+                base = self._segments.get(key + (entry.get("from_gen"),))
+                segments = base.truncated(entry["start"]) if base else _Segments()
+                self._segments[key + (entry["gen"],)] = segments
+            segments.add(entry["start"], entry["count"], entry["o"], entry["n"])
+            self._current_gen[key] = max(entry["gen"], self._current_gen.get(key, 0))
+        elif op == "put":
+            self._checkpoints.setdefault((thread, ns), {})[entry["id"]] = (entry["o"], entry["n"], entry["parent"])
+        elif op == "writes":
+            self._writes.setdefault((thread, ns, entry["checkpoint_id"]), []).append(
+                (entry["o"], entry["n"], entry["task_id"], entry["idx"])
+            )
+        elif op == "delete":
+            self._drop_thread(thread)
+        self._records += 1
+
+    def _drop_thread(self, thread_id):
+        for store in (self._checkpoints, self._writes, self._segments, self._current_gen, self._heads):
+            for key in [k for k in store if k[0] == thread_id]:
+                del store[key]
+
+    def _open(self):
+        """Load the offset index, catch it up with the log, and open both for appending."""
+        self._reset_state()
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "wb") as f:
+                f.write(_dumps({"op": "epoch", "id": uuid.uuid4().hex}))
+        with open(self.path, "rb") as f:
+            first = f.readline()
+        epoch = json.loads(first)["id"]
+        log_size = os.path.getsize(self.path)
+
+        # 1. Index entries, as long as the index belongs to this log and points inside it.
+        indexed_end, index_bytes = len(first), 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                header = f.readline()
+                try:
+                    valid = header.endswith(b"\n") and json.loads(header).get("epoch") == epoch
+                except ValueError:
+                    valid = False
+                if valid:
+                    index_bytes = len(header)
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            break
+                        if not line.endswith(b"\n") or entry["o"] + entry["n"] > log_size:
+                            break
+                        self._index(entry)
+                        indexed_end = entry["o"] + entry["n"]
+                        index_bytes += len(line)
+        if index_bytes == 0:
+            with open(self.index_path, "wb") as f:
+                f.write(_dumps({"epoch": epoch}))
+            index_bytes = os.path.getsize(self.index_path)
+        else:
+            with open(self.index_path, "r+b") as f:
+                f.truncate(index_bytes)
+        self._index_file = open(self.index_path, "ab")
+
+        # 2. Records appended after the last index entry (or the whole log for a new index).
+        good_end = indexed_end
+        with open(self.path, "rb") as f:
+            f.seek(indexed_end)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn write from a crash; everything after it is dropped
+                if not line.endswith(b"\n"):
+                    break
+                self._index_record(record, good_end, len(line))
+                good_end += len(line)
+        if good_end != log_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(good_end)
+        self._index_file.flush()
+
+        self._log = open(self.path, "ab")
+        self._reader = open(self.path, "rb")
+        self._log_size = good_end
+        self._records_at_open = self._records
+
+    def _index_record(self, record: dict, offset: int, length: int):
+        entry = {k: record[k] for k in INDEX_FIELDS if k in record}
+        entry["o"], entry["n"] = offset, length
+        self._index_file.write(_dumps(entry))
+        self._index(entry)
+
+    # ---- log file --------------------------------------------------------
+
+    def _append(self, record: dict):
+        data = _dumps(record)
+        offset = self._log_size
+        self._log.write(data)
+        self._log.flush()
+        now = time.monotonic()
+        if self.fsync == "always" or (self.fsync == "periodic" and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._log.fileno())
+            self._last_fsync = now
+        self._log_size += len(data)
+        # The index is rebuilt from the log after a crash, so it is only flushed, never fsynced.
+        self._index_record(record, offset, len(data))
+        self._index_file.flush()
+
+    def _maybe_compact(self):
+        # Called between whole operations, never between a put's message and checkpoint records.
+        if self.compact_every and self._records - self._records_at_open > self.compact_every:
+            self.compact()
+
+    def _read(self, offset: int, length: int) -> dict:
+        record = self._cache.get(offset)
+        if record is None:
+            self._reader.seek(offset)
+            record = json.loads(self._reader.read(length))
+            if record["op"] == "messages":
+                record = {"messages": self._untyped(record["messages"])}
+            self._cache[offset] = record
+            if len(self._cache) > 256:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(offset)
+        return record
+
+    def _typed(self, value) -> dict:
+        kind, data = self.serde.dumps_typed(value)
+        return {"t": kind, "b": base64.b64encode(data).decode("ascii")}
+
+    def _untyped(self, payload: dict):
+        return self.serde.loads_typed((payload["t"], base64.b64decode(payload["b"])))
+
+    def _messages(self, key: tuple, lo: int, hi: int) -> list:
+        """Messages [lo, hi) of a channel generation, read segment by segment."""
+        result = []
+        for start, count, offset, length in self._segments.get(key, _Segments()).covering(lo, hi):
+            messages = self._read(offset, length)["messages"][:count]
+            result.extend(messages[max(0, lo - start):hi - start])
+        return result
+
+    def _window_start(self, key: tuple, length: int) -> int:
+        """First message of the restored window: the last `tail_messages` / `tail_tokens` worth."""
+        lo = 0 if self.tail_messages is None else max(0, length - self.tail_messages)
+        if self.tail_tokens is not None:
+            from context_packing import count_tokens
+
+            tokens, position = 0, length
+            segments = self._segments.get(key, _Segments())
+            for start, count, offset, size in reversed(list(segments.covering(lo, length))):
+                messages = self._read(offset, size)["messages"][:count]
+                for index in range(min(start + count, length) - 1, max(start, lo) - 1, -1):
+                    tokens += count_tokens(str(messages[index - start].content))
+                    if tokens > self.tail_tokens and position < length:
+                        return position  # always keep at least the last message
+                    position = index
+            lo = position
+        return lo
+
+    def _live_records(self, epoch: str):
+        """Records for the latest checkpoint of every thread, with messages in full segments."""
+        yield {"op": "epoch", "id": epoch}
+        for (thread, ns), checkpoints in self._checkpoints.items():
+            if not checkpoints:
+                continue
+            checkpoint_id = max(checkpoints)
+            offset, length, _ = checkpoints[checkpoint_id]
+            self._reader.seek(offset)
+            put = json.loads(self._reader.read(length))
+            put["parent"] = None
+            for blob in put["blobs"]:
+                if "gen" not in blob:
+                    continue
+                key = (thread, ns, blob["channel"], blob["gen"])
+                for start in range(0, blob["length"], SEGMENT_MESSAGES):
+                    messages = self._messages(key, start, min(start + SEGMENT_MESSAGES, blob["length"]))
+                    yield {
+                        "op": "messages", "thread": thread, "ns": ns, "channel": blob["channel"],
+                        "gen": 0, "start": start, "count": len(messages), "messages": self._typed(messages),
+                    }
+                blob["gen"] = 0
+            yield put
+            for offset, length, _, _ in self._writes.get((thread, ns, checkpoint_id), []):
+                self._reader.seek(offset)
+                yield json.loads(self._reader.read(length))
+
+    def snapshot(self, path: str) -> int:
+        """Atomically write a compacted copy of the store to `path`; returns the record count."""
+        with self._lock:
+            tmp = f"{path}.tmp"
+            count = 0
+            with open(tmp, "wb") as f:
+                for record in self._live_records(uuid.uuid4().hex):
+                    f.write(_dumps(record))
+                    count += 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            directory = os.path.dirname(os.path.abspath(path))
+            if hasattr(os, "O_DIRECTORY"):
+                fd = os.open(directory, os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            return count
+
+    def compact(self):
+        """Replace the log with the latest checkpoint of every thread (older checkpoints are dropped)."""
+        with self._lock:
+            self._log.flush()
+            compacted = f"{self.path}.compact"
+            self.snapshot(compacted)
+            heads = self._heads
+            self._close_files()
+            os.replace(compacted, self.path)
+            self._open()  # the new log has a new epoch, so the index is rebuilt
+            # Compaction puts each thread's messages in generation 0; the values the graph
+            # holds stay valid bases for the next delta.
+            self._heads = {
+                key: (checkpoint_id, 0, start, messages)
+                for key, (checkpoint_id, _, start, messages) in heads.items()
+                if checkpoint_id in self._checkpoints.get(key[:2], {})
+            }
+
+    def _close_files(self):
+        for f in (self._log, self._reader, self._index_file):
+            f.close()
+
+    def close(self):
+        with self._lock:
+            if not self._log.closed:
+                self._log.flush()
+                if self.fsync != "never":
+                    os.fsync(self._log.fileno())
+                self._close_files()
+
+    # ---- lazy access to older messages -------------------------------------
+
+    def message_count(self, thread_id: str, ns: str = "", channel: str = "messages") -> int:
+        """Messages in the latest checkpoint of a thread, including ones not loaded into memory."""
+        with self._lock:
+            blob = self._latest_message_blob(thread_id, ns, channel)
+            return blob["length"] if blob else 0
+
+    def history(self, thread_id: str, start: int = 0, stop: int = None, ns: str = "", channel: str = "messages") -> list:
+        """Page in messages [start, stop) of a thread's latest checkpoint from disk."""
+        with self._lock:
+            blob = self._latest_message_blob(thread_id, ns, channel)
+            if blob is None:
+                return []
+            length = blob["length"]
+            stop = length if stop is None else min(stop, length)
+            return self._messages((thread_id, ns, channel, blob["gen"]), max(0, start), stop)
+
+    def _latest_message_blob(self, thread, ns, channel):
+        checkpoints = self._checkpoints.get((thread, ns))
+        if not checkpoints:
+            return None
+        offset, length, _ = checkpoints[max(checkpoints)]
+        put = self._read(offset, length)
+        return next((b for b in put["blobs"] if b["channel"] == channel and "gen" in b), None)
+
+    # ---- checkpointer API ------------------------------------------------
+
+    def _tuple(self, thread, ns, checkpoint_id, remember_heads=False) -> CheckpointTuple:
+        offset, length, parent_id = self._checkpoints[(thread, ns)][checkpoint_id]
+        put = self._read(offset, length)
+        values = {}
+        for blob in put["blobs"]:
+            if "gen" in blob:
+                key = (thread, ns, blob["channel"], blob["gen"])
+                lo = self._window_start(key, blob["length"])
+                values[blob["channel"]] = self._messages(key, lo, blob["length"])
+                if remember_heads:
+                    self._heads[key[:3]] = (checkpoint_id, blob["gen"], lo, list(values[blob["channel"]]))
+            elif blob["value"] is not None:
+                values[blob["channel"]] = self._untyped(blob["value"])
+
+        writes = []
+        for w_offset, w_length, _, _ in self._writes.get((thread, ns, checkpoint_id), []):
+            record = self._read(w_offset, w_length)
+            writes.extend(
+                (record["task_id"], idx, channel, value, record["task_path"])
+                for idx, channel, value in record["writes"]
+            )
+        writes.sort(key=lambda w: writes_sort_key(w[4], w[0], w[1]))
+        checkpoint = self._untyped(put["checkpoint"])
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self._untyped(put["metadata"]),
+            parent_config=(
+                {"configurable": {"thread_id": thread, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+                if parent_id
+                else None
+            ),
+            pending_writes=[(task_id, channel, self._untyped(value)) for task_id, _, channel, value, _ in writes],
+        )
+
+    def get_tuple(self, config):
+        thread = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            checkpoints = self._checkpoints.get((thread, ns))
+            if not checkpoints:
+                return None
+            checkpoint_id = get_checkpoint_id(config) or max(checkpoints)
+            if checkpoint_id not in checkpoints:
+                return None
+            return self._tuple(thread, ns, checkpoint_id, remember_heads=True)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        thread_filter = config["configurable"]["thread_id"] if config else None
+        ns_filter = config["configurable"].get("checkpoint_ns") if config else None
+        id_filter = get_checkpoint_id(config) if config else None
+        before_id = get_checkpoint_id(before) if before else None
+        with self._lock:
+            candidates = [
+                (thread, ns, checkpoint_id)
+                for (thread, ns), checkpoints in self._checkpoints.items()
+                if (thread_filter is None or thread == thread_filter) and (ns_filter is None or ns == ns_filter)
+                for checkpoint_id in sorted(checkpoints, reverse=True)
+                if (not id_filter or checkpoint_id == id_filter) and (not before_id or checkpoint_id < before_id)
+            ]
+        # Checkpoints are read from disk one at a time, as the caller iterates.
+        for thread, ns, checkpoint_id in candidates:
+            if limit is not None and limit <= 0:
+                break
+            with self._lock:
+                if checkpoint_id not in self._checkpoints.get((thread, ns), {}):
+                    continue
+                if filter:
+                    offset, length, _ = self._checkpoints[(thread, ns)][checkpoint_id]
+                    metadata = self._untyped(self._read(offset, length)["metadata"])
+                    if not all(metadata.get(k) == v for k, v in filter.items()):
+                        continue
+                item = self._tuple(thread, ns, checkpoint_id)
+            if limit is not None:
+                limit -= 1
+            yield item
+
+    def _base(self, thread, ns, channel, parent_id):
+        """(gen, absolute start, messages) of `channel` as `get_tuple` restores it from `parent_id`."""
+        head = self._heads.get((thread, ns, channel))
+        if head is not None and head[0] == parent_id:
+            return head[1:]
+        offset, length, _ = self._checkpoints[(thread, ns)][parent_id]
+        blob = next((b for b in self._read(offset, length)["blobs"] if b["channel"] == channel and "gen" in b), None)
+        if blob is None:
+            return None
+        key = (thread, ns, channel, blob["gen"])
+        lo = self._window_start(key, blob["length"])
+        return blob["gen"], lo, self._messages(key, lo, blob["length"])
+
+    def _put_messages(self, thread, ns, channel, value: list, parent_id, checkpoint_id) -> dict:
+        """Append the part of `value` the log does not have yet; returns the blob reference.
+
+        The diff base is the value in the parent checkpoint: the remembered head when the
+        graph continues from it, otherwise (a branch from an older checkpoint) rebuilt from the log.
+        """
+        key = (thread, ns, channel)
+        current = self._current_gen.get(key, 0)
+        head = None
+        if parent_id in self._checkpoints.get((thread, ns), {}):
+            head = self._base(thread, ns, channel, parent_id)
+        if head is not None:
+            base_gen, head_start, head_messages = head
+            matched = len(head_messages)
+            if len(value) < matched or not all(map(operator.is_, head_messages, value)):
+                matched = next(
+                    (i for i, (a, b) in enumerate(zip(head_messages, value)) if not _same_message(a, b)),
+                    min(matched, len(value)),
+                )
+        else:
+            base_gen, head_start, matched = current, 0, 0  # no known base: the value is the whole history
+
+        start = head_start + matched
+        new_messages = list(value[matched:])
+        gen = current
+        record = {"op": "messages", "thread": thread, "ns": ns, "channel": channel,
+                  "gen": gen, "start": start, "count": len(new_messages)}
+        if base_gen != current or start != len(self._segments.get(key + (current,), ())):
+            # History was edited, truncated or branched from an older checkpoint: continue
+            # in a new generation so existing checkpoints keep pointing at their messages.
+            record["from_gen"] = base_gen
+            gen = record["gen"] = 1 + max((k[3] for k in self._segments if k[:3] == key), default=current)
+        if new_messages or "from_gen" in record:
+            record["messages"] = self._typed(new_messages)
+            self._append(record)
+        self._heads[key] = (checkpoint_id, gen, head_start, list(value))
+        return {"gen": gen, "length": start + len(new_messages)}
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint = checkpoint.copy()
+        values = checkpoint.pop("channel_values")
+        previous_id = config["configurable"].get("checkpoint_id")
+        with self._lock:
+            blobs = []
+            for channel, version in new_versions.items():
+                blob = {"channel": channel, "version": version}
+                if channel not in values:
+                    blob["value"] = None
+                elif _is_message_list(values[channel]):
+                    blob.update(self._put_messages(
+                        thread, ns, channel, values[channel], previous_id, checkpoint["id"]
+                    ))
+                else:
+                    blob["value"] = self._typed(values[channel])
+                blobs.append(blob)
+            # Channels unchanged in this checkpoint still need their message references.
+            if previous_id in self._checkpoints.get((thread, ns), {}):
+                offset, length, _ = self._checkpoints[(thread, ns)][previous_id]
+                changed = {b["channel"] for b in blobs}
+                blobs.extend(
+                    b for b in self._read(offset, length)["blobs"]
+                    if b["channel"] not in changed and b["channel"] in checkpoint["channel_versions"]
+                )
+            self._append({
+                "op": "put",
+                "thread": thread,
+                "ns": ns,
+                "id": checkpoint["id"],
+                "parent": previous_id,
+                "checkpoint": self._typed(checkpoint),
+                "metadata": self._typed(get_checkpoint_metadata(config, metadata)),
+                "blobs": blobs,
+            })
+            self._maybe_compact()
+        return {"configurable": {"thread_id": thread, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            stored = {
+                (stored_task, idx)
+                for _, _, stored_task, idxs in self._writes.get((thread, ns, checkpoint_id), [])
+                for idx in idxs
+            }
+            new = []
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                if idx >= 0 and (task_id, idx) in stored:
+                    continue
+                new.append([idx, channel, self._typed(value)])
+            if new:
+                self._append({
+                    "op": "writes", "thread": thread, "ns": ns, "checkpoint_id": checkpoint_id,
+                    "task_id": task_id, "task_path": task_path, "idx": [w[0] for w in new], "writes": new,
+                })
+                self._maybe_compact()
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            self._append({"op": "delete", "thread": thread_id})
+
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return self.delete_thread(thread_id)
+
+
+if __name__ == "__main__":
+    import tempfile
+    import tracemalloc
+    from typing import Annotated, TypedDict
+
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langgraph.graph import StateGraph
+    from langgraph.graph.message import add_messages
+
+    class State(TypedDict):
+        messages: Annotated[list, add_messages]
+
+    graph = StateGraph(State)
+    graph.add_node("llm_node", lambda state: {})
+    graph.set_entry_point("llm_node")
+    graph.set_finish_point("llm_node")
+    config = {"configurable": {"thread_id": "default"}}
+
+    def measure(label, load):
+        tracemalloc.start()
+        start = time.perf_counter()
+        count = load()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {label:<26} {elapsed * 1000:8.1f} ms  {peak / 2**20:7.1f} MiB peak  ({count} messages in memory)")
+
+    def open_store(path, **options):
+        store = ChatStore(path, **options)
+        count = len(graph.compile(checkpointer=store).get_state(config).values["messages"])
+        store.close()
+        return count
+
+    def load_legacy(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return len([HumanMessage(m["content"]) if m["type"] == "human" else AIMessage(m["content"]) for m in data])
+
+    for total in (10_000, 100_000):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "chat_history.jsonl")
+            store = ChatStore(path, fsync="never", compact_every=0, tail_messages=100)
+            app = graph.compile(checkpointer=store)
+            legacy = []
+            for turn in range(0, total, 100):
+                batch = [
+                    (HumanMessage if i % 2 == 0 else AIMessage)(f"message {i}: " + "lorem ipsum " * 20)
+                    for i in range(turn, turn + 100)
+                ]
+                app.update_state(config, {"messages": batch}, as_node="llm_node")
+                legacy.extend({"type": m.type, "content": m.content} for m in batch)
+            store.close()
+            legacy_path = os.path.join(tmp, "chat_history.json")
+            with open(legacy_path, "w", encoding="utf-8") as f:
+                json.dump(legacy, f)
+
+            print(f"{total} messages ({os.path.getsize(path) / 2**20:.1f} MiB log):")
+            measure("json.load (old 07)", lambda: load_legacy(legacy_path))
+            os.remove(f"{path}.idx")
+            measure("ChatStore, no index", lambda: open_store(path, tail_messages=100))
+            measure("ChatStore, last 100", lambda: open_store(path, tail_messages=100))
+            measure("ChatStore, last 2000 tokens", lambda: open_store(path, tail_tokens=2000))
+            measure("ChatStore, full history", lambda: open_store(path))
+
+    # Branching and time travel under a tail window: every checkpoint must still
+    # hold the history an in-memory checkpointer records for the same operations.
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    graph = StateGraph(State)
+    graph.add_node("llm_node", lambda state: {"messages": [AIMessage("reply")]})
+    graph.set_entry_point("llm_node")
+    graph.set_finish_point("llm_node")
+    operations = [("latest", 0), ("latest", 1), ("branch", 3), ("latest", 2), ("update", 4),
+                  ("branch", 1), ("update", 7), ("latest", 5), ("branch", 6), ("latest", 8)]
+
+    def replay(checkpointer):
+        app = graph.compile(checkpointer=checkpointer)
+        for kind, n in operations:
+            history = list(app.get_state_history(config))
+            target = history[n % len(history)].config if kind != "latest" else config
+            if kind == "update":
+                app.update_state(target, {"messages": [HumanMessage(f"edit {n}")]}, as_node="llm_node")
+            else:
+                app.invoke({"messages": [HumanMessage(f"question {n}")]}, target)
+        return app
+
+    def histories(app):
+        return [[m.content for m in s.values.get("messages", [])] for s in app.get_state_history(config)]
+
+    expected = histories(replay(InMemorySaver()))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chat_history.jsonl")
+        store = ChatStore(path, fsync="never", tail_messages=3)
+        replay(store)
+        store.close()
+        store = ChatStore(path)
+        assert histories(graph.compile(checkpointer=store)) == expected, "branched history differs"
+        store.close()
+    print(f"branch / time travel with a tail window: {len(expected)} checkpoints match")
@@ -0,0 +1,186 @@
+"""Pack retrieved chunks into a compact, token-budgeted tool result.
+
+Neighbouring chunks share `chunk_overlap` characters of text, and the tool
+result stays in the conversation for every later LLM call, so repeated text is
+paid for again and again. `pack_documents`:
+
+1. drops near-duplicate chunks (word-shingle Jaccard similarity)
+2. optionally re-ranks with maximal marginal relevance (MMR) for diversity
+3. merges chunks from the same page that touch or overlap into one passage
+4. keeps passages in rank order until the token budget is used up
+"""
+
+import math
+import re
+from dataclasses import dataclass
+
+
+_encoding = None
+
+
+def _get_encoding():
+    """tiktoken encoding if available (it ships with langchain-openai), else None.
+
+    tiktoken downloads its vocabulary on first use, so offline runs fall back to
+    the character heuristic instead of failing.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return max(1, len(text) // 4)  # rough rule of thumb for English text
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    return text[: max_tokens * 4]
+
+
+@dataclass
+class Passage:
+    source: str
+    page: object
+    text: str
+    start: int = None
+    rank: int = 0
+
+    @property
+    def end(self):
+        return None if self.start is None else self.start + len(self.text)
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _text_overlap(left: str, right: str, min_overlap: int = 20) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for size in range(min(len(left), len(right)), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def drop_near_duplicates(docs: list, threshold: float = 0.9) -> list:
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if any(_jaccard(shingles, other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def mmr_order(query: str, docs: list, embeddings, lambda_mult: float = 0.7) -> list:
+    """Re-order `docs` so each next pick balances relevance to `query` and novelty."""
+    if len(docs) < 3:
+        return docs
+    query_vector = embeddings.embed_query(query)
+    doc_vectors = embeddings.embed_documents([d.page_content for d in docs])
+    relevance = [_cosine(query_vector, v) for v in doc_vectors]
+
+    remaining = list(range(len(docs)))
+    chosen = []
+    while remaining:
+        def score(i):
+            redundancy = max((_cosine(doc_vectors[i], doc_vectors[j]) for j in chosen), default=0.0)
+            return lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+        best = max(remaining, key=score)
+        chosen.append(best)
+        remaining.remove(best)
+    return [docs[i] for i in chosen]
+
+
+def merge_adjacent(docs: list) -> list[Passage]:
+    """Merge chunks of the same page that overlap or touch; passages keep their best rank."""
+    by_page = {}
+    for rank, doc in enumerate(docs):
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        by_page.setdefault(key, []).append(
+            Passage(key[0], key[1], doc.page_content, doc.metadata.get("start_index"), rank)
+        )
+
+    passages = []
+    for group in by_page.values():
+        if all(p.start is not None for p in group):
+            group.sort(key=lambda p: p.start)
+            merged = [group[0]]
+            for p in group[1:]:
+                last = merged[-1]
+                if p.start <= last.end:
+                    last.text += p.text[last.end - p.start:]
+                    last.rank = min(last.rank, p.rank)
+                else:
+                    merged.append(p)
+        else:
+            # Chunks stored without start offsets: merge on the repeated overlap text.
+            merged = []
+            for p in group:
+                for other in merged:
+                    if _text_overlap(other.text, p.text):
+                        other.text += p.text[_text_overlap(other.text, p.text):]
+                        other.rank = min(other.rank, p.rank)
+                        break
+                    if _text_overlap(p.text, other.text):
+                        other.text = p.text + other.text[_text_overlap(p.text, other.text):]
+                        other.rank = min(other.rank, p.rank)
+                        break
+                else:
+                    merged.append(p)
+        passages.extend(merged)
+
+    return sorted(passages, key=lambda p: p.rank)
+
+
+def pack_documents(
+    query: str,
+    docs: list,
+    token_budget: int = 1200,
+    dedupe_threshold: float = 0.9,
+    embeddings=None,
+    mmr_lambda: float = None,
+) -> list[Passage]:
+    """Turn retrieved chunks into as few, non-repeating passages as fit in `token_budget`.
+
+    MMR re-ranking only runs when both `embeddings` and `mmr_lambda` are given.
+    """
+    docs = drop_near_duplicates(docs, dedupe_threshold)
+    if embeddings is not None and mmr_lambda is not None:
+        docs = mmr_order(query, docs, embeddings, mmr_lambda)
+
+    packed = []
+    remaining = token_budget
+    for passage in merge_adjacent(docs):
+        tokens = count_tokens(passage.text)
+        if tokens > remaining:
+            if remaining >= 50:  # a useful fragment still fits
+                passage.text = truncate_to_tokens(passage.text, remaining) + " ..."
+                packed.append(passage)
+            break
+        packed.append(passage)
+        remaining -= tokens
+    return packed
@@ -0,0 +1,192 @@
+"""Token-budgeted context window with a rolling summary for the chatbots.
+
+Sending the whole history to the model on every turn makes each turn slower
+and more expensive than the last, until the context limit is hit.
+`ContextWindow` keeps the prompt within `max_tokens`:
+
+- token counts are cached per message, so each message is counted once
+- the prompt is the recent turns that fit, plus a summary of everything older
+- when the recent turns outgrow the budget, the oldest ones are evicted down
+  to `low_water` of it and folded into the existing summary with one LLM call;
+  the summary is extended, never rebuilt from the full history
+
+The summary and the id of the last message it covers are kept in the graph
+state, so they are saved with the conversation by a checkpointer:
+
+    window = ContextWindow(llm, max_tokens=3000)
+    graph.add_node("context", window.node)         # before the LLM node
+    llm.invoke(window.prompt(state))               # inside the LLM node
+
+Run `python context_window.py` to compare prompt sizes over a long session.
+"""
+
+import json
+from collections import OrderedDict
+from typing import TypedDict
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from context_packing import count_tokens, truncate_to_tokens
+
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators added by the chat format
+
+SUMMARY_PROMPT = """Progressively summarize the conversation, adding onto the current summary.
+Keep names, numbers, decisions and open questions. Answer with the new summary only, at most {words} words.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+New summary:"""
+
+
+class ContextState(TypedDict, total=False):
+    """State keys `ContextWindow.node` writes; add them to a chatbot's state."""
+
+    summary: str
+    summarized_through: str  # id of the last message folded into the summary
+
+
+class ContextWindow:
+    """Sliding window of recent turns within a token budget, plus a rolling summary of older ones."""
+
+    def __init__(
+        self,
+        llm,
+        max_tokens: int = 3000,
+        summary_tokens: int = 400,
+        low_water: float = 0.6,
+        count=count_tokens,
+        cache_size: int = 10_000,
+    ):
+        if summary_tokens >= max_tokens:
+            raise ValueError("summary_tokens must be smaller than max_tokens")
+        self.llm = llm  # any runnable that turns a prompt into a message; used for summaries only
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.low_water = low_water
+        self.count = count
+        self.cache_size = cache_size
+        self._tokens = OrderedDict()  # message id (or type and content) -> token count
+        self.summaries = 0
+        self.evicted = 0
+
+    def message_tokens(self, message) -> int:
+        key = message.id or (message.type, str(message.content))
+        tokens = self._tokens.get(key)
+        if tokens is None:
+            tokens = MESSAGE_OVERHEAD_TOKENS + self.count(str(message.content))
+            for call in getattr(message, "tool_calls", None) or ():
+                tokens += self.count(call["name"] + json.dumps(call["args"]))
+            self._tokens[key] = tokens
+            if len(self._tokens) > self.cache_size:
+                self._tokens.popitem(last=False)
+        else:
+            self._tokens.move_to_end(key)
+        return tokens
+
+    def _unsummarized(self, state) -> list:
+        messages = state["messages"]
+        through = state.get("summarized_through")
+        if through:
+            for index in range(len(messages) - 1, -1, -1):
+                if messages[index].id == through:
+                    return messages[index + 1:]
+        return messages  # nothing summarized yet, or the state only holds newer messages
+
+    def node(self, state) -> dict:
+        """Graph node: fold the oldest turns into the summary once the window outgrows the budget."""
+        window = self._unsummarized(state)
+        sizes = [self.message_tokens(m) for m in window]
+        budget = self.max_tokens - self.summary_tokens
+        total = sum(sizes)
+        if total <= budget:
+            return {}
+
+        # Evict whole turns (a human message and everything up to the next one) from the front,
+        # down to the low-water mark, so the next summary is several turns away. If even the
+        # latest turn is over it, everything before the latest turn goes.
+        target = budget * self.low_water
+        cut, remaining = 0, total
+        for index, message in enumerate(window):
+            if index > 0 and isinstance(message, HumanMessage):
+                cut = index
+                if remaining <= target:
+                    break
+            remaining -= sizes[index]
+        if cut == 0:
+            return {}  # a single turn; nothing can be evicted
+
+        evicted = window[:cut]
+        self.summaries += 1
+        self.evicted += len(evicted)
+        return {
+            "summary": self._fold(state.get("summary", ""), evicted),
+            "summarized_through": evicted[-1].id,
+        }
+
+    def _fold(self, summary: str, messages: list) -> str:
+        lines = "\n".join(f"{m.type}: {m.content}" for m in messages if m.content)
+        prompt = SUMMARY_PROMPT.format(
+            words=int(self.summary_tokens * 0.75), summary=summary or "(empty)", lines=lines
+        )
+        response = self.llm.invoke(prompt)
+        return truncate_to_tokens(str(getattr(response, "content", response)).strip(), self.summary_tokens)
+
+    def prompt(self, state) -> list:
+        """Messages to send to the model: the summary (if any) and the unsummarized turns."""
+        window = self._unsummarized(state)
+        if state.get("summary"):
+            return [SystemMessage(f"Summary of the earlier conversation:\n{state['summary']}"), *window]
+        return list(window)
+
+    def prompt_tokens(self, state) -> int:
+        return sum(self.message_tokens(m) for m in self.prompt(state))
+
+
+if __name__ == "__main__":
+    import time
+    from typing import Annotated
+
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import StateGraph
+    from langgraph.graph.message import add_messages
+
+    def fake_summarizer(prompt: str) -> AIMessage:
+        # Stand-in for the model: keeps the tail of the old summary and the new lines.
+        summary, lines = prompt.split("Current summary:\n", 1)[1].split("\n\nNew lines of conversation:\n", 1)
+        return AIMessage(truncate_to_tokens(summary[-600:] + " " + lines.split("\n\nNew summary:")[0][:600], 300))
+
+    class State(ContextState):
+        messages: Annotated[list, add_messages]
+
+    window = ContextWindow(RunnableLambda(fake_summarizer), max_tokens=3000)
+    prompt_sizes = []
+
+    def llm_node(state):
+        prompt_sizes.append(window.prompt_tokens(state))
+        return {"messages": [AIMessage(f"Answer {len(state['messages'])}: " + "details " * 60)]}
+
+    graph = StateGraph(State)
+    graph.add_node("context", window.node)
+    graph.add_node("llm_node", llm_node)
+    graph.set_entry_point("context")
+    graph.add_edge("context", "llm_node")
+    graph.set_finish_point("llm_node")
+    app = graph.compile()
+
+    state = {"messages": []}
+    full_history = []
+    start = time.perf_counter()
+    for turn in range(1, 501):
+        question = HumanMessage(f"Question {turn}: " + "context " * 40)
+        state = app.invoke({**state, "messages": state["messages"] + [question]})
+        full_history.append(sum(window.message_tokens(m) for m in state["messages"][:-1]))
+        if turn in (10, 50, 100, 250, 500):
+            print(f"turn {turn:3d}: prompt {prompt_sizes[-1]:5d} tokens (full history would be {full_history[-1]:6d})")
+    print(f"{window.summaries} summary calls, {window.evicted} messages folded, "
+          f"max prompt {max(prompt_sizes)} tokens, {time.perf_counter() - start:.2f}s")
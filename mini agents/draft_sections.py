@@ -0,0 +1,279 @@
+"""Section-level refinement for the drafting agent.
+
+Regenerating the whole draft for every piece of feedback makes a one-line
+edit ("change the greeting") cost as many output tokens, and as much time, as
+writing the document again. Here a draft is split into sections (paragraphs,
+or a heading with its body), and `refine_sections`:
+
+1. routes the feedback to the sections it is about: by cheap rules (quoted
+   text, "second paragraph", greeting/closing/subject, heading words), then by
+   a short model call over a one-line outline when the rules find nothing
+2. regenerates only those sections, with the full draft as context, and
+   splices them back in; whole-document feedback ("make it shorter") or edits
+   touching most sections still regenerate the full draft
+
+Run `python draft_sections.py` to compare full and section refinement on a
+long document with a stand-in model.
+"""
+
+import re
+from dataclasses import dataclass
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+
+FULL_REWRITE_SHARE = 0.5  # regenerate the whole draft when more sections than this would change
+
+_ORDINALS = {
+    "first": 0, "second": 1, "third": 2, "fourth": 3, "fifth": 4,
+    "sixth": 5, "seventh": 6, "eighth": 7, "ninth": 8, "tenth": 9,
+    "last": -1, "final": -1,
+}
+# Ordinals ("second paragraph", "3rd section") or "paragraph N"; a cardinal count
+# ("add 3 paragraphs") is not a position.
+_POSITION = re.compile(
+    r"\b(first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|last|final|\d+(?:st|nd|rd|th))\s+"
+    r"(?:paragraph|section|part|point|bullet)s?\b|\b(?:paragraph|section|part|point)\s+(\d+)\b",
+    re.IGNORECASE,
+)
+_QUOTED = re.compile(r"[\"“']([^\"”']{4,})[\"”']")
+# No "start"/"end": "at the end of the second paragraph" is about that paragraph.
+_OPENING = re.compile(r"\b(greeting|salutation|opening|intro(?:duction)?|hello)\b", re.IGNORECASE)
+_CLOSING = re.compile(r"\b(closing|sign[- ]?off|signature|conclusion|regards|outro)\b", re.IGNORECASE)
+_GREETING_LINE = re.compile(r"^(hi|hello|hey|dear|greetings|good (morning|afternoon|evening))\b|,$", re.IGNORECASE)
+_SIGN_OFF_LINE = re.compile(
+    r"^(best|regards|kind regards|warm regards|sincerely|thanks|thank you|cheers|yours)\b|,$", re.IGNORECASE
+)
+_SUBJECT = re.compile(r"\b(subject|title|headline)\b", re.IGNORECASE)
+_WHOLE = re.compile(r"\b(overall|whole|entire|everything|throughout|all of it)\b", re.IGNORECASE)
+_DOCUMENT_EDIT = re.compile(
+    r"\b(shorter|longer|concise|formal|casual|friendlier|tone|rewrite|translate|simplify|proofread|"
+    r"grammar|spelling)\b",
+    re.IGNORECASE,
+)
+_SECTION_TAG = re.compile(r"<section id=\"?(\d+)\"?>\s*(.*?)\s*</section>", re.DOTALL)
+_STOPWORDS = {"the", "and", "for", "with", "that", "this", "from", "make", "more", "less", "about"}
+
+
+@dataclass
+class Section:
+    text: str
+
+    @property
+    def heading(self) -> str:
+        """First line without markdown markers, as shown in the outline."""
+        return self.text.split("\n", 1)[0].lstrip("#*-> ").strip()[:80]
+
+    @property
+    def is_heading(self) -> bool:
+        return self.text.startswith("#")
+
+
+def split_sections(draft: str) -> list[Section]:
+    """Paragraphs separated by blank lines; a markdown heading keeps the paragraph after it."""
+    sections = []
+    for block in re.split(r"\n\s*\n", draft.strip()):
+        if not block.strip():
+            continue
+        if sections and sections[-1].is_heading and "\n" not in sections[-1].text:
+            sections[-1] = Section(f"{sections[-1].text}\n\n{block}")
+        else:
+            sections.append(Section(block))
+    return sections
+
+
+def join_sections(sections: list[Section]) -> str:
+    return "\n\n".join(s.text for s in sections)
+
+
+def _opening_section(sections) -> int:
+    first = sections[0].heading.lower()
+    return 1 if len(sections) > 1 and (first.startswith("subject") or sections[0].is_heading) else 0
+
+
+def _is_short(section: Section, pattern) -> bool:
+    return len(section.text.split()) <= 8 and bool(pattern.search(section.text.split("\n", 1)[0].strip()))
+
+
+def _body(sections) -> range:
+    """Indices of the paragraphs ordinals count: no subject line, greeting or sign-off."""
+    start, end = _opening_section(sections), len(sections)
+    if start < end and not sections[start].is_heading and _is_short(sections[start], _GREETING_LINE):
+        start += 1
+    if end - 1 > start and _is_short(sections[end - 1], _SIGN_OFF_LINE):
+        end -= 1
+    return range(start, end)
+
+
+def route_by_rules(feedback: str, sections: list[Section]):
+    """Indices of the sections `feedback` is about; "all" for whole-document feedback; None if unsure."""
+    found = set()
+    body = _body(sections)
+    for match in _POSITION.finditer(feedback):
+        word = (match.group(1) or match.group(2)).lower()
+        index = _ORDINALS[word] if word in _ORDINALS else int(word.rstrip("stndrh")) - 1
+        if -len(body) <= index < len(body):
+            found.add(body[index])
+    for quoted in _QUOTED.findall(feedback):
+        found.update(i for i, s in enumerate(sections) if quoted.lower() in s.text.lower())
+    if _SUBJECT.search(feedback) and sections[0].heading.lower().startswith(("subject", "title")):
+        found.add(0)
+    if _OPENING.search(feedback):
+        found.add(_opening_section(sections))
+    if _CLOSING.search(feedback):
+        found.add(len(sections) - 1)
+    words = {w for w in re.findall(r"[a-z]{4,}", feedback.lower()) if w not in _STOPWORDS}
+    for i, section in enumerate(sections):
+        if section.is_heading and words & set(re.findall(r"[a-z]{4,}", section.heading.lower())):
+            found.add(i)
+    if found:
+        # "the whole email, not just the greeting": let the model decide what is meant.
+        return None if _WHOLE.search(feedback) else sorted(found)
+    return "all" if _WHOLE.search(feedback) or _DOCUMENT_EDIT.search(feedback) else None
+
+
+def route_by_model(llm, feedback: str, sections: list[Section]):
+    """Ask the model which sections to change, showing it only a one-line outline."""
+    outline = "\n".join(
+        f"[{i + 1}] {' '.join(s.text.split()[:14])}" for i, s in enumerate(sections)
+    )
+    response = llm.invoke([
+        SystemMessage(content="You route edit requests to the parts of a document they affect."),
+        HumanMessage(content=f"""Document sections:
+{outline}
+
+Edit request: {feedback}
+
+Which sections must change? Answer with the section numbers separated by commas, or ALL if the whole document must change."""),
+    ])
+    answer = str(response.content)
+    if re.search(r"\bALL\b", answer) or answer.strip(" .").lower() == "all":
+        return "all"
+    indices = sorted({int(n) - 1 for n in re.findall(r"\d+", answer) if 0 < int(n) <= len(sections)})
+    return indices or None  # no usable answer
+
+
+def route_feedback(llm, feedback: str, sections: list[Section]):
+    """Section indices, "all", or None when neither the rules nor the model give a usable answer."""
+    routed = route_by_rules(feedback, sections)
+    if routed is None:
+        routed = route_by_model(llm, feedback, sections)
+    return routed
+
+
+def rewrite_sections(llm, system_prompt: str, sections: list[Section], indices: list[int], feedback: str):
+    """Regenerate `indices` only; returns the new section list, or None if the reply cannot be used."""
+    numbered = "\n".join(f'<section id="{i + 1}">\n{s.text}\n</section>' for i, s in enumerate(sections))
+    wanted = ", ".join(str(i + 1) for i in indices)
+    response = llm.invoke([
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=f"""Here is the current draft, split into numbered sections:
+{numbered}
+
+User feedback: {feedback}
+
+Rewrite only section(s) {wanted} to apply the feedback; everything else stays as it is.
+Reply with only the rewritten section(s), each as <section id="N">...</section>.
+A section may become several paragraphs, or be left empty to delete it."""),
+    ])
+    replies = {int(n) - 1: text.strip() for n, text in _SECTION_TAG.findall(str(response.content))}
+    if not replies or not set(replies) <= set(indices):
+        return None
+    updated = []
+    for i, section in enumerate(sections):
+        if i not in replies:
+            updated.append(section)
+        elif replies[i]:
+            updated.append(Section(replies[i]))
+    return updated
+
+
+def refine_sections(llm, system_prompt: str, draft: str, feedback: str, rewrite_all):
+    """Apply `feedback` to `draft`, regenerating only the sections it affects.
+
+    `rewrite_all(draft, feedback)` is the whole-document fallback. Returns the new
+    draft and the routed section indices ("all" when the whole draft was regenerated).
+    """
+    sections = split_sections(draft)
+    if len(sections) < 2:
+        return rewrite_all(draft, feedback), "all"
+    routed = route_feedback(llm, feedback, sections)
+    if routed is None or routed == "all" or len(routed) > len(sections) * FULL_REWRITE_SHARE:
+        return rewrite_all(draft, feedback), "all"
+    updated = rewrite_sections(llm, system_prompt, sections, routed, feedback)
+    if updated is None:
+        return rewrite_all(draft, feedback), "all"
+    return join_sections(updated), routed
+
+
+if __name__ == "__main__":
+    import time
+
+    from langchain_core.messages import AIMessage
+
+    from context_packing import count_tokens
+
+    SECONDS_PER_TOKEN = 0.002  # stand-in generation speed; input tokens are treated as free
+
+    class StandInModel:
+        """Echoes the requested text back with a marker, sleeping per output token."""
+
+        def __init__(self):
+            self.output_tokens = 0
+
+        def invoke(self, messages):
+            prompt = messages[-1].content
+            if "Which sections must change?" in prompt:
+                reply = "ALL"
+            elif "Rewrite only section(s)" in prompt:
+                wanted = re.search(r"Rewrite only section\(s\) ([\d, ]+)", prompt).group(1)
+                sections = dict(_SECTION_TAG.findall(prompt.split("User feedback:")[0]))
+                reply = "\n".join(
+                    f'<section id="{n}">\n(edited) {sections[n]}\n</section>' for n in wanted.replace(" ", "").split(",")
+                )
+            else:
+                reply = "(edited) " + prompt.split("---\n", 1)[1].rsplit("\n---", 1)[0]
+            tokens = count_tokens(reply)
+            self.output_tokens += tokens
+            time.sleep(tokens * SECONDS_PER_TOKEN)
+            return AIMessage(content=reply)
+
+    # Ordinals count body paragraphs only; "start"/"end" of a paragraph is not the greeting or sign-off.
+    letter = split_sections(
+        "Subject: Plans\n\nDear Ann,\n\nThe first paragraph.\n\nThe second paragraph.\n\n"
+        "The third paragraph.\n\nBest,\nBob"
+    )
+    for feedback, expected in (
+        ("Add a sentence at the end of the second paragraph", [3]),
+        ("At the start of the third paragraph mention Q3", [4]),
+        ("Shorten paragraph 2", [3]),
+        ("Make the last paragraph warmer", [4]),
+        ("Change the greeting to 'Hi Ann'", [1]),
+        ("Fix the sign-off", [5]),
+        ("Add 3 paragraphs about hiring", None),
+        ("Make the whole email friendlier, including the greeting", None),
+        ("Make it more formal", "all"),
+    ):
+        assert route_by_rules(feedback, letter) == expected, (feedback, route_by_rules(feedback, letter))
+
+    llm = StandInModel()
+
+    def rewrite_all(draft, feedback):
+        return llm.invoke([HumanMessage(content=f"Draft:\n---\n{draft}\n---\nFeedback: {feedback}")]).content
+
+    paragraph = "We reviewed the quarterly numbers and the plan for the next release in detail. " * 4
+    draft = "Subject: Quarterly review\n\nHi team,\n\n" + "\n\n".join(
+        f"## Topic {i}\n{paragraph}" for i in range(1, 21)
+    ) + "\n\nBest regards,\nSam"
+    print(f"document: {len(split_sections(draft))} sections, {count_tokens(draft)} tokens")
+
+    for feedback in ("Change the greeting to 'Hello everyone'", "Expand the third paragraph", "Make it more formal"):
+        for label, refine in (
+            ("full", lambda: (rewrite_all(draft, feedback), "all")),
+            ("sections", lambda: refine_sections(llm, "You edit drafts.", draft, feedback, rewrite_all)),
+        ):
+            llm.output_tokens = 0
+            start = time.perf_counter()
+            new_draft, routed = refine()
+            elapsed = time.perf_counter() - start
+            print(f"  {feedback[:38]:<38} {label:<8} {llm.output_tokens:5d} output tokens  {elapsed:5.2f}s  sections={routed}")
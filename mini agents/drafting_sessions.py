@@ -0,0 +1,153 @@
+"""Start and resume drafting sessions that wait for the user without holding a thread.
+
+The drafting agent in `11_HumanAICollaborationDrafting.py` pauses with a
+LangGraph interrupt where it used to call `input()` inside the node. While a
+session waits for its human, it is only a checkpoint: no thread, no in-flight
+graph run. `DraftingSessions` wraps the compiled graph:
+
+    sessions = DraftingSessions(build_app(checkpointer=ChatStore("drafting_sessions.jsonl")))
+    outcome = sessions.start("alice")                       # runs until the agent waits
+    outcome = sessions.resume("alice", "Create a draft for a meeting request")
+
+`resume` can run on any worker thread (or event loop task, with `astart` /
+`aresume`) that shares the checkpointer. A session should be resumed by one
+worker at a time; route requests by session id.
+
+Run `python drafting_sessions.py` to hold thousands of idle sessions with a
+stand-in model and report threads and memory.
+"""
+
+from langgraph.types import Command
+
+
+class DraftingSessions:
+    """Session-level API over a checkpointed drafting graph."""
+
+    def __init__(self, app):
+        if app.checkpointer is None:
+            raise ValueError("the drafting graph must be compiled with a checkpointer")
+        self.app = app
+
+    @staticmethod
+    def _config(session_id: str) -> dict:
+        return {"configurable": {"thread_id": session_id}}
+
+    @staticmethod
+    def _outcome(session_id: str, result: dict) -> dict:
+        interrupts = result.get("__interrupt__") or ()
+        return {
+            "session": session_id,
+            "waiting": bool(interrupts),
+            "reply": interrupts[0].value.get("reply", "") if interrupts else "",
+            "draft_version": result.get("draft_version", 0),
+            "current_draft": result.get("current_draft", ""),
+        }
+
+    def status(self, session_id: str) -> str:
+        """"new", "waiting" (for the user), or "done"."""
+        snapshot = self.app.get_state(self._config(session_id))
+        if snapshot.interrupts:
+            return "waiting"
+        return "done" if snapshot.values else "new"
+
+    def start(self, session_id: str, state: dict = None) -> dict:
+        """Run a new session until the agent waits for the user (or finishes)."""
+        if self.status(session_id) != "new":
+            raise ValueError(f"session {session_id!r} already exists")
+        result = self.app.invoke(state or {"messages": []}, self._config(session_id))
+        return self._outcome(session_id, result)
+
+    def resume(self, session_id: str, user_input: str) -> dict:
+        """Answer a waiting session and run it until it waits again (or finishes)."""
+        if self.status(session_id) != "waiting":
+            raise ValueError(f"session {session_id!r} is not waiting for input")
+        result = self.app.invoke(Command(resume=user_input), self._config(session_id))
+        return self._outcome(session_id, result)
+
+    def pending(self, session_id: str) -> dict:
+        """The outcome a waiting session last returned, e.g. to show it again after a restart."""
+        snapshot = self.app.get_state(self._config(session_id))
+        return self._outcome(session_id, {**snapshot.values, "__interrupt__": snapshot.interrupts})
+
+    async def astart(self, session_id: str, state: dict = None) -> dict:
+        snapshot = await self.app.aget_state(self._config(session_id))
+        if snapshot.values or snapshot.interrupts:
+            raise ValueError(f"session {session_id!r} already exists")
+        result = await self.app.ainvoke(state or {"messages": []}, self._config(session_id))
+        return self._outcome(session_id, result)
+
+    async def aresume(self, session_id: str, user_input: str) -> dict:
+        snapshot = await self.app.aget_state(self._config(session_id))
+        if not snapshot.interrupts:
+            raise ValueError(f"session {session_id!r} is not waiting for input")
+        result = await self.app.ainvoke(Command(resume=user_input), self._config(session_id))
+        return self._outcome(session_id, result)
+
+    def close(self, session_id: str):
+        """Forget a session and its checkpoints."""
+        self.app.checkpointer.delete_thread(session_id)
+
+
+if __name__ == "__main__":
+    import contextlib
+    import importlib
+    import io
+    import os
+    import random
+    import resource
+    import tempfile
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from chat_store import ChatStore
+
+    drafting = importlib.import_module("11_HumanAICollaborationDrafting")
+
+    class StandInModel(FakeListChatModel):
+        """Answers without tool calls, so each turn goes straight back to waiting."""
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+    def stand_in():
+        return StandInModel(responses=["What would you like to draft today?"], cache=False)
+
+    for count in (1000, 5000):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "drafting_sessions.jsonl")
+            sessions = DraftingSessions(drafting.build_app(stand_in(), ChatStore(path, fsync="never")))
+            threads_before = threading.active_count()
+            with contextlib.redirect_stdout(io.StringIO()):
+                sessions.start("warm-up")
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for n in range(count):
+                    assert sessions.start(f"user-{n}")["waiting"]
+            elapsed = time.perf_counter() - start
+            memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024  # KiB on Linux
+            print(
+                f"{count} idle sessions: started in {elapsed:.1f}s, threads {threads_before} -> "
+                f"{threading.active_count()} (blocking input() needs {count}), "
+                f"{memory / count / 1024:.1f} KiB peak RSS and {os.path.getsize(path) / count / 1024:.1f} KiB on disk each"
+            )
+
+            # Any worker thread can continue any session.
+            chosen = random.sample(range(count), 200)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=8) as workers:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    outcomes = list(workers.map(lambda n: sessions.resume(f"user-{n}", "Hello!"), chosen))
+            assert all(o["waiting"] for o in outcomes)
+            print(f"  200 resumes on 8 workers: {(time.perf_counter() - start) / 200 * 1000:.1f} ms each")
+            sessions.app.checkpointer.close()
+
+            # After a restart, a fresh process picks the sessions up from disk.
+            reopened = DraftingSessions(drafting.build_app(stand_in(), ChatStore(path, fsync="never")))
+            assert reopened.status(f"user-{chosen[0]}") == "waiting"
+            with contextlib.redirect_stdout(io.StringIO()):
+                assert reopened.resume(f"user-{chosen[0]}", "Still there?")["waiting"]
+            reopened.app.checkpointer.close()
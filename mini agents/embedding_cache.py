@@ -0,0 +1,180 @@
+"""Disk-backed cache for embedding calls.
+
+`CachedEmbeddings` wraps any LangChain `Embeddings` object. Vectors are stored in
+a local SQLite file keyed by (model, hash of the normalized text), so a chunk or
+a question that was embedded once is never sent to the API again, even across
+restarts. Cache misses are collected and sent in large batches, and the cache
+is capped in size with least-recently-used eviction.
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so trivial whitespace/unicode differences share an entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+# Capitalised words that start a question or request without naming anything.
+_STARTERS = frozenset(
+    "what who whom whose when where why how which is are was were do does did can could would should "
+    "will tell explain describe list give show summarize compare find please the a an in on at for of "
+    "i my we our you your it this that there".split()
+)
+
+
+def key_terms(text: str) -> frozenset:
+    """Numbers and capitalised words (names, places, acronyms) in `text`, lowercased.
+
+    Two questions can embed almost identically while differing in exactly these
+    ("What happened in 1914?" / "... in 1915?"), so a similarity match is only
+    safe when they agree.
+    """
+    terms = set(re.findall(r"\d+(?:[.,:/]\d+)*", text))
+    for word in re.findall(r"[^\W\d_][\w'-]*", text):
+        if word[0].isupper() and word.lower() not in _STARTERS:
+            terms.add(word.lower())
+    return frozenset(terms)
+
+
+def _pack(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with a SQLite-backed LRU cache and batched misses."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        path: str = "embedding_cache.sqlite",
+        max_entries: int = 200_000,
+        batch_size: int = 512,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        payload = f"{self.model}\x00{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _lookup(self, keys: list[str]) -> dict:
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                found.update((key, _unpack(blob)) for key, blob in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, items: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, _pack(vector), now) for key, vector in items.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(t) for t in texts]
+        cached = self._lookup(keys)
+
+        # Embed each distinct missing text once, in large batches.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        miss_count = sum(1 for k in keys if k not in cached)
+        self.hits += len(keys) - miss_count
+        self.misses += miss_count
+
+        if missing:
+            miss_keys = list(missing)
+            for start in range(0, len(miss_keys), self.batch_size):
+                batch_keys = miss_keys[start:start + self.batch_size]
+                vectors = self.embeddings.embed_documents([missing[k] for k in batch_keys])
+                new_items = dict(zip(batch_keys, vectors))
+                self._store(new_items)
+                cached.update(new_items)
+
+        return [list(cached[k]) for k in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        cached = self._lookup([key])
+        if key in cached:
+            self.hits += 1
+            return cached[key]
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus the current size of the cache, for sizing `max_entries`."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
@@ -0,0 +1,365 @@
+"""Exact and semantic response cache for the chat models, shared by all graphs.
+
+Every chatbot and agent here calls `ChatOpenAI.invoke` directly, so a repeated
+question or a re-run of the drafting flow pays the full model latency again.
+`LLMResponseCache` is a LangChain `BaseCache`; installed with
+`enable_llm_cache()` it sits in front of every chat model in the process:
+
+- entries are keyed by the model and its parameters, tool bindings included,
+  and a hash of the normalized message list (message ids, metadata and
+  whitespace differences do not matter)
+- stored in SQLite, with a time-to-live and a size cap that evicts the least
+  recently used responses
+- only deterministic calls (`temperature=0`) are cached by default; a script
+  that wants replay whatever the temperature opts in with
+  `max_temperature=None`, and calls opt out per model
+  (`ChatOpenAI(cache=False)`) or per block of code (`with no_cache(): ...`)
+- with `embeddings`, a single-turn query (system messages plus one question)
+  also matches a cached query whose embedding is similar enough and that has
+  the same numbers and capitalised names (`key_terms`), so "... in 1914?" never
+  gets the answer to "... in 1915?"
+
+Run `python llm_cache.py` for a benchmark with a stand-in model.
+"""
+
+import contextvars
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import warnings
+from array import array
+from contextlib import contextmanager
+
+from langchain_core.caches import BaseCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.load import dumps, loads
+
+from embedding_cache import key_terms, normalize_text
+
+try:
+    import numpy as np
+except ImportError:  # similarity falls back to pure Python
+    np = None
+
+
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+@contextmanager
+def no_cache():
+    """Skip the response cache for model calls made inside this block (and tasks it starts)."""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def normalize_messages(prompt: str) -> list:
+    """The parts of a serialized prompt that decide the answer: role, text, tool calls."""
+    try:
+        items = json.loads(prompt)
+    except ValueError:
+        return [{"type": "text", "content": normalize_text(prompt)}]  # completion-style prompt
+    if not isinstance(items, list):
+        return [{"type": "text", "content": normalize_text(prompt)}]
+    messages = []
+    for item in items:
+        kwargs = item.get("kwargs", item) if isinstance(item, dict) else {"content": str(item)}
+        content = kwargs.get("content", "")
+        message = {
+            "type": kwargs.get("type") or item.get("id", ["?"])[-1],
+            "content": normalize_text(content) if isinstance(content, str) else content,
+        }
+        for field in ("name", "tool_call_id"):
+            if kwargs.get(field):
+                message[field] = kwargs[field]
+        if kwargs.get("tool_calls"):
+            message["tool_calls"] = [[c["name"], c["args"]] for c in kwargs["tool_calls"]]
+        messages.append(message)
+    return messages
+
+
+def _temperature(llm_string: str):
+    try:
+        return json.loads(llm_string.split("---", 1)[0])["kwargs"].get("temperature")
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _hash(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _load_generations(payload: str) -> list:
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="The function `loads` is in beta")
+        return loads(payload, allowed_objects="core")
+
+
+def _unit(vector) -> array:
+    norm = sum(x * x for x in vector) ** 0.5 or 1.0
+    return array("f", (x / norm for x in vector))
+
+
+class LLMResponseCache(BaseCache):
+    """SQLite-backed model response cache with TTL, a size cap and optional semantic matching."""
+
+    def __init__(
+        self,
+        path: str = "llm_cache.sqlite",
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_bytes: int = 256 * 2**20,
+        max_temperature: float = 0.0,
+        embeddings=None,
+        similarity_threshold: float = 0.95,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_temperature = max_temperature  # None: cache whatever the temperature (replay)
+        self.embeddings = embeddings  # None disables near-duplicate matching
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._vectors = {}  # key -> query vector computed in lookup, reused by update
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                context TEXT,
+                vector BLOB,
+                generations TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_context ON responses(context)")
+        self._conn.commit()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _cacheable(self, llm_string: str) -> bool:
+        if _bypass.get():
+            return False
+        if self.max_temperature is not None:
+            temperature = _temperature(llm_string)
+            # No explicit temperature means the provider default, which is not deterministic.
+            if temperature is None or temperature > self.max_temperature:
+                return False
+        return True
+
+    def _keys(self, prompt: str, llm_string: str):
+        """(exact key, semantic context key or None, single-turn query text or None)."""
+        messages = normalize_messages(prompt)
+        key = _hash(llm_string, messages)
+        if self.embeddings is None or not messages:
+            return key, None, None
+        *context, last = messages
+        if last["type"] != "human" or any(m["type"] != "system" for m in context):
+            return key, None, None
+        if not isinstance(last["content"], str):
+            return key, None, None
+        # Only questions with the same numbers and names are compared by similarity.
+        return key, _hash(llm_string, context, sorted(key_terms(last["content"]))), last["content"]
+
+    def _similar(self, context: str, vector: array, now: float):
+        rows = self._conn.execute(
+            "SELECT key, vector, generations FROM responses WHERE context = ? AND created_at > ?",
+            (context, now - self.ttl_seconds),
+        ).fetchall()
+        if not rows:
+            return None
+        if np is not None:
+            matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+            scores = matrix @ np.frombuffer(vector.tobytes(), dtype=np.float32)
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+        else:
+            scored = [
+                (sum(a * b for a, b in zip(vector, array("f", row[1]))), i) for i, row in enumerate(rows)
+            ]
+            score, best = max(scored)
+        return rows[best] if score >= self.similarity_threshold else None
+
+    def lookup(self, prompt: str, llm_string: str):
+        if not self._cacheable(llm_string):
+            self.bypassed += 1
+            return None
+        key, context, query = self._keys(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT generations FROM responses WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is not None:
+                self.exact_hits += 1
+                self._touch(key, now)
+                return _load_generations(row[0])
+        if query is None:
+            self.misses += 1
+            return None
+
+        vector = _unit(self.embeddings.embed_query(query))
+        with self._lock:
+            match = self._similar(context, vector, now)
+            if match is not None:
+                self.similar_hits += 1
+                self._touch(match[0], now)
+                return _load_generations(match[2])
+            self.misses += 1
+            self._vectors[key] = vector
+            if len(self._vectors) > 1024:  # lookups whose calls failed never reach update
+                self._vectors.pop(next(iter(self._vectors)))
+        return None
+
+    def _touch(self, key: str, now: float):
+        self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+
+    def update(self, prompt: str, llm_string: str, return_val):
+        if not self._cacheable(llm_string):
+            return
+        key, context, query = self._keys(prompt, llm_string)
+        # A cached message keeps no id, so each hit gets a fresh one and a
+        # repeated answer does not replace the earlier one in `add_messages` state.
+        generations = [
+            g.model_copy(update={"message": g.message.model_copy(update={"id": None})}) if hasattr(g, "message") else g
+            for g in return_val
+        ]
+        payload = dumps(generations)
+        now = time.time()
+        with self._lock:
+            vector = self._vectors.pop(key, None)
+        if query is not None and vector is None:
+            vector = _unit(self.embeddings.embed_query(query))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, context, vector, generations, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, context, vector.tobytes() if vector is not None else None, payload, len(payload), now, now),
+            )
+            self._bytes += len(payload) - (old[0] if old else 0)
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        expired = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses WHERE created_at <= ?", (now - self.ttl_seconds,)
+        ).fetchone()
+        if expired[1]:
+            self._conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl_seconds,))
+            self._bytes -= expired[0]
+        if self._bytes <= self.max_bytes:
+            return
+        # Drop least recently used entries until the cache is 10% under the cap.
+        excess = self._bytes - int(self.max_bytes * 0.9)
+        victims, freed = [], 0
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if freed >= excess:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self._bytes -= freed
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.similar_hits
+        total = hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": entries,
+            "bytes": self._bytes,
+        }
+
+
+def enable_llm_cache(path: str = "llm_cache.sqlite", **options) -> LLMResponseCache:
+    """Install one `LLMResponseCache` for every chat model in the process (unless it sets `cache=False`)."""
+    cache = LLMResponseCache(path, **options)
+    set_llm_cache(cache)
+    return cache
+
+
+if __name__ == "__main__":
+    import os
+    import random
+    import tempfile
+
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    class SlowModel(FakeListChatModel):
+        latency: float = 0.3
+
+        def _call(self, *args, **kwargs):
+            time.sleep(self.latency)  # imitates the API round trip
+            return super()._call(*args, **kwargs)
+
+    class BagOfWords(Embeddings):
+        """Stand-in embeddings: word counts over a fixed vocabulary."""
+
+        vocabulary = "what is the capital of france germany how do i reset my password ship order refund happened in".split()
+
+        def embed_query(self, text):
+            words = normalize_text(text.lower().strip("?!. ")).split()
+            return [float(words.count(w)) + 1e-3 for w in self.vocabulary]
+
+        def embed_documents(self, texts):
+            return [self.embed_query(t) for t in texts]
+
+    random.seed(0)
+    faq = ["What is the capital of France?", "How do I reset my password?", "Where is my order?", "Can I get a refund?"]
+    variants = [q for q in faq] + [q.lower() for q in faq] + [q.replace("?", " ?") for q in faq]
+    questions = [random.choice(variants) for _ in range(40)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, options in (
+            ("no cache", None),
+            # The stand-in model has no temperature setting, so it is opted in to replay.
+            ("exact", {"max_temperature": None}),
+            ("exact + semantic", {"max_temperature": None, "embeddings": BagOfWords(), "similarity_threshold": 0.97}),
+        ):
+            model = SlowModel(responses=["A cached answer."] * 100)
+            if options is None:
+                model.cache = False
+            else:
+                cache = enable_llm_cache(os.path.join(tmp, f"{len(options)}.sqlite"), **options)
+            start = time.perf_counter()
+            for question in questions:
+                model.invoke([SystemMessage("You are a helpful support bot."), HumanMessage(question)])
+            elapsed = time.perf_counter() - start
+            print(f"{label:<18} {elapsed / len(questions) * 1000:7.1f} ms per question", end="")
+            print(f"  {cache.stats()}" if options is not None else "")
+
+        # Near-identical questions about different years or names never share an answer.
+        tutor = SlowModel(responses=["About 1914.", "About 1915."], latency=0.0)
+        for year in (1914, 1915):
+            answer = tutor.invoke([SystemMessage("You are a history tutor."), HumanMessage(f"What happened in {year}?")])
+            assert str(year) in answer.content, answer.content
+
+        with no_cache():
+            start = time.perf_counter()
+            model.invoke([HumanMessage(faq[0])])
+            print(f"no_cache() block:  {(time.perf_counter() - start) * 1000:7.1f} ms (bypassed: {cache.stats()['bypassed']})")
@@ -0,0 +1,339 @@
+"""Process-wide registry of chat and embedding clients on shared keep-alive pools.
+
+The scripts used to build `ChatOpenAI(...)` at import, and the drafting agent
+built a new one in every tool call. Each instance validates its settings and
+creates its own OpenAI client objects, and an idle connection is dropped after
+a few seconds, so the first request after a user has been reading pays for a
+new TCP and TLS handshake. `registry` hands out clients instead:
+
+- one configured client per model and options, created on first use
+- every client sends its requests through one shared `httpx` pool, with a
+  keep-alive long enough to outlast a user reading a reply
+- tool-bound variants (`with_tools`) are cached per model and tool set
+- `warm_up()` opens pool connections ahead of the first request
+- `stats()` counts requests and new connections, so reuse is measurable
+
+    from model_registry import registry
+
+    llm = registry.chat("gpt-4o", temperature=0)
+    model = registry.with_tools(llm, tools)
+    embeddings = registry.embeddings("text-embedding-3-small")
+
+Async requests share one `httpx.AsyncClient`, whose connections belong to the
+event loop that opened them; keep async model calls on one loop per process
+(as react_server.py and speculative_refine.py do).
+
+Run `python model_registry.py` to compare connection reuse against a local
+stand-in for the OpenAI API.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+def _key(*parts) -> str:
+    return json.dumps(parts, sort_keys=True, default=repr)
+
+
+class ModelRegistry:
+    """Shared, lazily created model clients over one keep-alive connection pool."""
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 300.0,
+        timeout: float = 120.0,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=10.0)
+        self._http = None
+        self._async_http = None
+        self._models = {}  # key -> chat model or embeddings client
+        self._bound = {}  # key -> (model, tool-bound runnable); the model is kept so its id stays unique
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.created = 0
+        self.reused = 0
+
+    # ---- HTTP pools ------------------------------------------------------
+
+    def _trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections += 1
+
+    async def _atrace(self, event: str, info: dict):
+        self._trace(event, info)
+
+    def _on_request(self, request: httpx.Request):
+        request.extensions["trace"] = self._trace
+        with self._lock:
+            self.requests += 1
+
+    async def _aon_request(self, request: httpx.Request):
+        request.extensions["trace"] = self._atrace
+        with self._lock:
+            self.requests += 1
+
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http is None:
+                self._http = httpx.Client(
+                    limits=self.limits, timeout=self.timeout, event_hooks={"request": [self._on_request]}
+                )
+            return self._http
+
+    def async_http_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_http is None:
+                self._async_http = httpx.AsyncClient(
+                    limits=self.limits, timeout=self.timeout, event_hooks={"request": [self._aon_request]}
+                )
+            return self._async_http
+
+    # ---- clients ---------------------------------------------------------
+
+    def _get(self, key: str, create):
+        with self._lock:
+            client = self._models.get(key)
+            if client is not None:
+                self.reused += 1
+                return client
+        client = create()
+        with self._lock:
+            client = self._models.setdefault(key, client)
+            self.created += 1
+            return client
+
+    def chat(self, model: str = "gpt-4o", **options) -> ChatOpenAI:
+        """The shared `ChatOpenAI` for `model` with these options (temperature, streaming, ...)."""
+        # Set explicitly: ChatOpenAI only enables it by itself when it builds its own HTTP client,
+        # and it is part of the response cache key (llm_cache.py).
+        options.setdefault("stream_usage", True)
+        return self._get(_key("chat", model, options), lambda: ChatOpenAI(
+            model=model,
+            http_client=self.http_client(),
+            http_async_client=self.async_http_client(),
+            **options
+        ))
+
+    def embeddings(self, model: str = "text-embedding-3-small", **options) -> OpenAIEmbeddings:
+        return self._get(_key("embeddings", model, options), lambda: OpenAIEmbeddings(
+            model=model,
+            http_client=self.http_client(),
+            http_async_client=self.async_http_client(),
+            **options
+        ))
+
+    def with_tools(self, chat_model, tools: list, **kwargs):
+        """`chat_model.bind_tools(tools, **kwargs)`, built once per model and tool set."""
+        key = _key("tools", id(chat_model), [getattr(t, "name", repr(t)) for t in tools], kwargs)
+        with self._lock:
+            entry = self._bound.get(key)
+            if entry is not None and entry[0] is chat_model:
+                self.reused += 1
+                return entry[1]
+        bound = chat_model.bind_tools(tools, **kwargs)
+        with self._lock:
+            self._bound[key] = (chat_model, bound)
+            self.created += 1
+        return bound
+
+    # ---- warm-up and stats -----------------------------------------------
+
+    def warm_up(self, connections: int = 2, base_url: str = None, background: bool = False) -> int:
+        """Open `connections` pooled connections to the API with cheap `GET /models` requests.
+
+        Best effort: failures are ignored. Returns how many requests got an answer
+        (0 right away with `background=True`, which does not block startup).
+        """
+        base_url = (base_url or os.getenv("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}"}
+        client = self.http_client()
+
+        def ping(_):
+            try:
+                client.get(f"{base_url}/models", headers=headers, timeout=10.0)
+                return 1
+            except httpx.HTTPError:
+                return 0
+
+        if background:
+            threading.Thread(target=self.warm_up, args=(connections, base_url), daemon=True).start()
+            return 0
+        # Concurrent requests, so each one needs a connection of its own.
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            return sum(pool.map(ping, range(connections)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "clients_created": self.created,
+                "clients_reused": self.reused,
+                "requests": self.requests,
+                "connections": self.connections,
+                "connection_reuse": 1 - self.connections / self.requests if self.requests else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            http, self._http = self._http, None
+            self._async_http = None  # closing it needs its event loop; its connections are dropped with it
+            self._models.clear()
+            self._bound.clear()
+        if http is not None:
+            http.close()
+
+
+registry = ModelRegistry()
+
+
+if __name__ == "__main__":
+    import argparse
+    import base64
+    import struct
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from langchain_core.messages import HumanMessage
+    from langchain_core.tools import tool
+
+    def stand_in_server(latency: float):
+        """OpenAI-compatible chat, embeddings and models endpoints on localhost.
+
+        `latency` is added per request and per new connection (a stand-in for the
+        TCP + TLS handshake with the real API).
+        """
+        counters = {"requests": 0, "connections": 0}
+        counter_lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with counter_lock:
+                    counters["connections"] += 1
+                time.sleep(latency)
+
+            def _reply(self, body: dict):
+                with counter_lock:
+                    counters["requests"] += 1
+                time.sleep(latency)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._reply({"object": "list", "data": [{"id": "gpt-4o", "object": "model", "owned_by": "stand-in"}]})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path.endswith("/embeddings"):
+                    vector = base64.b64encode(struct.pack("8f", *range(8))).decode("ascii")
+                    inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+                    self._reply({
+                        "object": "list", "model": request["model"],
+                        "data": [{"object": "embedding", "index": i, "embedding": vector} for i in range(len(inputs))],
+                        "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                    })
+                    return
+                self._reply({
+                    "id": "chatcmpl-stand-in", "object": "chat.completion", "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "Hello from the stand-in."}}],
+                    "usage": {"prompt_tokens": 5, "completion_tokens": 5, "total_tokens": 10},
+                })
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, counters
+
+    parser = argparse.ArgumentParser(description="Compare model client reuse against a local stand-in API.")
+    parser.add_argument("--latency", type=float, default=0.03, help="simulated seconds per request / new connection")
+    parser.add_argument("--calls", type=int, default=30, help="chat calls per strategy")
+    parser.add_argument("--idle", type=float, default=6.0, help="seconds of user idle time before the last call")
+    args = parser.parse_args()
+
+    server, counters = stand_in_server(args.latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stand-in")
+    os.environ["OPENAI_BASE_URL"] = base_url
+    messages = [HumanMessage(content="Hello!")]
+
+    @tool
+    def lookup(query: str) -> str:
+        """Look something up."""
+        return query
+
+    def measure(name, call):
+        counters.update(requests=0, connections=0)
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            call()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<30} {elapsed / args.calls * 1000:6.1f} ms/call  "
+              f"{counters['requests']:3d} requests  {counters['connections']:3d} connections")
+
+    def own_pool():
+        with httpx.Client() as http:
+            ChatOpenAI(model="gpt-4o", http_client=http).bind_tools([lookup]).invoke(messages)
+
+    print(f"{args.calls} chat calls each, {args.latency * 1000:.0f} ms per request and per new connection")
+    measure("new client + pool per call", own_pool)
+    measure("new ChatOpenAI per call", lambda: ChatOpenAI(model="gpt-4o").bind_tools([lookup]).invoke(messages))
+    measure("registry", lambda: registry.with_tools(registry.chat("gpt-4o"), [lookup]).invoke(messages))
+    counters.update(requests=0, connections=0)
+    registry.embeddings("text-embedding-3-small", check_embedding_ctx_length=False).embed_query("Hello!")
+    print(f"embeddings through the same pool: {counters['connections']} new connections")
+
+    # A user reads the reply before the next request.
+    for name, call in (
+        ("after idle, new ChatOpenAI", lambda: ChatOpenAI(model="gpt-4o").invoke(messages)),
+        ("after idle, registry", lambda: registry.chat("gpt-4o").invoke(messages)),
+    ):
+        call()
+        time.sleep(args.idle)
+        counters.update(requests=0, connections=0)
+        start = time.perf_counter()
+        call()
+        print(f"{name:<30} {(time.perf_counter() - start) * 1000:6.1f} ms after {args.idle:.0f}s idle, "
+              f"{counters['connections']} new connections")
+
+    # The first request of a fresh process, with and without warm-up.
+    for warm in (False, True):
+        fresh = ModelRegistry()
+        if warm:
+            fresh.warm_up(connections=2)
+        start = time.perf_counter()
+        fresh.chat("gpt-4o").invoke(messages)
+        print(f"{'first call, warmed up' if warm else 'first call, cold':<30} "
+              f"{(time.perf_counter() - start) * 1000:6.1f} ms")
+        fresh.close()
+
+    print(f"registry: {registry.stats()}")
+    registry.close()
+    server.shutdown()
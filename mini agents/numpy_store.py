@@ -0,0 +1,384 @@
+"""A small NumPy vector store for read-mostly corpora.
+
+`NumpyVectorStore` is a LangChain `VectorStore`, so it plugs into
+`as_retriever()` and the ingestion code exactly like Chroma. Its directory holds:
+
+- `vectors.npy`: one L2-normalized embedding per row, float32 or int8
+  (int8 rows also get a float32 scale in `scales.npy`)
+- `records.jsonl`: an append-only sidecar with the id, text and metadata of each
+  row, plus delete markers
+- optionally `ivf_centroids.npy` / `ivf_lists.npy` for cluster-based coarse search
+
+The matrix is opened with `np.load(mmap_mode="r")`, so startup does not read the
+vectors and several processes serving the same index share its pages through
+the OS page cache. Search is an exact, vectorized dot product over all rows, or,
+after `build_ivf()`, a dot product over the rows of the closest clusters only.
+New rows are appended in place (the `.npy` header reserves room for the row
+count), so ingestion batches do not rewrite the file.
+"""
+
+import json
+import os
+import struct
+import uuid
+from typing import Iterable, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+HEADER_BYTES = 128
+BLOCK_ROWS = 16384
+
+
+def _write_npy_header(f, dtype: np.dtype, shape: tuple):
+    """Write a fixed-size .npy v1.0 header so the row count can be updated in place."""
+    header = repr({"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape})
+    header = header.encode("latin1")
+    padding = HEADER_BYTES - 10 - len(header) - 1
+    f.seek(0)
+    f.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", HEADER_BYTES - 10) + header + b" " * padding + b"\n")
+
+
+class _AppendableArray:
+    """A 2-D (or 1-D) .npy file that can grow by appending rows."""
+
+    def __init__(self, path: str, dtype, width: Optional[int]):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self._mmap = None
+
+    def rows(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        return (os.path.getsize(self.path) - HEADER_BYTES) // (self.dtype.itemsize * (self.width or 1))
+
+    def append(self, values: np.ndarray):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        mode = "r+b" if os.path.exists(self.path) else "w+b"
+        with open(self.path, mode) as f:
+            if mode == "w+b":
+                _write_npy_header(f, self.dtype, self._shape(0))
+            rows = self.rows() if mode == "r+b" else 0
+            f.seek(HEADER_BYTES + rows * self.dtype.itemsize * (self.width or 1))
+            f.write(values.tobytes())
+            f.flush()
+            _write_npy_header(f, self.dtype, self._shape(rows + len(values)))
+            os.fsync(f.fileno())
+        self._mmap = None
+
+    def _shape(self, rows: int) -> tuple:
+        return (rows, self.width) if self.width else (rows,)
+
+    def load(self) -> np.ndarray:
+        if self._mmap is None:
+            if self.rows() == 0:
+                return np.zeros(self._shape(0), dtype=self.dtype)
+            self._mmap = np.load(self.path, mmap_mode="r")
+        return self._mmap
+
+    def rewrite(self, values: np.ndarray):
+        tmp_path = self.path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        other = _AppendableArray(tmp_path, self.dtype, self.width)
+        other.append(values)
+        self._mmap = None
+        os.replace(tmp_path, self.path)
+
+
+class NumpyVectorStore(VectorStore):
+    """Memory-mapped float32/int8 embedding matrix with exact or IVF top-k search."""
+
+    def __init__(self, path: str, embedding: Embeddings, quantize: str = "float32"):
+        if quantize not in ("float32", "int8"):
+            raise ValueError("quantize must be 'float32' or 'int8'")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.embedding = embedding
+        self.quantize = quantize
+        self._records_path = os.path.join(path, "records.jsonl")
+        self._ids = []        # row -> id (None once deleted)
+        self._texts = []
+        self._metadatas = []
+        self._row_of = {}     # id -> row
+        self._dim = None
+        self._vectors = None
+        self._scales = None
+        self._live = None     # cached "row not deleted" mask
+        self._load_records()
+
+    # ---------- storage ----------
+
+    def _load_records(self):
+        config_path = os.path.join(self.path, "config.json")
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            self._dim = config["dim"]
+            self.quantize = config["quantize"]
+            self._open_arrays()
+
+        if os.path.exists(self._records_path):
+            with open(self._records_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # torn last line after a crash
+                    record = json.loads(line)
+                    if "delete" in record:
+                        row = self._row_of.pop(record["delete"], None)
+                        if row is not None:
+                            self._ids[row] = None
+                        continue
+                    self._row_of[record["id"]] = len(self._ids)
+                    self._ids.append(record["id"])
+                    self._texts.append(record["text"])
+                    self._metadatas.append(record["metadata"])
+
+        # Vectors are written before records, so extra vector rows are unfinished appends.
+        if self._vectors is not None and self._vectors.rows() > len(self._ids):
+            self._vectors.rewrite(self._vectors.load()[: len(self._ids)])
+            if self._scales is not None:
+                self._scales.rewrite(self._scales.load()[: len(self._ids)])
+
+    def _open_arrays(self):
+        dtype = np.int8 if self.quantize == "int8" else np.float32
+        self._vectors = _AppendableArray(os.path.join(self.path, "vectors.npy"), dtype, self._dim)
+        if self.quantize == "int8":
+            self._scales = _AppendableArray(os.path.join(self.path, "scales.npy"), np.float32, None)
+
+    def _encode(self, vectors: np.ndarray):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        if self.quantize == "float32":
+            return vectors.astype(np.float32), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        **kwargs,
+    ) -> list[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+            with open(os.path.join(self.path, "config.json"), "w", encoding="utf-8") as f:
+                json.dump({"dim": self._dim, "quantize": self.quantize}, f)
+            self._open_arrays()
+
+        # Re-adding an id replaces the old row.
+        self.delete([i for i in ids if i in self._row_of])
+
+        encoded, scales = self._encode(vectors)
+        self._vectors.append(encoded)
+        if scales is not None:
+            self._scales.append(scales)
+
+        with open(self._records_path, "a", encoding="utf-8") as f:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                f.write(json.dumps({"id": doc_id, "text": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+                self._row_of[doc_id] = len(self._ids)
+                self._ids.append(doc_id)
+                self._texts.append(text)
+                self._metadatas.append(metadata)
+        return ids
+
+    def delete(self, ids: Optional[list[str]] = None, **kwargs) -> Optional[bool]:
+        ids = [i for i in (ids or []) if i in self._row_of]
+        if not ids:
+            return True
+        with open(self._records_path, "a", encoding="utf-8") as f:
+            for doc_id in ids:
+                f.write(json.dumps({"delete": doc_id}) + "\n")
+                self._ids[self._row_of.pop(doc_id)] = None
+        self._live = None
+        return True
+
+    def get(self, include=None) -> dict:
+        """All live rows in Chroma's `get()` shape (ids, documents, metadatas)."""
+        rows = sorted(self._row_of.values())
+        return {
+            "ids": [self._ids[r] for r in rows],
+            "documents": [self._texts[r] for r in rows],
+            "metadatas": [self._metadatas[r] for r in rows],
+        }
+
+    def compact(self):
+        """Drop deleted rows from the matrix and the sidecar (rewrites both files)."""
+        rows = np.array(sorted(self._row_of.values()), dtype=np.int64)
+        if self._vectors is not None:
+            self._vectors.rewrite(self._vectors.load()[rows])
+            if self._scales is not None:
+                self._scales.rewrite(self._scales.load()[rows])
+        tmp_path = self._records_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps(
+                    {"id": self._ids[r], "text": self._texts[r], "metadata": self._metadatas[r]},
+                    ensure_ascii=False,
+                ) + "\n")
+        os.replace(tmp_path, self._records_path)
+        self._ids = [self._ids[r] for r in rows]
+        self._texts = [self._texts[r] for r in rows]
+        self._metadatas = [self._metadatas[r] for r in rows]
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._live = None
+        self._drop_ivf()
+
+    # ---------- IVF coarse search ----------
+
+    def _ivf_paths(self):
+        return (
+            os.path.join(self.path, "ivf_centroids.npy"),
+            os.path.join(self.path, "ivf_lists.npy"),
+        )
+
+    def _drop_ivf(self):
+        for p in self._ivf_paths():
+            if os.path.exists(p):
+                os.remove(p)
+
+    def build_ivf(self, n_lists: int = None, iterations: int = 10, seed: int = 0):
+        """Cluster the rows with k-means so searches can visit only the closest clusters.
+
+        Rows added later are not in any cluster and are always scored exactly.
+        """
+        matrix = self._matrix_rows(slice(0, len(self._ids)))
+        if len(matrix) == 0:
+            return
+        n_lists = min(n_lists or max(1, int(np.sqrt(len(matrix)))), len(matrix))
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(len(matrix), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(matrix @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = matrix[assignment == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+        assignment = np.argmax(matrix @ centroids.T, axis=1).astype(np.int32)
+        centroids_path, lists_path = self._ivf_paths()
+        np.save(centroids_path, centroids.astype(np.float32))
+        np.save(lists_path, assignment)
+
+    # ---------- search ----------
+
+    def _matrix_rows(self, rows) -> np.ndarray:
+        """Float32 rows of the matrix (dequantized when stored as int8); `rows` is an index array or slice."""
+        if self._vectors is None:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+        block = np.asarray(self._vectors.load()[rows], dtype=np.float32)
+        if self._scales is not None:
+            block = block * np.asarray(self._scales.load()[rows])[:, None]
+        return block
+
+    def _block_scores(self, rows, query: np.ndarray) -> np.ndarray:
+        if self._scales is None:
+            # float32 rows are multiplied straight from the memory map, without a copy.
+            return self._vectors.load()[rows] @ query
+        block = np.asarray(self._vectors.load()[rows], dtype=np.float32) @ query
+        return block * self._scales.load()[rows]
+
+    def _live_mask(self) -> np.ndarray:
+        if self._live is None or len(self._live) != len(self._ids):
+            self._live = np.fromiter((i is not None for i in self._ids), dtype=bool, count=len(self._ids))
+        return self._live
+
+    def _candidate_rows(self, query: np.ndarray, n_probe: int):
+        """Rows to score: all of them, or with an IVF index only the `n_probe` closest clusters."""
+        centroids_path, lists_path = self._ivf_paths()
+        if not os.path.exists(centroids_path):
+            return None
+        centroids = np.load(centroids_path, mmap_mode="r")
+        assignment = np.load(lists_path, mmap_mode="r")
+        probes = np.argsort(-(centroids @ query))[:n_probe]
+        clustered = np.nonzero(np.isin(assignment, probes))[0]
+        unclustered = np.arange(len(assignment), len(self._ids))
+        return np.concatenate([clustered, unclustered])
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: list[float], k: int = 4, n_probe: int = 8, **kwargs
+    ) -> list[tuple[Document, float]]:
+        if not self._row_of:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+
+        candidates = self._candidate_rows(query, n_probe)
+        if candidates is None:
+            total = len(self._ids)
+            rows = np.arange(total)
+            scores = np.concatenate([
+                self._block_scores(slice(start, min(total, start + BLOCK_ROWS)), query)
+                for start in range(0, total, BLOCK_ROWS)
+            ])
+        else:
+            rows = candidates
+            scores = np.concatenate([
+                self._block_scores(candidates[start:start + BLOCK_ROWS], query)
+                for start in range(0, len(candidates), BLOCK_ROWS)
+            ] or [np.zeros(0, dtype=np.float32)])
+
+        live = self._live_mask()[rows]
+        rows, scores = rows[live], scores[live]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [
+            (
+                Document(id=self._ids[rows[i]], page_content=self._texts[rows[i]], metadata=self._metadatas[rows[i]]),
+                float(scores[i]),
+            )
+            for i in top
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0  # cosine similarity -> [0, 1]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        path: str = "./numpy_vector_store",
+        quantize: str = "float32",
+        **kwargs,
+    ) -> "NumpyVectorStore":
+        store = cls(path, embedding, quantize=quantize)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
@@ -0,0 +1,175 @@
+"""Result cache in front of a retriever.
+
+The same (or almost the same) questions reach `search_history` again and again,
+and each one costs a query embedding plus a vector and keyword search.
+`QueryResultCache` keeps recent results in an LRU with a time-to-live:
+
+1. exact hits on a normalized form of the query string
+2. optionally, near-duplicate hits whose query embedding has a cosine
+   similarity above a threshold with a cached query that has the same
+   numbers and capitalised names (`key_terms`), so a question about 1915 never
+   gets the documents retrieved for 1914
+
+The cache is cleared automatically whenever the `version` callable returns
+something new, e.g. the ingestion manifest version after a re-index.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from embedding_cache import key_terms
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+def _unit(vector) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class QueryResultCache:
+    """LRU + TTL cache of retrieval results, with optional semantic matching."""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600,
+        embeddings=None,
+        similarity_threshold: float = 0.95,
+        version=None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embeddings = embeddings  # None disables near-duplicate matching
+        self.similarity_threshold = similarity_threshold
+        self.version = version
+        self._entries = OrderedDict()  # normalized query -> entry dict
+        self._current_version = version() if version else None
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def _check_version(self):
+        if self.version is None:
+            return
+        current = self.version()
+        if current != self._current_version:
+            self._entries.clear()
+            self._current_version = current
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return now - entry["stored_at"] >= self.ttl_seconds
+
+    def _expire(self, now: float):
+        # Entries are in LRU order, not insertion order, so this only trims the
+        # cold end; a hit still checks the age of the entry it matched.
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if not self._expired(entry, now):
+                break
+            del self._entries[key]
+
+    def lookup(self, query: str):
+        """Cached documents for `query`, or None. Also returns the query embedding (or None) for `store`."""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                self.saved_seconds += entry["latency"]
+                return entry["docs"], None
+
+        if self.embeddings is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        vector = _unit(self.embeddings.embed_query(query))
+        terms = key_terms(query)
+        with self._lock:
+            now = time.time()
+            best_key, best_score = None, self.similarity_threshold
+            expired = []
+            for other_key, other in self._entries.items():
+                if self._expired(other, now):
+                    expired.append(other_key)
+                    continue
+                if other["vector"] is None or other["terms"] != terms:
+                    continue
+                score = sum(a * b for a, b in zip(vector, other["vector"]))
+                if score >= best_score:
+                    best_key, best_score = other_key, score
+            for other_key in expired:
+                del self._entries[other_key]
+            if best_key is not None:
+                entry = self._entries[best_key]
+                self._entries.move_to_end(best_key)
+                self.similar_hits += 1
+                self.saved_seconds += entry["latency"]
+                return entry["docs"], vector
+            self.misses += 1
+        return None, vector
+
+    def store(self, query: str, docs: list[Document], latency: float, vector=None):
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = {
+                "docs": docs,
+                "vector": vector,
+                "terms": key_terms(query),
+                "latency": latency,
+                "stored_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.similar_hits
+        total = hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "saved_seconds": self.saved_seconds,
+            "entries": len(self._entries),
+        }
+
+
+class CachedRetriever(BaseRetriever):
+    """Drop-in retriever that answers from a `QueryResultCache` when it can."""
+
+    retriever: BaseRetriever
+    cache: Any
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        docs, vector = self.cache.lookup(query)
+        if docs is not None:
+            return docs
+        start = time.perf_counter()
+        docs = self.retriever.invoke(query)
+        self.cache.store(query, docs, time.perf_counter() - start, vector)
+        return docs
@@ -0,0 +1,202 @@
+"""Offline retrieval benchmark for the RAG agent.
+
+Builds the same kind of index `12_ragAgent.py` uses (chunking -> Chroma, plus
+the BM25 keyword index) over a fixture corpus, with a deterministic local
+embedding function so no API key or network is needed. For every combination
+of chunk size, chunk overlap and k it reports:
+
+- recall@k: share of questions whose answer text appears in one of the top k chunks
+- MRR: mean reciprocal rank of the first chunk that contains the answer
+- p50 / p95 query latency
+- index build time and index size on disk
+
+Results are written as JSON so runs can be diffed between versions:
+
+    python rag_benchmark.py --chunk-sizes 500 900 1400 --overlaps 100 200 --k 3 5 8 --output bench.json
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import time
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from bm25_index import BM25Index, HybridRetriever
+from rag_index import chunk_id
+
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_data", "ai_history_fixture.json")
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings (feature hashing of words and word pairs).
+
+    Not a substitute for a real model, but stable across runs and machines, so
+    differences between benchmark results come from the retrieval settings.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> list[float]:
+        words = re.findall(r"\w+", text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = [0.0] * self.dimensions
+        for feature in features:
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def load_fixture(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    pages = [
+        Document(page_content=text, metadata={"source": doc["source"], "page": page})
+        for doc in data["documents"]
+        for page, text in enumerate(doc["pages"])
+    ]
+    return pages, data["queries"]
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def build_index(pages, chunk_size: int, chunk_overlap: int, embeddings: Embeddings, workdir: str):
+    """Chunk `pages` and build a Chroma collection and BM25 index in `workdir`."""
+    from langchain_chroma import Chroma
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = splitter.split_documents(pages)
+    ids = [chunk_id(c.metadata["source"], c.metadata["page"], c.page_content) for c in chunks]
+    # Identical chunks on a page collapse to one id, as in real ingestion.
+    unique = dict(zip(ids, chunks))
+
+    vectorstore = Chroma(
+        collection_name="benchmark",
+        embedding_function=embeddings,
+        persist_directory=workdir,
+    )
+    lexical_index = BM25Index(os.path.join(workdir, "bm25_index.json"))
+    vectorstore.add_documents(list(unique.values()), ids=list(unique))
+    lexical_index.add_documents(list(unique.values()), ids=list(unique))
+    lexical_index.save()
+    return vectorstore, lexical_index, len(unique)
+
+
+def make_retriever(kind: str, vectorstore, lexical_index, k: int):
+    if kind == "vector":
+        return vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": k})
+    if kind == "hybrid":
+        return HybridRetriever(
+            vector_retriever=vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 4 * k}),
+            lexical_index=lexical_index,
+            k=k,
+            fetch_k=4 * k,
+        )
+    raise ValueError(f"Unknown retriever: {kind}")
+
+
+def evaluate(retriever, queries, k: int) -> dict:
+    hits = 0
+    reciprocal_ranks = []
+    latencies = []
+    for item in queries:
+        start = time.perf_counter()
+        docs = retriever.invoke(item["query"])[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        rank = next((i + 1 for i, d in enumerate(docs) if item["answer"] in d.page_content), None)
+        if rank:
+            hits += 1
+            reciprocal_ranks.append(1.0 / rank)
+        else:
+            reciprocal_ranks.append(0.0)
+    return {
+        "recall_at_k": round(hits / len(queries), 4),
+        "mrr": round(sum(reciprocal_ranks) / len(queries), 4),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+    }
+
+
+def run_benchmark(fixture: str, chunk_sizes, overlaps, ks, retrievers) -> dict:
+    pages, queries = load_fixture(fixture)
+    embeddings = HashingEmbeddings()
+    results = []
+
+    for chunk_size in chunk_sizes:
+        for chunk_overlap in overlaps:
+            if chunk_overlap >= chunk_size:
+                continue
+            with tempfile.TemporaryDirectory() as workdir:
+                start = time.perf_counter()
+                vectorstore, lexical_index, n_chunks = build_index(
+                    pages, chunk_size, chunk_overlap, embeddings, workdir
+                )
+                build_seconds = time.perf_counter() - start
+                index_bytes = directory_size(workdir)
+
+                for kind in retrievers:
+                    for k in ks:
+                        row = {
+                            "retriever": kind,
+                            "chunk_size": chunk_size,
+                            "chunk_overlap": chunk_overlap,
+                            "k": k,
+                            "chunks": n_chunks,
+                            "build_seconds": round(build_seconds, 4),
+                            "index_bytes": index_bytes,
+                        }
+                        row.update(evaluate(make_retriever(kind, vectorstore, lexical_index, k), queries, k))
+                        results.append(row)
+                        print(json.dumps(row))
+
+    return {
+        "fixture": os.path.basename(fixture),
+        "queries": len(queries),
+        "embeddings": f"HashingEmbeddings({embeddings.dimensions})",
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark (recall@k, MRR, latency, index size).")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[500, 900, 1400])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[0, 200])
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 8])
+    parser.add_argument("--retrievers", nargs="+", default=["vector", "hybrid"], choices=["vector", "hybrid"])
+    parser.add_argument("--output", default="rag_benchmark_results.json")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.fixture, args.chunk_sizes, args.overlaps, args.k, args.retrievers)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(report['results'])} results to {args.output}")
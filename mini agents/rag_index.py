@@ -0,0 +1,502 @@
+"""Incremental ingestion for the RAG agent.
+
+A small JSON manifest stored inside the vector store directory remembers, for
+every source file, the hash of its content and the ids of the chunks that were
+embedded from it. On startup:
+
+- files whose hash did not change are skipped entirely (no parsing, no embedding)
+- changed or new files are re-chunked, and only chunks whose id is not already
+  in the store are embedded
+- chunks that disappeared from a file, and all chunks of removed files, are
+  deleted from the store
+
+Chunk ids are content hashes, so re-adding a chunk after a crash simply
+overwrites the same entry instead of creating a duplicate.
+
+Files are processed as a stream (page -> chunks -> embedding batch -> upsert):
+pages are parsed in a background thread into a bounded queue, so memory stays
+proportional to the batch size rather than to the size of the document, and
+the first batch reaches the store long before the last page is parsed.
+
+Whole directories of PDFs can instead be parsed in a process pool, one document
+per worker, feeding a single writer (`sync_sources_parallel`). Run this module
+directly to benchmark documents/sec at different worker counts:
+
+    python rag_index.py RagFiles --workers 1 2 4 8
+"""
+
+import glob
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+MANIFEST_NAME = "ingest_manifest.json"
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file in fixed-size blocks so large PDFs are never read at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, page, text: str) -> str:
+    """Stable id for a chunk: the same text on the same page always maps to the same id."""
+    digest = hashlib.sha256()
+    digest.update(f"{source}\x00{page}\x00".encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """File hash -> chunk ids bookkeeping, persisted as JSON next to the vector store."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    @classmethod
+    def for_store(cls, persist_dir: str) -> "IngestionManifest":
+        return cls(os.path.join(persist_dir, MANIFEST_NAME))
+
+    @property
+    def version(self) -> str:
+        """A short hash that changes whenever any indexed file is added, changed or removed."""
+        digest = hashlib.sha256()
+        for source in sorted(self.files):
+            digest.update(f"{source}\x00{self.files[source]['sha256']}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves a half-written file."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+_version_cache = {}
+
+
+def store_version(persist_dir: str) -> str:
+    """Manifest version of the store in `persist_dir` ("" if nothing was ingested yet).
+
+    The manifest is only re-read when its file changes, so this is cheap enough
+    to call on every query, and it also notices re-indexing done by another process.
+    """
+    path = os.path.join(persist_dir, MANIFEST_NAME)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return ""
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _version_cache.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    version = IngestionManifest(path).version
+    _version_cache[path] = (stamp, version)
+    return version
+
+
+def source_key(path: str, root: str) -> str:
+    """Manifest key for a file: its path relative to `root`, with forward slashes."""
+    return os.path.relpath(os.path.abspath(path), os.path.abspath(root)).replace(os.sep, "/")
+
+
+class IngestProgress:
+    """Counts pages and chunks and prints throughput every few seconds."""
+
+    def __init__(self, every_seconds: float = 2.0, printer=print):
+        self.every_seconds = every_seconds
+        self.printer = printer
+        self.pages = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def add_pages(self, count: int = 1):
+        self.pages += count
+        self.report()
+
+    def add_chunks(self, count: int):
+        self.chunks += count
+        self.report()
+
+    def summary(self) -> dict:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "seconds": elapsed,
+            "pages_per_sec": self.pages / elapsed,
+            "chunks_per_sec": self.chunks / elapsed,
+        }
+
+    def report(self, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self._last_report < self.every_seconds:
+            return
+        self._last_report = now
+        s = self.summary()
+        self.printer(
+            f"  ingested {s['pages']} pages ({s['pages_per_sec']:.1f}/s), "
+            f"{s['chunks']} chunks ({s['chunks_per_sec']:.1f}/s)"
+        )
+
+
+def iter_pdf_chunks(path: str, splitter, progress: IngestProgress = None):
+    """Yield chunks of a PDF one page at a time instead of loading the whole file."""
+    from langchain_community.document_loaders import PyPDFLoader
+
+    for page in PyPDFLoader(path).lazy_load():
+        if progress:
+            progress.add_pages()
+        yield from splitter.split_documents([page])
+
+
+_DONE = object()
+
+
+def prefetch(iterable, max_items: int):
+    """Consume `iterable` in a background thread, buffering at most `max_items` items.
+
+    The producer blocks once the buffer is full (backpressure), so a slow
+    consumer such as the embedding API keeps memory bounded while parsing of
+    the next pages overlaps with it.
+    """
+    buffer = queue.Queue(maxsize=max_items)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        """Wait for room in the buffer; False once the consumer has stopped."""
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def find_pdfs(source: str) -> list[str]:
+    """PDF files under a directory (recursively), or matching a glob pattern."""
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "**", "*.pdf")
+    else:
+        pattern = source
+    return sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+
+
+_worker_splitters = {}
+
+
+def load_pdf_chunks(path: str, chunk_size: int, chunk_overlap: int):
+    """Parse and chunk one PDF inside a worker process; returns (page count, chunks)."""
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = _worker_splitters.get((chunk_size, chunk_overlap))
+    if splitter is None:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+        )
+        _worker_splitters[(chunk_size, chunk_overlap)] = splitter
+
+    pages = 0
+    chunks = []
+    for page in PyPDFLoader(path).lazy_load():
+        pages += 1
+        chunks.extend(splitter.split_documents([page]))
+    return pages, chunks
+
+
+def _new_stats() -> dict:
+    return {
+        "files_unchanged": 0,
+        "files_updated": 0,
+        "files_removed": 0,
+        "chunks_added": 0,
+        "chunks_reused": 0,
+        "chunks_deleted": 0,
+    }
+
+
+def _plan(paths, manifest: IngestionManifest, root: str, stats: dict):
+    """Split `paths` into files that need (re)ingestion and the set of all source keys."""
+    todo = []
+    seen_sources = set()
+    for path in paths:
+        key = source_key(path, root)
+        seen_sources.add(key)
+        sha = file_sha256(path)
+        entry = manifest.files.get(key)
+        if entry and entry["sha256"] == sha:
+            stats["files_unchanged"] += 1
+            stats["chunks_reused"] += len(entry["chunk_ids"])
+        else:
+            todo.append((path, key, sha))
+    return todo, seen_sources
+
+
+def _remove_missing(vectorstore, manifest: IngestionManifest, seen_sources: set, stats: dict, lexical_index=None):
+    for key in [k for k in manifest.files if k not in seen_sources]:
+        stale_ids = manifest.files.pop(key)["chunk_ids"]
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
+            if lexical_index is not None:
+                lexical_index.delete(stale_ids)
+            stats["chunks_deleted"] += len(stale_ids)
+        manifest.save()
+        stats["files_removed"] += 1
+
+
+def lexical_index_in_sync(manifest: IngestionManifest, lexical_index) -> bool:
+    """True when `lexical_index` holds exactly the chunks the manifest says are stored."""
+    # Ids, not counts: a replaced chunk plus a removed one leave the count unchanged.
+    expected = {chunk_id for entry in manifest.files.values() for chunk_id in entry["chunk_ids"]}
+    return lexical_index.ids() == expected
+
+
+class ChunkWriter:
+    """The single writer of the vector store.
+
+    Chunks from one or many files are buffered and upserted `batch_size` at a
+    time. A file's manifest entry is only committed after all of its chunks
+    have been flushed, so an interrupted run is simply redone next time.
+    An optional `lexical_index` (see bm25_index.py) receives the same adds and
+    deletes; it is saved once at the end of a sync, and `lexical_index_in_sync`
+    detects an index that missed updates because a run was interrupted.
+    """
+
+    def __init__(self, vectorstore, manifest: IngestionManifest, stats: dict, batch_size: int = 64, lexical_index=None):
+        self.vectorstore = vectorstore
+        self.lexical_index = lexical_index
+        self.manifest = manifest
+        self.stats = stats
+        self.batch_size = batch_size
+        self._ids = []
+        self._docs = []
+        self._pending = []
+
+    def write_file(self, key: str, sha: str, chunks, progress: IngestProgress = None):
+        entry = self.manifest.files.get(key)
+        old_ids = set(entry["chunk_ids"]) if entry else set()
+        kept = set()
+
+        for doc in chunks:
+            if progress:
+                progress.add_chunks(1)
+            doc.metadata["source"] = key
+            cid = chunk_id(key, doc.metadata.get("page"), doc.page_content)
+            if cid in kept:
+                continue  # identical chunk twice on the same page
+            kept.add(cid)
+            if cid in old_ids:
+                self.stats["chunks_reused"] += 1
+                continue
+            self._ids.append(cid)
+            self._docs.append(doc)
+            if len(self._docs) >= self.batch_size:
+                self.flush()
+
+        stale_ids = old_ids - kept
+        if stale_ids:
+            self.vectorstore.delete(ids=list(stale_ids))
+            if self.lexical_index is not None:
+                self.lexical_index.delete(list(stale_ids))
+            self.stats["chunks_deleted"] += len(stale_ids)
+
+        self._pending.append((key, {"sha256": sha, "chunk_ids": sorted(kept)}))
+        self.stats["files_updated"] += 1
+        if not self._docs:
+            self.flush()
+
+    def flush(self):
+        if self._docs:
+            self.vectorstore.add_documents(self._docs, ids=self._ids)
+            if self.lexical_index is not None:
+                self.lexical_index.add_documents(self._docs, ids=self._ids)
+            self.stats["chunks_added"] += len(self._docs)
+            self._ids = []
+            self._docs = []
+        if self._pending:
+            for key, entry in self._pending:
+                self.manifest.files[key] = entry
+            self.manifest.save()
+            self._pending = []
+
+
+def sync_sources(
+    vectorstore,
+    paths,
+    manifest: IngestionManifest,
+    load_chunks,
+    root: str,
+    batch_size: int = 64,
+    prefetch_batches: int = 2,
+    progress: IngestProgress = None,
+    lexical_index=None,
+) -> dict:
+    """Bring `vectorstore` in line with the files in `paths`.
+
+    `load_chunks(path)` must return an iterable of LangChain `Document` chunks
+    for one file; a generator keeps memory bounded. It is only called for files
+    that are new or have changed. New chunks are upserted `batch_size` at a
+    time while parsing continues at most `prefetch_batches` batches ahead.
+    `lexical_index` (optional) is kept in sync with the vector store.
+    Returns counters describing what was done.
+    """
+    stats = _new_stats()
+    todo, seen_sources = _plan(paths, manifest, root, stats)
+    writer = ChunkWriter(vectorstore, manifest, stats, batch_size, lexical_index)
+
+    for path, key, sha in todo:
+        chunks = prefetch(load_chunks(path), max_items=batch_size * prefetch_batches)
+        writer.write_file(key, sha, chunks, progress)
+    writer.flush()
+
+    _remove_missing(vectorstore, manifest, seen_sources, stats, lexical_index)
+    if lexical_index is not None:
+        lexical_index.save()
+    return stats
+
+
+def sync_sources_parallel(
+    vectorstore,
+    paths,
+    manifest: IngestionManifest,
+    root: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    workers: int = None,
+    batch_size: int = 64,
+    progress: IngestProgress = None,
+    lexical_index=None,
+) -> dict:
+    """Like `sync_sources`, but parses and chunks many PDFs in a process pool.
+
+    Each worker handles one whole document; the chunks are funneled back to a
+    single `ChunkWriter` in this process, which batches the upserts. At most
+    two documents per worker are in flight so memory stays bounded.
+    Scripts that call this must guard their entry point with
+    `if __name__ == "__main__":` because worker processes re-import them.
+    """
+    stats = _new_stats()
+    todo, seen_sources = _plan(paths, manifest, root, stats)
+    writer = ChunkWriter(vectorstore, manifest, stats, batch_size, lexical_index)
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        remaining = iter(todo)
+        in_flight = {}
+
+        def submit_next():
+            for path, key, sha in remaining:
+                future = pool.submit(load_pdf_chunks, path, chunk_size, chunk_overlap)
+                in_flight[future] = (key, sha)
+                return
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, sha = in_flight.pop(future)
+                pages, chunks = future.result()
+                if progress:
+                    progress.add_pages(pages)
+                writer.write_file(key, sha, chunks, progress)
+                submit_next()
+    writer.flush()
+
+    _remove_missing(vectorstore, manifest, seen_sources, stats, lexical_index)
+    if lexical_index is not None:
+        lexical_index.save()
+    return stats
+
+
+class _DiscardStore:
+    """Vector store stand-in for benchmarks: accepts writes and forgets them."""
+
+    def add_documents(self, documents, ids=None):
+        return ids
+
+    def delete(self, ids=None):
+        return True
+
+
+def benchmark_workers(source: str, worker_counts, chunk_size: int = 900, chunk_overlap: int = 200) -> list[dict]:
+    """Measure parse + chunk throughput (documents/sec) of `source` at several worker counts.
+
+    Embedding is left out on purpose: it is network bound and cached, while
+    parsing is the CPU-bound part that the process pool speeds up.
+    """
+    import tempfile
+
+    paths = find_pdfs(source)
+    root = source if os.path.isdir(source) else os.path.dirname(source) or "."
+    results = []
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = IngestionManifest(os.path.join(tmp, MANIFEST_NAME))
+            progress = IngestProgress(every_seconds=float("inf"))
+            start = time.perf_counter()
+            sync_sources_parallel(
+                _DiscardStore(), paths, manifest, root, chunk_size, chunk_overlap,
+                workers=workers, progress=progress,
+            )
+            elapsed = time.perf_counter() - start
+        results.append({
+            "workers": workers,
+            "documents": len(paths),
+            "pages": progress.pages,
+            "chunks": progress.chunks,
+            "seconds": round(elapsed, 3),
+            "documents_per_sec": round(len(paths) / elapsed, 2) if elapsed else 0.0,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark parallel PDF ingestion (parse + chunk).")
+    parser.add_argument("source", help="Directory of PDFs or a glob pattern, e.g. 'RagFiles/*.pdf'")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    for row in benchmark_workers(args.source, sorted(set(args.workers))):
+        print(json.dumps(row))
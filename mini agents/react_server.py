@@ -0,0 +1,366 @@
+"""Async multi-session serving mode for the ReAct agent in `10_ReActAgents.py`.
+
+`ReActServer` hosts one compiled graph for many conversations at once:
+
+- bounded concurrency: at most `max_concurrency` graph runs at a time
+- backpressure: at most `max_pending` turns admitted (running or waiting);
+  beyond that `ask`/`stream` fail fast with `ServerBusy` instead of queueing
+  without limit, and streamed events are only produced as fast as they are read
+- per-session cancellation: `cancel(session_id)` stops that session's turns,
+  and a per-turn timeout stops runaway tool loops
+- bounded memory: conversation histories are kept for the `max_sessions` most
+  recently active sessions; an older session starts over on its next message
+
+Serve it as JSON lines over TCP (one request per line, `{"session", "message"}`,
+optional `"stream": true`, or `{"cancel": session}`):
+
+    python react_server.py serve --port 8765
+
+or load-test it against a local fake chat model (no API key needed):
+
+    python react_server.py loadtest --sessions 10 100 1000
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import statistics
+import time
+import uuid
+from collections import OrderedDict
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+react_agents = importlib.import_module("10_ReActAgents")
+
+
+class ServerBusy(Exception):
+    """Too many turns admitted; the client should retry later."""
+
+
+class ReActServer:
+    """Runs ReAct turns for many sessions concurrently on one event loop."""
+
+    def __init__(
+        self,
+        app,
+        max_concurrency: int = 64,
+        max_pending: int = 1024,
+        turn_timeout: float = 120.0,
+        max_sessions: int = 10_000,
+    ):
+        self.app = app
+        self.max_pending = max_pending
+        self.turn_timeout = turn_timeout
+        self.max_sessions = max_sessions
+        self._running = asyncio.Semaphore(max_concurrency)
+        self._pending = 0
+        self._history = OrderedDict()  # session id -> messages so far, least recently active first
+        self._locks = {}  # session id -> lock; turns of one session run in order
+        self._tasks = {}  # session id -> set of running turn tasks
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def _admit(self):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise ServerBusy(f"{self._pending} turns pending")
+        self._pending += 1
+
+    def _remember(self, session_id: str, messages: list):
+        self._history[session_id] = messages
+        self._history.move_to_end(session_id)
+        while len(self._history) > self.max_sessions:
+            evicted, _ = self._history.popitem(last=False)
+            if evicted not in self._tasks:
+                self._locks.pop(evicted, None)
+            self.evicted += 1
+
+    def _finished(self, session_id: str, tasks: set, task):
+        tasks.discard(task)
+        if not tasks:
+            self._tasks.pop(session_id, None)
+            if session_id not in self._history:  # e.g. its only turn failed, or it was evicted
+                self._locks.pop(session_id, None)
+
+    async def _turn(self, session_id: str, message: str):
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock, self._running:
+            messages = self._history.get(session_id, []) + [HumanMessage(message)]
+            result = await asyncio.wait_for(
+                self.app.ainvoke({"messages": messages}), self.turn_timeout
+            )
+            self._remember(session_id, list(result["messages"]))
+            return result["messages"][-1].content
+
+    async def ask(self, session_id: str, message: str) -> str:
+        """Run one turn and return the final answer. Raises ServerBusy when overloaded."""
+        self._admit()
+        task = asyncio.create_task(self._turn(session_id, message))
+        tasks = self._tasks.setdefault(session_id, set())
+        tasks.add(task)
+        try:
+            answer = await task
+            self.completed += 1
+            return answer
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+            self._finished(session_id, tasks, task)
+
+    async def stream(self, session_id: str, message: str):
+        """Yield `(node, update)` pairs for one turn as the graph produces them.
+
+        The graph only advances when the consumer asks for the next update, so a
+        slow client holds back its own run rather than buffering its output.
+        """
+        self._admit()
+        task = asyncio.current_task()
+        tasks = self._tasks.setdefault(session_id, set())
+        tasks.add(task)
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        try:
+            async with lock, self._running:
+                messages = self._history.get(session_id, []) + [HumanMessage(message)]
+                async with asyncio.timeout(self.turn_timeout):
+                    async for update in self.app.astream({"messages": messages}, stream_mode="updates"):
+                        for node, values in update.items():
+                            messages.extend((values or {}).get("messages", []))
+                            yield node, values
+                self._remember(session_id, messages)
+                self.completed += 1
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except GeneratorExit:
+            self.cancelled += 1  # the consumer stopped reading
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+            self._finished(session_id, tasks, task)
+
+    def cancel(self, session_id: str) -> int:
+        """Cancel every running or waiting turn of `session_id`; returns how many."""
+        tasks = list(self._tasks.get(session_id, ()))
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    def close_session(self, session_id: str):
+        self.cancel(session_id)
+        self._history.pop(session_id, None)
+        self._locks.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._history),
+            "pending": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "evicted_sessions": self.evicted,
+        }
+
+
+async def handle_connection(server: ReActServer, reader, writer):
+    """JSON-lines protocol: each request line gets one or more response lines tagged with its session."""
+    write_lock = asyncio.Lock()
+    inflight = set()
+
+    async def send(payload: dict):
+        async with write_lock:
+            writer.write((json.dumps(payload) + "\n").encode("utf-8"))
+            await writer.drain()  # waits while the client is not reading
+
+    async def handle(request: dict):
+        session_id = str(request.get("session", "default"))
+        try:
+            if request.get("stream"):
+                async for node, values in server.stream(session_id, request["message"]):
+                    for message in (values or {}).get("messages", []):
+                        await send({"session": session_id, "node": node, "content": message.content})
+                await send({"session": session_id, "done": True})
+            else:
+                answer = await server.ask(session_id, request["message"])
+                await send({"session": session_id, "answer": answer})
+        except asyncio.CancelledError:
+            if not writer.is_closing():
+                await send({"session": session_id, "cancelled": True})
+        except ServerBusy as e:
+            await send({"session": session_id, "error": "busy", "detail": str(e)})
+        except Exception as e:
+            await send({"session": session_id, "error": type(e).__name__, "detail": str(e)})
+
+    try:
+        while line := await reader.readline():
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                await send({"error": "invalid JSON"})
+                continue
+            if "cancel" in request:
+                server.cancel(str(request["cancel"]))
+                continue
+            task = asyncio.create_task(handle(request))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+    finally:
+        # Client went away: stop the work it was waiting for.
+        for task in list(inflight):
+            task.cancel()
+        writer.close()
+
+
+async def serve(host: str, port: int, **server_options):
+    server = ReActServer(react_agents.build_app(), **server_options)
+    tcp = await asyncio.start_server(lambda r, w: handle_connection(server, r, w), host, port)
+    print(f"ReAct agent serving JSON lines on {host}:{port}")
+    async with tcp:
+        await tcp.serve_forever()
+
+
+class FakeChatModel(BaseChatModel):
+    """Offline stand-in for the chat model: one tool call, then a final answer.
+
+    Sleeps `latency` seconds per call to imitate the API round trip, so load tests
+    exercise the real graph, tool node and event loop without network access.
+    """
+
+    latency: float = 0.05
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-react"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _reply(self, messages) -> ChatResult:
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            message = AIMessage(content=f"The result is {last.content}")
+        else:
+            message = AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": "eval_expression",
+                    "args": {"expression": "(12 + 3) * 3"},
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                }],
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+
+async def _monitor_loop_lag(samples: list, interval: float = 0.01):
+    """Record how late the event loop wakes up from `sleep(interval)`."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+def _quantile(values: list, q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def load_test(
+    sessions: int, turns: int, latency: float, max_concurrency: int, max_pending: int, max_sessions: int = 10_000
+) -> dict:
+    """`sessions` concurrent clients, each sending `turns` messages one after another."""
+    server = ReActServer(
+        react_agents.build_app(FakeChatModel(latency=latency)),
+        max_concurrency=max_concurrency,
+        max_pending=max_pending,
+        max_sessions=max_sessions,
+    )
+    latencies = []
+    lag = []
+    monitor = asyncio.create_task(_monitor_loop_lag(lag))
+
+    async def client(n: int):
+        for _ in range(turns):
+            start = time.perf_counter()
+            try:
+                await server.ask(f"session-{n}", "Add 12 + 3 and multiply the result by 3.")
+            except ServerBusy:
+                await asyncio.sleep(latency)  # back off; counted in server.rejected
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(sessions)))
+    elapsed = time.perf_counter() - start
+    monitor.cancel()
+
+    return {
+        "sessions": sessions,
+        "turns": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_quantile(latencies, 50) * 1000, 1),
+        "p99_ms": round(_quantile(latencies, 99) * 1000, 1),
+        "loop_lag_p99_ms": round(_quantile(lag, 99) * 1000, 2),
+        "loop_lag_max_ms": round(max(lag, default=0.0) * 1000, 2),
+        "rejected": server.rejected,
+        "failed": server.failed,
+        "resident_sessions": server.stats()["sessions"],
+        "evicted_sessions": server.evicted,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve or load-test the ReAct agent.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="JSON lines over TCP with the real model")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--max-concurrency", type=int, default=64)
+    serve_parser.add_argument("--max-pending", type=int, default=1024)
+    serve_parser.add_argument("--max-sessions", type=int, default=10_000, help="conversation histories kept")
+
+    load_parser = commands.add_parser("loadtest", help="drive the graph with a local fake chat model")
+    load_parser.add_argument("--sessions", type=int, nargs="+", default=[10, 100, 1000])
+    load_parser.add_argument("--turns", type=int, default=3, help="messages per session")
+    load_parser.add_argument("--latency", type=float, default=0.05, help="fake model seconds per call")
+    load_parser.add_argument("--max-concurrency", type=int, default=256)
+    load_parser.add_argument("--max-pending", type=int, default=4096)
+    load_parser.add_argument("--max-sessions", type=int, default=10_000, help="conversation histories kept")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        asyncio.run(serve(
+            args.host, args.port,
+            max_concurrency=args.max_concurrency, max_pending=args.max_pending, max_sessions=args.max_sessions,
+        ))
+    else:
+        for sessions in args.sessions:
+            result = asyncio.run(load_test(
+                sessions, args.turns, args.latency, args.max_concurrency, args.max_pending, args.max_sessions
+            ))
+            print(json.dumps(result))
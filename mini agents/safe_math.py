@@ -0,0 +1,289 @@
+"""Safe arithmetic evaluation for the ReAct agent's calculator tools.
+
+`eval()` on model output can run arbitrary Python and re-parses the full
+grammar on every call. Here the numbers in an expression are lifted out, and
+what is left (its shape, e.g. `_c0 * (_c1 + _c2)`) is parsed once, checked
+against a whitelist of AST nodes (numbers, arithmetic operators, a few math
+functions and named values) and compiled. Compiled shapes are memoized in an
+LRU cache, so expressions that differ only in their numbers skip parsing.
+
+`evaluate_many` takes a list of expressions in one call. Items may assign
+results to names (`"a = 12 + 3"`) that later items use (`"a * 3"`), so a
+multi-step calculation needs one tool round trip. Independent expressions with
+the same shape (e.g. `"3 * 4.5"` and `"7 * 1.25"`) are evaluated together as
+NumPy arrays when NumPy is installed.
+"""
+
+import ast
+import math
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # batch evaluation falls back to one expression at a time
+    np = None
+
+
+MAX_EXPRESSION_LENGTH = 1000
+MAX_POWER_BITS = 100_000  # caps results like 9 ** 9 ** 9 before they are computed
+MIN_VECTOR_GROUP = 4  # smaller groups are cheaper to evaluate one by one
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+
+def _checked_pow(base, exponent):
+    if isinstance(base, int) and isinstance(exponent, int) and abs(base) > 1:
+        if abs(exponent) * math.log2(abs(base)) > MAX_POWER_BITS:
+            raise ValueError("exponent too large")
+    return base ** exponent
+
+
+SCALAR_FUNCTIONS = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "pow": _checked_pow,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "log2": math.log2,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "_pow": _checked_pow,
+}
+
+if np is not None:
+    VECTOR_FUNCTIONS = {
+        "abs": np.abs,
+        "round": np.round,
+        "min": lambda *args: np.minimum.reduce(np.broadcast_arrays(*args)),
+        "max": lambda *args: np.maximum.reduce(np.broadcast_arrays(*args)),
+        "pow": np.power,
+        "sqrt": np.sqrt,
+        "exp": np.exp,
+        "log": np.log,
+        "log10": np.log10,
+        "log2": np.log2,
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "floor": np.floor,
+        "ceil": np.ceil,
+        "_pow": np.power,
+    }
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub,
+)
+# Nodes that keep integers integral, so a float64 batch result can be turned back into an int.
+_INTEGER_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod, ast.UAdd, ast.USub,
+)
+# Functions that may return ints for int arguments (NumPy would return floats).
+_INT_RETURNING = {"abs", "round", "min", "max", "pow", "floor", "ceil"}
+
+
+_NUMBER = re.compile(r"(?<![\w.])(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?(?![\w.])")
+_PRIVATE_NAME = re.compile(r"(?<![\w.])_")
+
+
+class _PowToCall(ast.NodeTransformer):
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.Call(func=ast.Name("_pow", ast.Load()), args=[node.left, node.right], keywords=[])
+        return node
+
+
+class CompiledExpression(NamedTuple):
+    code: object  # code object reading its literals from _c0, _c1, ...
+    names: frozenset  # named values it reads (constants or variables)
+    integer_safe: bool  # only operators that keep integers integral, and no named (float) values
+    float_safe: bool  # no ** or int-returning functions, so a float64 result matches Python
+
+
+def _lift_numbers(expression: str):
+    """'3 * 4.5' -> ('_c0 * _c1', (3, 4.5)); expressions of the same shape share a template."""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError("expression too long")
+    if _PRIVATE_NAME.search(expression):
+        raise ValueError("names may not start with an underscore")
+    constants = []
+
+    def lift(match):
+        text = match.group()
+        constants.append(float(text) if any(c in text for c in ".eE") else int(text))
+        return f"_c{len(constants) - 1}"
+
+    return _NUMBER.sub(lift, expression.strip()), tuple(constants)
+
+
+@lru_cache(maxsize=1024)
+def compile_template(template: str) -> CompiledExpression:
+    """Parse, validate and compile a template once. Raises ValueError if it is not plain arithmetic."""
+    try:
+        tree = ast.parse(template, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"invalid expression: {e.msg}") from None
+
+    called = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"unsupported syntax: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and (
+            isinstance(node.value, bool) or not isinstance(node.value, (int, float))
+        ):
+            raise ValueError(f"unsupported constant: {node.value!r}")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in SCALAR_FUNCTIONS or node.keywords:
+                raise ValueError(f"unsupported function call: {ast.unparse(node.func)}")
+            called.add(id(node.func))
+    names = frozenset(
+        node.id for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and id(node) not in called and not node.id.startswith("_c")
+    )
+    # Named constants are floats, so `1 * pi` must not be turned back into an int.
+    integer_safe = not names and all(isinstance(node, _INTEGER_NODES) for node in ast.walk(tree))
+    float_safe = not any(
+        isinstance(node, ast.Pow) or (isinstance(node, ast.Call) and node.func.id in _INT_RETURNING)
+        for node in ast.walk(tree)
+    )
+    tree = ast.fix_missing_locations(_PowToCall().visit(tree))
+    return CompiledExpression(compile(tree, "<expression>", "eval"), names, integer_safe, float_safe)
+
+
+def compile_expression(expression: str):
+    """(compiled template, literal values) for `expression`; the template is memoized."""
+    template, constants = _lift_numbers(expression)
+    return compile_template(template), constants
+
+
+def _scope(constants, variables: dict = None) -> dict:
+    scope = dict(CONSTANTS)
+    scope.update(variables or {})
+    scope.update((f"_c{i}", value) for i, value in enumerate(constants))
+    return scope
+
+
+def evaluate(expression: str, variables: dict = None):
+    compiled, constants = compile_expression(expression)
+    unknown = compiled.names - CONSTANTS.keys() - (variables or {}).keys()
+    if unknown:
+        raise ValueError(f"unknown name: {sorted(unknown)[0]}")
+    return eval(compiled.code, {"__builtins__": {}, **SCALAR_FUNCTIONS}, _scope(constants, variables))
+
+
+def _split_assignment(item: str):
+    """'name = expr' -> (name, expr); anything else -> (None, item)."""
+    target, sep, expression = item.partition("=")
+    target = target.strip()
+    if sep and target.isidentifier() and not expression.startswith("="):
+        if target in SCALAR_FUNCTIONS or target in CONSTANTS or target.startswith("_"):
+            raise ValueError(f"cannot assign to reserved name: {target}")
+        return target, expression.strip()
+    return None, item.strip()
+
+
+def _evaluate_group(compiled: CompiledExpression, rows: list, integral: bool):
+    """Evaluate one template for many rows of literals at once; None means 'do it one by one'."""
+    columns = np.array(rows, dtype=np.float64)
+    if integral and not np.all(np.prod(np.abs(columns) + 1, axis=1) < 2 ** 53):
+        return None  # intermediate products could leave the range of exact float64 integers
+    scope = dict(CONSTANTS)
+    scope.update((f"_c{i}", columns[:, i]) for i in range(columns.shape[1]))
+    try:
+        with np.errstate(all="raise"):
+            values = eval(compiled.code, {"__builtins__": {}, **VECTOR_FUNCTIONS}, scope)
+    except (FloatingPointError, ValueError, TypeError, ZeroDivisionError):
+        return None  # e.g. a division by zero in one row; the scalar path reports it per item
+    values = np.broadcast_to(values, (len(rows),))
+    if integral:
+        if not np.all(np.abs(values) < 2 ** 53):
+            return None  # beyond exact float64 integers; Python ints stay exact
+        return [int(v) for v in values]
+    return [float(v) for v in values]
+
+
+def evaluate_many(expressions: list[str]) -> list:
+    """Evaluate a list of expressions/assignments in order; each result is a number or an Exception."""
+    parsed = []
+    for item in expressions:
+        try:
+            name, expression = _split_assignment(item)
+            compiled, constants = compile_expression(expression)
+            parsed.append((name, expression, compiled, constants, None))
+        except ValueError as e:
+            parsed.append((None, item, None, None, e))
+
+    # Independent expressions of the same shape are computed together up front.
+    precomputed = {}
+    if np is not None:
+        groups = {}
+        for index, (_, _, compiled, constants, error) in enumerate(parsed):
+            if error is None and not (compiled.names - CONSTANTS.keys()):
+                integral = compiled.integer_safe and all(type(c) is int for c in constants)
+                if not (integral or compiled.float_safe):
+                    continue
+                groups.setdefault((compiled, integral), []).append((index, constants))
+        for (compiled, integral), members in groups.items():
+            if len(members) < MIN_VECTOR_GROUP:
+                continue
+            values = _evaluate_group(compiled, [constants for _, constants in members], integral)
+            if values is not None:
+                precomputed.update((index, value) for (index, _), value in zip(members, values))
+
+    variables = {}
+    results = []
+    for index, (name, expression, _, _, error) in enumerate(parsed):
+        if error is not None:
+            results.append(error)
+            continue
+        try:
+            value = precomputed[index] if index in precomputed else evaluate(expression, variables)
+        except Exception as e:
+            results.append(e)
+            continue
+        if name:
+            variables[name] = value
+        results.append(value)
+    return results
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    random.seed(0)
+    items = [f"({random.randint(1, 99)} + {random.randint(1, 99)}) * {random.random():.4f}" for _ in range(10_000)]
+
+    start = time.perf_counter()
+    reference = [eval(item) for item in items]
+    print(f"eval():           {time.perf_counter() - start:.3f}s")
+
+    start = time.perf_counter()
+    scalar = [evaluate(item) for item in items]
+    print(f"evaluate():       {time.perf_counter() - start:.3f}s")
+
+    start = time.perf_counter()
+    batch = evaluate_many(items)
+    print(f"evaluate_many():  {time.perf_counter() - start:.3f}s (numpy: {np is not None})")
+
+    assert all(math.isclose(a, b) for a, b in zip(reference, scalar))
+    assert all(math.isclose(a, b) for a, b in zip(reference, batch))
+
+    # Batched groups must give the same values and types as evaluating one by one.
+    mixed = [f"{n} * pi" for n in range(1, 9)] + [f"{n} * {n + 1} // 3" for n in range(8)] + [
+        f"{n} * 2.5 - e" for n in range(8)
+    ]
+    for batched, one in zip(evaluate_many(mixed), (evaluate(item) for item in mixed)):
+        assert type(batched) is type(one) and math.isclose(batched, one), (batched, one)
+    print(evaluate_many(["a = 12 + 3", "b = a * 3", "b / 2", "2 ** 0.5", "1 / 0", "__import__('os')"]))
@@ -0,0 +1,300 @@
+"""Memory-bounded session cache for hosting the chatbots for many users.
+
+A LangChain message object carries a pydantic model, several dicts and
+metadata fields, so keeping every user's full history as message objects
+makes resident memory grow with users times history length. `SessionCache`
+keeps conversations as compact records instead:
+
+- `MessageRecord` uses `__slots__`, an interned role string and the content as
+  UTF-8 bytes; messages are rebuilt only when a session is read
+- hot sessions stay in an LRU capped by their total size in bytes
+- cold sessions are spilled to a local SQLite file (only the messages not
+  already there) and rehydrated on their next request
+- `memory_report()` gives resident bytes per session and in total, for
+  capacity planning
+
+    cache = SessionCache("sessions.sqlite", max_bytes=64 * 2**20)
+    history = cache.messages(user_id) + [HumanMessage(text)]
+    cache.append(user_id, HumanMessage(text), reply)
+
+Run `python session_cache.py` to compare memory with plain message lists.
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+
+MESSAGE_TYPES = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+
+
+class MessageRecord:
+    """One message as a role, UTF-8 content and optional id."""
+
+    __slots__ = ("role", "content", "id")
+
+    def __init__(self, role: str, content: bytes, id: str = None):
+        self.role = sys.intern(role)  # one shared string per role
+        self.content = content
+        self.id = id
+
+    @classmethod
+    def from_message(cls, message) -> "MessageRecord":
+        if message.type not in MESSAGE_TYPES:
+            raise ValueError(f"unsupported message type: {message.type}")
+        if not isinstance(message.content, str):
+            raise ValueError("only text content can be stored")
+        return cls(message.type, message.content.encode("utf-8"), message.id)
+
+    def to_message(self):
+        return MESSAGE_TYPES[self.role](content=self.content.decode("utf-8"), id=self.id)
+
+    @property
+    def nbytes(self) -> int:
+        size = sys.getsizeof(self) + sys.getsizeof(self.content)
+        return size + (sys.getsizeof(self.id) if self.id is not None else 0)
+
+
+class _Session:
+    __slots__ = ("records", "state", "nbytes", "spilled", "rewritten", "dirty")
+
+    def __init__(self, records=None, state=None):
+        self.records = records or []
+        self.state = state or {}  # small JSON values, e.g. a rolling summary
+        self.spilled = len(self.records)  # records[:spilled] are already in SQLite
+        self.rewritten = False  # SQLite rows must be replaced rather than appended to
+        self.dirty = False  # changed since it was last written to SQLite
+        self.nbytes = 0
+        self.measure()
+
+    def measure(self):
+        self.nbytes = (
+            sys.getsizeof(self.records)
+            + sum(r.nbytes for r in self.records)
+            + len(json.dumps(self.state))
+        )
+
+    def extend(self, records: list):
+        """Append records, adding only their size (and the list's growth) to `nbytes`."""
+        before = sys.getsizeof(self.records)
+        self.records.extend(records)
+        self.nbytes += sys.getsizeof(self.records) - before + sum(r.nbytes for r in records)
+
+
+class SessionCache:
+    """Per-user conversations in a byte-capped LRU, spilling cold sessions to SQLite."""
+
+    def __init__(self, path: str = "sessions.sqlite", max_bytes: int = 64 * 2**20):
+        self.max_bytes = max_bytes
+        self._hot = OrderedDict()  # session id -> _Session, least recently used first
+        self._resident = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.rehydrated = 0
+        self.spills = 0
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS messages (
+                session TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content BLOB NOT NULL,
+                id TEXT,
+                PRIMARY KEY (session, seq)
+            ) WITHOUT ROWID"""
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (session TEXT PRIMARY KEY, state TEXT NOT NULL)")
+        self._conn.commit()
+
+    # ---- residency -------------------------------------------------------
+
+    def _session(self, session_id: str) -> _Session:
+        session = self._hot.get(session_id)
+        if session is not None:
+            self.hits += 1
+            self._hot.move_to_end(session_id)
+            return session
+        rows = self._conn.execute(
+            "SELECT role, content, id FROM messages WHERE session = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        state = self._conn.execute("SELECT state FROM sessions WHERE session = ?", (session_id,)).fetchone()
+        if rows or state:
+            self.rehydrated += 1
+        session = _Session([MessageRecord(*row) for row in rows], json.loads(state[0]) if state else None)
+        self._hot[session_id] = session
+        self._resident += session.nbytes
+        self._evict(keep=session_id)
+        return session
+
+    def _resized(self, session_id: str, session: _Session, before: int):
+        """Account for `session` having grown or shrunk from `before` bytes."""
+        session.dirty = True
+        self._resident += session.nbytes - before
+        self._evict(keep=session_id)
+
+    def _evict(self, keep: str = None):
+        while self._resident > self.max_bytes and len(self._hot) > 1:
+            session_id, session = next(iter(self._hot.items()))
+            if session_id == keep:
+                self._hot.move_to_end(session_id)
+                continue
+            if session.dirty:
+                self._spill(session_id, session)
+            del self._hot[session_id]
+            self._resident -= session.nbytes
+
+    def _spill(self, session_id: str, session: _Session):
+        """Write the records SQLite does not have yet, and the session state."""
+        with self._conn:
+            if session.rewritten:
+                self._conn.execute("DELETE FROM messages WHERE session = ?", (session_id,))
+                session.spilled, session.rewritten = 0, False
+            self._conn.executemany(
+                "INSERT INTO messages (session, seq, role, content, id) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (session_id, seq, r.role, r.content, r.id)
+                    for seq, r in enumerate(session.records[session.spilled:], session.spilled)
+                ),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session, state) VALUES (?, ?)",
+                (session_id, json.dumps(session.state)),
+            )
+        session.spilled = len(session.records)
+        session.dirty = False
+        self.spills += 1
+
+    # ---- public API ------------------------------------------------------
+
+    def messages(self, session_id: str) -> list:
+        """The session's conversation as LangChain messages (empty for a new session)."""
+        with self._lock:
+            return [r.to_message() for r in self._session(session_id).records]
+
+    def append(self, session_id: str, *messages):
+        with self._lock:
+            session = self._session(session_id)
+            before = session.nbytes
+            session.extend([MessageRecord.from_message(m) for m in messages])
+            self._resized(session_id, session, before)
+
+    def replace(self, session_id: str, messages: list):
+        """Overwrite the session's history, e.g. after a graph run returned its full message list."""
+        with self._lock:
+            session = self._session(session_id)
+            records = [MessageRecord.from_message(m) for m in messages]
+            saved = session.records[:session.spilled]
+            if len(records) < len(saved) or any(
+                (a.role, a.content, a.id) != (b.role, b.content, b.id) for a, b in zip(records, saved)
+            ):
+                session.rewritten = True  # the saved prefix changed; appending is not enough
+            before = session.nbytes
+            session.records = records
+            session.measure()
+            self._resized(session_id, session, before)
+
+    def get_state(self, session_id: str) -> dict:
+        with self._lock:
+            return dict(self._session(session_id).state)
+
+    def set_state(self, session_id: str, **values):
+        with self._lock:
+            session = self._session(session_id)
+            before = session.nbytes
+            session.state.update(values)
+            session.measure()
+            self._resized(session_id, session, before)
+
+    def drop(self, session_id: str):
+        with self._lock:
+            session = self._hot.pop(session_id, None)
+            if session is not None:
+                self._resident -= session.nbytes
+            with self._conn:
+                self._conn.execute("DELETE FROM messages WHERE session = ?", (session_id,))
+                self._conn.execute("DELETE FROM sessions WHERE session = ?", (session_id,))
+
+    def flush(self):
+        """Write every resident session's unsaved messages to SQLite (they stay resident)."""
+        with self._lock:
+            for session_id, session in self._hot.items():
+                if session.dirty:
+                    self._spill(session_id, session)
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    def memory_report(self) -> dict:
+        with self._lock:
+            spilled = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            return {
+                "resident_sessions": len(self._hot),
+                "resident_bytes": self._resident,
+                "max_bytes": self.max_bytes,
+                "bytes_per_session": {session_id: s.nbytes for session_id, s in self._hot.items()},
+                "sessions_on_disk": spilled,
+                "hits": self.hits,
+                "rehydrated": self.rehydrated,
+                "spills": self.spills,
+            }
+
+
+if __name__ == "__main__":
+    import os
+    import random
+    import tempfile
+    import time
+    import tracemalloc
+
+    random.seed(0)
+    users, turns = 2000, 20
+    words = "the of and to in is you that it he was for on are as with his they at be this".split()
+
+    def text():
+        return " ".join(random.choice(words) for _ in range(random.randint(10, 60)))
+
+    conversations = [
+        [(HumanMessage if i % 2 == 0 else AIMessage)(content=text()) for i in range(2 * turns)]
+        for _ in range(users)
+    ]
+
+    tracemalloc.start()
+    plain = {user: [m.model_copy() for m in messages] for user, messages in enumerate(conversations)}
+    plain_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del plain
+    print(f"{users} sessions x {2 * turns} messages as message objects: {plain_bytes / 2**20:6.1f} MiB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for max_bytes in (2**40, 8 * 2**20):
+            cache = SessionCache(os.path.join(tmp, f"sessions-{max_bytes}.sqlite"), max_bytes=max_bytes)
+            tracemalloc.start()
+            for turn in range(turns):
+                for user, messages in enumerate(conversations):
+                    cache.append(str(user), *messages[2 * turn:2 * turn + 2])
+            resident = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            report = cache.memory_report()
+            label = "unbounded" if max_bytes == 2**40 else f"cap {max_bytes / 2**20:.0f} MiB"
+            print(
+                f"SessionCache, {label:<10}: {resident / 2**20:6.1f} MiB traced, "
+                f"{report['resident_bytes'] / 2**20:6.1f} MiB reported in {report['resident_sessions']} sessions, "
+                f"{report['spills']} spills"
+            )
+
+            rehydrated, start = cache.rehydrated, time.perf_counter()
+            for user in random.sample(range(users), 200):
+                assert [m.content for m in cache.messages(str(user))] == [m.content for m in conversations[user]]
+            assert cache.memory_report()["resident_bytes"] <= max_bytes, "reads must stay within the cap"
+            print(f"  200 random reads: {(time.perf_counter() - start) / 200 * 1000:.2f} ms each "
+                  f"({cache.rehydrated - rehydrated} rehydrated from disk)")
+            cache.close()
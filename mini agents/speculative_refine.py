@@ -0,0 +1,279 @@
+"""Speculative background refinements for the drafting agent.
+
+After a draft is shown, the model is idle while the user reads it, and the
+next piece of feedback is often one of a few predictable edits: shorter, more
+formal, fix the tone. `SpeculativeRefiner` uses that idle time:
+
+1. `speculate(draft)` starts up to `max_speculations` of the likely
+   refinements in the background, most frequently requested intent first
+2. `take(draft, feedback)` serves the matching one when the feedback asks for
+   exactly that edit (waiting for it if it is still being written), and cancels
+   the others; any other feedback cancels them all and returns None
+
+Speculations run as tasks on one background event loop, so cancelling one
+closes its model stream instead of leaving a thread generating tokens nobody
+will read. `stats()` reports hit rate, saved latency and wasted tokens, to
+tune `max_speculations` and the intent list:
+
+    refiner = SpeculativeRefiner(stream_rewrite)    # async (draft, feedback) -> text chunks
+    refiner.speculate(draft)                        # right after showing the draft
+    draft = refiner.take(draft, feedback) or refine(draft, feedback)
+
+Run `python speculative_refine.py` to simulate drafting sessions with a
+stand-in model and compare refinement latency with and without speculation.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from context_packing import count_tokens
+
+
+@dataclass
+class Intent:
+    name: str
+    feedback: str  # the instruction the speculation is generated from
+    words: frozenset  # feedback made of these (and filler words) asks for this edit
+
+
+INTENTS = [
+    Intent("shorter", "Make it shorter and more concise.", frozenset({
+        "shorter", "short", "shorten", "concise", "brief", "briefer", "trim", "tighter", "tighten",
+        "condense", "length", "cut", "down",
+    })),
+    Intent("formal", "Make it more formal and professional.", frozenset({
+        "formal", "formally", "professional", "professionally", "polished", "businesslike",
+    })),
+    Intent("tone", "Fix the tone: keep it polite, warm and confident.", frozenset({
+        "tone", "friendlier", "friendly", "warmer", "warm", "polite", "politer", "softer", "soften",
+        "nicer", "kinder", "gentler",
+    })),
+]
+
+# Words that do not change which edit is asked for. "less" and "not" are left
+# out on purpose: "less formal" is not the formal intent.
+_FILLER = frozenset({
+    "make", "it", "its", "it's", "the", "a", "an", "bit", "little", "lot", "much", "more", "way",
+    "please", "pls", "can", "could", "would", "you", "i", "want", "like", "need", "to", "be",
+    "and", "too", "so", "very", "just", "now", "again", "slightly", "somewhat", "overall", "fix",
+    "sound", "sounds", "this", "that", "draft", "email", "message", "text", "letter", "version",
+})
+
+
+def match_intent(feedback: str, intents=INTENTS):
+    """Name of the intent `feedback` asks for, or None if it asks for anything else as well."""
+    words = re.findall(r"[a-z']+", feedback.lower())
+    matched = [
+        intent.name for intent in intents
+        if intent.words & set(words) and all(w in intent.words or w in _FILLER for w in words)
+    ]
+    return matched[0] if len(matched) == 1 else None
+
+
+class _Speculation:
+    __slots__ = ("intent", "future", "started", "duration", "input_tokens", "output_tokens")
+
+    def __init__(self, intent: Intent, input_tokens: int):
+        self.intent = intent
+        self.future = None
+        self.started = time.perf_counter()
+        self.duration = None  # set when the text is complete
+        self.input_tokens = input_tokens
+        self.output_tokens = 0
+
+
+class SpeculativeRefiner:
+    """Pre-generate likely refinements of a draft while its user reads it."""
+
+    def __init__(
+        self,
+        stream_refine,
+        intents=INTENTS,
+        max_speculations: int = 2,
+        max_drafts: int = 8,
+        timeout: float = 120.0,
+        count=count_tokens,
+    ):
+        self.stream_refine = stream_refine  # async generator function (draft, feedback) -> text chunks
+        self.intents = list(intents)
+        self.max_speculations = max_speculations
+        self.max_drafts = max_drafts  # drafts (e.g. of different sessions) with speculations in flight
+        self.timeout = timeout
+        self.count = count
+        self._pending = OrderedDict()  # draft -> {intent name: _Speculation}, oldest first
+        self._lock = threading.Lock()
+        self._loop = None
+        self.requested = {intent.name: 0 for intent in self.intents}
+        self.speculated = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.wasted_input_tokens = 0
+        self.wasted_output_tokens = 0
+
+    def _event_loop(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name="speculate", daemon=True).start()
+        return self._loop
+
+    async def _generate(self, draft: str, speculation: _Speculation) -> str:
+        parts = []
+        async for chunk in self.stream_refine(draft, speculation.intent.feedback):
+            parts.append(chunk)
+            speculation.output_tokens += self.count(chunk) if chunk else 0
+        speculation.duration = time.perf_counter() - speculation.started
+        return "".join(parts)
+
+    def _ranked(self) -> list:
+        """Intents in the order users asked for them so far (ties keep the declared order)."""
+        return sorted(self.intents, key=lambda intent: -self.requested[intent.name])
+
+    def speculate(self, draft: str):
+        """Start the likely refinements of `draft` in the background; returns immediately."""
+        if self.max_speculations <= 0 or not draft:
+            return
+        with self._lock:
+            if draft in self._pending:
+                return
+            loop = self._event_loop()
+            speculations = {}
+            for intent in self._ranked()[:self.max_speculations]:
+                speculation = _Speculation(intent, self.count(draft) + self.count(intent.feedback))
+                speculation.future = asyncio.run_coroutine_threadsafe(self._generate(draft, speculation), loop)
+                speculations[intent.name] = speculation
+            self._pending[draft] = speculations
+            self.speculated += len(speculations)
+            while len(self._pending) > self.max_drafts:
+                self._cancel(self._pending.popitem(last=False)[1].values())
+
+    def _cancel(self, speculations):
+        """Cancel unused speculations; the tokens they already cost are counted as wasted."""
+        for speculation in speculations:
+            speculation.future.cancel()
+            self.wasted_input_tokens += speculation.input_tokens
+            self.wasted_output_tokens += speculation.output_tokens
+
+    def take(self, draft: str, feedback: str):
+        """The speculated refinement of `draft` that `feedback` asks for, or None.
+
+        Either way the other speculations for `draft` are cancelled.
+        """
+        intent = match_intent(feedback, self.intents)
+        with self._lock:
+            if intent is not None:
+                self.requested[intent] += 1
+            speculations = self._pending.pop(draft, None)
+            if speculations is None:
+                return None
+            chosen = speculations.pop(intent, None) if intent is not None else None
+            self._cancel(speculations.values())
+            if chosen is None:
+                self.misses += 1
+                return None
+
+        waited = time.perf_counter()
+        try:
+            text = chosen.future.result(timeout=self.timeout)
+        except Exception:
+            with self._lock:
+                self._cancel([chosen])
+                self.misses += 1
+            return None
+        waited = time.perf_counter() - waited
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += max(0.0, chosen.duration - waited)
+        return text
+
+    def discard(self, draft: str):
+        """Cancel the speculations for `draft`, e.g. when the draft is saved as it is."""
+        with self._lock:
+            self._cancel(self._pending.pop(draft, {}).values())
+
+    def close(self):
+        with self._lock:
+            while self._pending:
+                self._cancel(self._pending.popitem(last=False)[1].values())
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            served = self.hits + self.misses
+            return {
+                "speculated": self.speculated,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / served if served else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "wasted_input_tokens": self.wasted_input_tokens,
+                "wasted_output_tokens": self.wasted_output_tokens,
+                "requested": dict(self.requested),
+            }
+
+
+if __name__ == "__main__":
+    import random
+
+    SECONDS_PER_TOKEN = 0.004  # stand-in generation speed
+    READING_SECONDS = (0.3, 1.2)  # how long the user reads a draft before answering
+
+    random.seed(0)
+    draft = "Subject: Meeting request\n\nHi Dana,\n\n" + "I would like to meet next week to go over the plan. " * 12
+    draft += "\n\nBest regards,\nSam"
+    output_tokens = count_tokens(draft)
+
+    async def stream_rewrite(text: str, feedback: str):
+        """Streams an edited copy of the draft, sleeping per output token like a real model."""
+        for word in f"({feedback}) {text}".split(" "):
+            await asyncio.sleep(SECONDS_PER_TOKEN * 1.3)
+            yield word + " "
+
+    def refine(text: str, feedback: str) -> str:
+        time.sleep(output_tokens * SECONDS_PER_TOKEN)  # a regular, blocking refinement
+        return f"({feedback}) {text}"
+
+    # Roughly how feedback to a first draft is spread: mostly predictable edits, in various phrasings.
+    feedback_pool = (
+        ["Make it shorter", "shorter please", "Can you make it a bit more concise?", "trim it down"] * 3
+        + ["Make it more formal", "more professional please"] * 2
+        + ["Fix the tone", "make it friendlier"]
+        + ["Change the greeting to 'Hello Dana'", "Mention the budget review", "Make it less formal",
+           "Add a deadline of Friday", "Make it shorter and mention the budget"]
+    )
+    sessions = 30
+    plan = [(random.uniform(*READING_SECONDS), random.choice(feedback_pool)) for _ in range(sessions)]
+
+    baseline = 0.0
+    for _, feedback in plan:
+        start = time.perf_counter()
+        refine(draft, feedback)
+        baseline += time.perf_counter() - start
+    print(f"{sessions} refinements, {output_tokens} output tokens each, draft shown -> answer in "
+          f"{READING_SECONDS[0]}-{READING_SECONDS[1]}s")
+    print(f"  no speculation   : {baseline / sessions:.2f}s mean refinement latency")
+
+    for max_speculations in (1, 2, 3):
+        refiner = SpeculativeRefiner(stream_rewrite, max_speculations=max_speculations)
+        latency = 0.0
+        for n, (reading, feedback) in enumerate(plan):
+            shown = f"{draft}\n\n(session {n})"
+            refiner.speculate(shown)
+            time.sleep(reading)
+            start = time.perf_counter()
+            refiner.take(shown, feedback) or refine(shown, feedback)
+            latency += time.perf_counter() - start
+        refiner.close()
+        stats = refiner.stats()
+        print(
+            f"  {max_speculations} speculation(s) : {latency / sessions:.2f}s mean latency, "
+            f"hit rate {stats['hit_rate']:.0%}, saved {stats['saved_seconds']:.1f}s in total, "
+            f"wasted {stats['wasted_output_tokens']} output + {stats['wasted_input_tokens']} input tokens "
+            f"({stats['wasted_output_tokens'] / (stats['speculated'] * output_tokens):.0%} of speculated output)"
+        )
@@ -0,0 +1,129 @@
+"""Incremental console renderer for LangGraph runs.
+
+Streaming with `stream_mode="values"` re-emits the whole message list after
+every step, and printing the last few messages each time repeats work that
+grows with the conversation. It also shows nothing until an LLM call returns.
+`StreamRenderer` subscribes to two stream modes:
+
+- `messages`: model tokens, printed as they arrive, with the time to the first token
+- `updates`: only what each node added (tool calls, tool results), with its duration
+
+A per-node timing summary is printed at the end of the run.
+"""
+
+import sys
+import time
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+
+def _text(content) -> str:
+    """Plain text of a message's content (a string, or a list of content blocks)."""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block) for block in content
+    )
+
+
+def safe_write(text: str):
+    try:
+        sys.stdout.write(text)
+    except UnicodeEncodeError:
+        enc = getattr(sys.stdout, "encoding", "utf-8") or "utf-8"
+        sys.stdout.write(text.encode(enc, errors="replace").decode(enc))
+    sys.stdout.flush()
+
+
+class StreamRenderer:
+    """Print a graph run as deltas: streamed tokens, tool calls and tool results."""
+
+    def __init__(self, write=safe_write):
+        self.write = write
+        self._reset()
+
+    def _reset(self):
+        self.started = time.perf_counter()
+        self._step_started = self.started
+        self._first_token = None  # node whose tokens are being streamed in this step
+        self._streamed_ids = set()
+        self.node_timings = {}  # node -> [calls, seconds]
+        self.ttft = []  # (node, seconds to first token) per streamed step
+        self.tokens = 0
+
+    def render(self, app, inputs, config=None) -> dict:
+        """Run `app` on `inputs`, printing as it goes; returns the timing summary."""
+        self._reset()
+        for message in inputs.get("messages", []):
+            role, content = message if isinstance(message, tuple) else (message.type, message.content)
+            self.write(f"[{role}] {_text(content)}\n")
+        for mode, payload in app.stream(inputs, config, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                self.on_message(*payload)
+            else:
+                self.on_update(payload)
+        summary = self.summary()
+        self.print_summary(summary)
+        return summary
+
+    def on_message(self, message, metadata: dict):
+        if not isinstance(message, AIMessage):
+            return  # tool results are printed from the node update
+        text = _text(message.content)
+        if not text:
+            return
+        node = metadata.get("langgraph_node", "?")
+        if self._first_token is None:
+            self._first_token = node
+            self.ttft.append((node, time.perf_counter() - self._step_started))
+            self.write(f"\n[{node}] ")
+        self._streamed_ids.add(message.id)
+        self.tokens += 1
+        self.write(text)
+
+    def on_update(self, update: dict):
+        now = time.perf_counter()
+        for node, values in update.items():
+            if not isinstance(values, dict):
+                continue  # e.g. interrupts
+            timing = self.node_timings.setdefault(node, [0, 0.0])
+            timing[0] += 1
+            timing[1] += now - self._step_started
+
+            if self._first_token == node:
+                self.write(f"\n  (first token after {self.ttft[-1][1] * 1000:.0f} ms)\n")
+            for message in values.get("messages", []):
+                self._write_message(node, message)
+        self._step_started = now
+        self._first_token = None
+
+    def _write_message(self, node: str, message):
+        if isinstance(message, ToolMessage):
+            self.write(f"\n[{node}] {message.name}: {_text(message.content)}\n")
+            return
+        if isinstance(message, AIMessage):
+            text = _text(message.content)
+            if message.id not in self._streamed_ids:
+                self.write(f"\n[{node}] {text}\n")  # the model did not stream this one
+            for call in message.tool_calls:
+                self.write(f"  -> {call['name']}({call['args']})\n")
+
+    def summary(self) -> dict:
+        return {
+            "total_seconds": time.perf_counter() - self.started,
+            "nodes": {
+                node: {"calls": calls, "seconds": seconds}
+                for node, (calls, seconds) in self.node_timings.items()
+            },
+            "ttft_seconds": [seconds for _, seconds in self.ttft],
+            "streamed_chunks": self.tokens,
+        }
+
+    def print_summary(self, summary: dict):
+        self.write("\n--- Run summary ---\n")
+        for node, timing in summary["nodes"].items():
+            self.write(f"{node:<16} {timing['calls']:3d} calls  {timing['seconds']:7.2f}s\n")
+        if summary["ttft_seconds"]:
+            ttft = ", ".join(f"{s * 1000:.0f}" for s in summary["ttft_seconds"])
+            self.write(f"time to first token (ms): {ttft}\n")
+        self.write(f"total: {summary['total_seconds']:.2f}s, {summary['streamed_chunks']} streamed chunks\n")
@@ -0,0 +1,69 @@
+"""Concurrent execution of the tool calls an LLM emits in one turn.
+
+When the model asks for several tools at once, running them one after another
+makes the step as slow as the sum of all calls. `ToolCallExecutor` runs them on
+a bounded thread pool instead, so the step takes about as long as the slowest
+call. Results always come back in the order of the original tool calls, each
+tool can have its own concurrency limit, and a timeout keeps one slow tool from
+stalling the whole step. Calls run in a copy of the caller's context, so model
+calls inside a tool still report to the graph's callbacks (e.g. token streaming).
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+
+
+def default_on_error(call: dict, error: Exception) -> str:
+    if isinstance(error, TimeoutError):
+        return f"Error: tool '{call['name']}' timed out."
+    return f"Error: {error}"
+
+
+class ToolCallExecutor:
+    """Run tool calls concurrently with per-tool limits and a per-step timeout."""
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        per_tool_limits: dict = None,
+        timeout: float = 30.0,
+    ):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._limits = {
+            name: threading.BoundedSemaphore(limit)
+            for name, limit in (per_tool_limits or {}).items()
+        }
+
+    def _run_one(self, call: dict, handler):
+        limit = self._limits.get(call["name"])
+        if limit is None:
+            return handler(call)
+        with limit:
+            return handler(call)
+
+    def run(self, tool_calls: list[dict], handler, on_error=default_on_error) -> list:
+        """Call `handler(call)` for every tool call and return the results in call order.
+
+        Exceptions and timeouts are turned into results with `on_error(call, error)`.
+        A timed-out call keeps running in the background, but the step moves on.
+        """
+        futures = [
+            self._pool.submit(contextvars.copy_context().run, self._run_one, call, handler)
+            for call in tool_calls
+        ]
+        deadline = time.monotonic() + self.timeout
+        wait(futures, timeout=self.timeout)
+
+        results = []
+        for call, future in zip(tool_calls, futures):
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                future.cancel()
+                results.append(on_error(call, TimeoutError(call["name"])))
+            except Exception as e:
+                results.append(on_error(call, e))
+        return results
@@ -0,0 +1,276 @@
+"""Pooled, cached Wikipedia client for the `get_fact` tool.
+
+The original lookup made two sequential requests per question (search, then
+extracts), each on a fresh connection. `WikipediaClient` instead:
+
+1. asks for both in one round trip (`generator=search` + `prop=extracts`)
+2. reuses keep-alive connections from a shared `requests.Session` pool
+3. caches answers in a local SQLite file with a time-to-live, including
+   "no result" answers (negative caching, with a shorter TTL)
+
+Run `python wiki_client.py` to compare the old and new lookups against a local
+stand-in for the Wikipedia API with simulated network latency.
+"""
+
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+WIKIPEDIA_API = "https://en.wikipedia.org/w/api.php"
+# Wikipedia requires a proper User-Agent header
+USER_AGENT = "LangGraphEducationalBot/1.0 (Educational purposes; Python/requests)"
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class WikipediaClient:
+    """Single-round-trip Wikipedia lookups over pooled connections, cached on disk."""
+
+    def __init__(
+        self,
+        api_url: str = WIKIPEDIA_API,
+        cache_path: str = "wiki_cache.sqlite",
+        ttl_seconds: float = 7 * 24 * 3600,
+        negative_ttl_seconds: float = 3600,
+        timeout: float = 10,
+        pool_size: int = 8,
+    ):
+        self.api_url = api_url
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.timeout = timeout
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._conn = None
+        if cache_path:  # None disables the disk cache
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                    key TEXT PRIMARY KEY,
+                    title TEXT,
+                    extract TEXT,
+                    fetched_at REAL NOT NULL
+                )"""
+            )
+            self._conn.commit()
+
+    def _cached(self, key: str):
+        """(found, result) from the cache; found is False on a miss or an expired entry."""
+        if self._conn is None:
+            return False, None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, extract, fetched_at FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return False, None
+        title, extract, fetched_at = row
+        ttl = self.ttl_seconds if title is not None else self.negative_ttl_seconds
+        if time.time() - fetched_at >= ttl:
+            return False, None
+        if title is None:
+            return True, None
+        return True, {"title": title, "extract": extract}
+
+    def _store(self, key: str, result):
+        if self._conn is None:
+            return
+        title = result["title"] if result else None
+        extract = result["extract"] if result else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, title, extract, fetched_at) VALUES (?, ?, ?, ?)",
+                (key, title, extract, time.time()),
+            )
+            self._conn.commit()
+
+    def fetch(self, query: str):
+        """Search and fetch the intro of the best match in one request; None if nothing matches."""
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": 2,
+            "generator": "search",
+            "gsrsearch": query,
+            "gsrlimit": 1,
+            "prop": "extracts",
+            "exintro": 1,
+            "explaintext": 1,
+            "redirects": 1,
+        }
+        response = self.session.get(self.api_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        pages = response.json().get("query", {}).get("pages", [])
+        if not pages:
+            return None
+        page = min(pages, key=lambda p: p.get("index", 0))
+        return {"title": page.get("title", query), "extract": page.get("extract", "")}
+
+    def lookup(self, query: str):
+        """Cached `fetch`. Request errors propagate and are not cached."""
+        key = normalize_query(query)
+        found, result = self._cached(key)
+        if found:
+            if result is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return result
+        self.misses += 1
+        result = self.fetch(query)
+        self._store(key, result)
+        return result
+
+    def stats(self) -> dict:
+        total = self.hits + self.negative_hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.negative_hits) / total if total else 0.0,
+        }
+
+    def close(self):
+        self.session.close()
+        if self._conn is not None:
+            self._conn.close()
+
+
+def _legacy_lookup(api_url: str, query: str):
+    """The original two-request lookup on fresh connections, kept for the benchmark."""
+    headers = {"User-Agent": USER_AGENT}
+    search = requests.get(
+        api_url,
+        params={"action": "query", "format": "json", "list": "search", "srsearch": query, "srlimit": 1},
+        headers=headers,
+        timeout=10,
+    ).json()
+    if not search.get("query", {}).get("search"):
+        return None
+    title = search["query"]["search"][0]["title"]
+    extract = requests.get(
+        api_url,
+        params={"action": "query", "format": "json", "prop": "extracts", "exintro": True,
+                "explaintext": True, "titles": title},
+        headers=headers,
+        timeout=10,
+    ).json()
+    page = list(extract["query"]["pages"].values())[0]
+    return {"title": title, "extract": page.get("extract", "")}
+
+
+def _stand_in_server(latency: float):
+    """Local HTTP/1.1 server answering the subset of the MediaWiki API used here.
+
+    `latency` is added per request and per new connection (a stand-in for the
+    TCP + TLS handshake), so the benchmark shows both round-trip and pooling wins.
+    """
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    articles = {
+        "France": "France is a country in Western Europe with a population of about 68 million.",
+        "Alan Turing": "Alan Turing was an English mathematician and computer scientist.",
+        "Pacific Ocean": "The Pacific Ocean is the largest and deepest of Earth's oceans.",
+    }
+    counters = {"requests": 0, "connections": 0}
+    counter_lock = threading.Lock()
+
+    def match(text: str):
+        words = set(text.lower().split())
+        return next((t for t in articles if words & set(t.lower().split())), None)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def setup(self):
+            super().setup()
+            with counter_lock:
+                counters["connections"] += 1
+            time.sleep(latency)
+
+        def do_GET(self):
+            with counter_lock:
+                counters["requests"] += 1
+            time.sleep(latency)
+            q = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            if q.get("list") == "search":
+                title = match(q.get("srsearch", ""))
+                body = {"query": {"search": [{"title": title}] if title else []}}
+            elif q.get("generator") == "search":
+                title = match(q.get("gsrsearch", ""))
+                pages = [{"index": 1, "title": title, "extract": articles[title]}] if title else []
+                body = {"query": {"pages": pages}} if pages else {}
+            else:
+                title = q.get("titles", "")
+                body = {"query": {"pages": {"1": {"title": title, "extract": articles.get(title, "")}}}}
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counters
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Compare Wikipedia lookups against a local stand-in server.")
+    parser.add_argument("--latency", type=float, default=0.03, help="simulated seconds per request / new connection")
+    parser.add_argument("--rounds", type=int, default=3, help="times the query list is repeated")
+    args = parser.parse_args()
+
+    queries = ["Population of France", "Who was Alan Turing", "Pacific Ocean depth", "Atlantis capital city"]
+    workload = queries * args.rounds
+    server, counters = _stand_in_server(args.latency)
+    api_url = f"http://127.0.0.1:{server.server_address[1]}/w/api.php"
+
+    def measure(name, lookup):
+        counters.update(requests=0, connections=0)
+        start = time.perf_counter()
+        for q in workload:
+            lookup(q)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:<22} {elapsed / len(workload) * 1000:7.1f} ms/lookup  "
+            f"{counters['requests']:3d} requests  {counters['connections']:3d} connections"
+        )
+
+    with tempfile.TemporaryDirectory() as workdir:
+        measure("two requests (old)", lambda q: _legacy_lookup(api_url, q))
+        pooled = WikipediaClient(api_url, cache_path=None)
+        measure("one request, pooled", pooled.lookup)
+        cached = WikipediaClient(api_url, cache_path=os.path.join(workdir, "wiki_cache.sqlite"))
+        measure("pooled + disk cache", cached.lookup)
+        print(f"cache: {cached.stats()}")
+        pooled.close()
+        cached.close()
+    server.shutdown()